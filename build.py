@@ -16,6 +16,7 @@ from pybuilder.core import Author, use_plugin
 
 
 use_plugin('python.core')
+use_plugin('python.unittest')
 use_plugin('python.distutils')
 
 name = 'pybuilder-pycharm-workspace'
@@ -0,0 +1,331 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Benchmark suite for workspace generation.
+
+It runs every phase of the plugin against synthetic PyCharm config directories and projects created in a temporary
+directory that stands in for the user home, so the real PyCharm config is never touched. It's development tooling,
+not shipped with the plugin, and benchmarks the plugin sources next to it::
+
+	python src/benchmark/python/benchmark.py --save baseline.json
+	python src/benchmark/python/benchmark.py --compare baseline.json
+
+Each case runs in a fresh process so its peak RSS is measured on its own. The plugin import time is measured too with
+``-X importtime`` (``import_time_tests`` unit test checks which modules that import loads).
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+try:
+	import resource
+except ImportError:
+	resource = None
+
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'main' / 'python'))
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+PYCHARM_VERSIONS = ('.PyCharm2019.1', '.PyCharm2019.2', '.PyCharmCE2019.3', '.PyCharm2019.3')
+SYNTHETIC_INTERPRETER = """    <jdk version="2">
+      <name value="Python 3.8 (synthetic_{index})" />
+      <type value="Python SDK" />
+      <homePath value="/opt/venvs/synthetic_{index}/bin/python" />
+      <roots>
+        <classPath>
+          <root type="composite">
+{roots}
+          </root>
+        </classPath>
+        <sourcePath>
+          <root type="composite" />
+        </sourcePath>
+      </roots>
+      <additional ASSOCIATED_PROJECT_PATH="/opt/projects/synthetic_{index}" />
+    </jdk>
+"""
+SYNTHETIC_ROOT = '            <root url="file:///opt/venvs/synthetic_{index}/lib/python3.8/site-packages/package_{root}" type="simple" />'
+ROOTS_PER_INTERPRETER = 20
+MIN_TIME_REGRESSION = 0.005
+PLUGIN_PACKAGE = 'pybuilder_pycharm_workspace'
+
+
+class NullLogger:
+	"""
+	Logger discarding every message, standing in for PyBuilder's logger.
+	"""
+
+	def __getattr__(self, name):
+		return lambda *args, **kwargs: None
+
+
+def use_home(home):
+	"""
+	Points every user directory the plugin looks at (home, config and cache directories) to a stand-in directory.
+
+	:param str home: Stand-in home directory
+	:return: None
+	"""
+	os.environ.update({ 'HOME': home, 'USERPROFILE': home,
+	                    'APPDATA': os.path.join(home, 'AppData', 'Roaming'),
+	                    'LOCALAPPDATA': os.path.join(home, 'AppData', 'Local'),
+	                    'XDG_CONFIG_HOME': os.path.join(home, '.config'),
+	                    'XDG_CACHE_HOME': os.path.join(home, '.cache') })
+
+
+def write_synthetic_home(home, interpreters):
+	"""
+	Creates fake config directories for several PyCharm versions, the newest one holding a synthetic ``jdk.table.xml``
+	file.
+
+	:param str home: Stand-in home directory
+	:param int interpreters: Number of interpreters of the ``jdk.table.xml`` file
+	:return: ``jdk.table.xml`` file path
+	:rtype: str
+	"""
+	for version in PYCHARM_VERSIONS:
+		os.makedirs(os.path.join(home, version, 'config', 'options'), exist_ok=True)
+	interpreters_file_path = os.path.join(home, PYCHARM_VERSIONS[-1], 'config', 'options', 'jdk.table.xml')
+	with open(interpreters_file_path, 'w') as interpreters_file:
+		interpreters_file.write('<application>\n  <component name="ProjectJdkTable">\n')
+		for index in range(interpreters):
+			roots = '\n'.join(SYNTHETIC_ROOT.format(index=index, root=root) for root in range(ROOTS_PER_INTERPRETER))
+			interpreters_file.write(SYNTHETIC_INTERPRETER.format(index=index, roots=roots))
+		interpreters_file.write('  </component>\n</application>\n')
+	return interpreters_file_path
+
+
+def synthetic_project(home, index):
+	"""
+	Creates a synthetic PyBuilder project directory and its project instance.
+
+	:param str home: Stand-in home directory
+	:param int index: Project number
+	:return: Initialised PyBuilder project instance
+	:rtype: pybuilder.core.Project
+	"""
+	from pybuilder.core import Project
+	from pybuilder_pycharm_workspace import initialise_plugin
+
+	project_path = Path(home) / 'PycharmProjects' / f'synthetic_project_{index}'
+	for directory in ('src/main/python', 'src/unittest/python'):
+		(project_path / directory).mkdir(parents=True, exist_ok=True)
+	(project_path / 'build.py').touch()
+	project = Project(str(project_path), name=project_path.name)
+	for name, value in (('dir_source_main_python', 'src/main/python'),
+	                    ('dir_source_unittest_python', 'src/unittest/python'),
+	                    ('dir_source_integrationtest_python', 'src/integrationtest/python'),
+	                    ('dir_target', 'target'),
+	                    ('pycharm_workspace_project_path', project_path),
+	                    ('pycharm_workspace_force', True)):
+		project.set_property(name, value)
+	initialise_plugin(project)
+	return project
+
+
+def written_bytes():
+	"""
+	Returns the bytes written by the current process so far, when the system reports it.
+
+	:return: Written bytes or ``None``
+	:rtype: int or None
+	"""
+	try:
+		with open('/proc/self/io') as io_file:
+			for line in io_file:
+				if line.startswith('wchar:'):
+					return int(line.split()[1])
+	except OSError:
+		pass
+	return None
+
+
+def peak_rss():
+	"""
+	Returns the peak resident set size of the current process in bytes, when the system reports it.
+
+	:return: Peak RSS or ``None``
+	:rtype: int or None
+	"""
+	if resource is None:
+		return None
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_case(phase, interpreters, projects):
+	"""
+	Runs a benchmark case in a fresh stand-in home. Meant to be run in its own process.
+
+	:param str phase: ``generate_pycharm_workspace``, ``add_project_interpreter`` or ``add_project_idea_directory``
+	:param int interpreters: Number of interpreters of the synthetic ``jdk.table.xml`` file
+	:param int projects: Number of synthetic projects
+	:return: Wall time in seconds, peak RSS and written bytes
+	:rtype: dict[str, float or int or None]
+	"""
+	home = tempfile.mkdtemp(prefix='pycharm_workspace_benchmark_')
+	try:
+		use_home(home)
+		write_synthetic_home(home, interpreters)
+		from pybuilder_pycharm_workspace import generate_pycharm_workspace
+		from pybuilder_pycharm_workspace.workspace import add_project_idea_directory, add_project_interpreter
+
+		phases = { 'generate_pycharm_workspace': generate_pycharm_workspace,
+		           'add_project_interpreter': add_project_interpreter,
+		           'add_project_idea_directory': add_project_idea_directory }
+		synthetic_projects = [synthetic_project(home, index) for index in range(projects)]
+		for project in synthetic_projects:
+			project.set_property('pycharm_workspace_project_interpreter_name', 'Python (synthetic)')
+			(project.get_property('pycharm_workspace_project_path') / '.idea').mkdir(exist_ok=True)
+		logger = NullLogger()
+
+		bytes_before = written_bytes()
+		start = time.perf_counter()
+		for project in synthetic_projects:
+			phases[phase](project, logger)
+		wall_time = time.perf_counter() - start
+		bytes_after = written_bytes()
+		return { 'wall_time': wall_time,
+		         'peak_rss': peak_rss(),
+		         'bytes_written': bytes_after - bytes_before if bytes_before is not None else None }
+	finally:
+		shutil.rmtree(home, ignore_errors=True)
+
+
+def measure_import(repeat):
+	"""
+	Measures the plugin import time in fresh interpreters with ``-X importtime``, as PyBuilder imports it on every build.
+
+	:param int repeat: Repetitions (best one is kept)
+	:return: Cumulative import time of the plugin package in seconds
+	:rtype: float
+	"""
+	environment = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+	best_time = None
+	for _ in range(repeat):
+		process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import pybuilder.core; import {PLUGIN_PACKAGE}'],
+		                         env=environment, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+		for line in process.stderr.splitlines():
+			if not line.startswith('import time:') or line.startswith('import time: self'):
+				continue
+			_, cumulative, module = line[len('import time:'):].split('|')
+			if module.strip() == PLUGIN_PACKAGE:
+				import_time = int(cumulative) / 1e6
+				best_time = import_time if best_time is None else min(best_time, import_time)
+	return best_time
+
+
+def run_suite(sizes, projects, repeat):
+	"""
+	Runs every benchmark case, keeping the best wall time of the repetitions. A case whose every repetition failed
+	gets no metrics.
+
+	:param collections.abc.Iterable[int] sizes: Numbers of interpreters of the synthetic ``jdk.table.xml`` files
+	:param int projects: Number of synthetic projects per case
+	:param int repeat: Repetitions of every case
+	:return: Results by case name
+	:rtype: dict[str, dict[str, float or int or None]]
+	"""
+	cases = [(phase, size, projects) for size in sizes
+	         for phase in ('add_project_interpreter', 'generate_pycharm_workspace')]
+	cases.append(('add_project_idea_directory', 0, projects))
+	results = {}
+	context = multiprocessing.get_context('spawn')
+	for phase, size, case_projects in cases:
+		case = f'{phase}[interpreters={size},projects={case_projects}]'
+		runs = []
+		for _ in range(repeat):
+			with context.Pool(1) as pool:
+				try:
+					runs.append(pool.apply(run_case, (phase, size, case_projects)))
+				except Exception as error:
+					print(f'FAILED {case}: {error}', file=sys.stderr)
+		results[case] = min(runs, key=lambda run: run['wall_time'],
+		                    default={ 'wall_time': None, 'peak_rss': None, 'bytes_written': None })
+	return results
+
+
+def compare(results, baseline, tolerance):
+	"""
+	Compares results with a baseline.
+
+	:param dict results: Current results
+	:param dict baseline: Baseline results
+	:param float tolerance: Allowed relative increase of every metric (wall time increases under
+	    ``MIN_TIME_REGRESSION`` seconds are ignored as noise)
+	:return: Regression descriptions, including the metrics the baseline has but the results are missing
+	:rtype: list[str]
+	"""
+	regressions = []
+	for case, metrics in results.items():
+		for metric, value in metrics.items():
+			base_value = baseline.get(case, {}).get(metric)
+			if value is None:
+				if base_value is not None:
+					regressions.append(f'{case} {metric}: missing (baseline {base_value:.6g})')
+				continue
+			if not base_value or metric == 'wall_time' and value - base_value < MIN_TIME_REGRESSION:
+				continue
+			if value > base_value * (1 + tolerance):
+				regressions.append(f'{case} {metric}: {value:.6g} > {base_value:.6g} (+{value / base_value - 1:.0%})')
+	return regressions
+
+
+def print_results(results):
+	print(f'{"case":<75} {"wall time (s)":>14} {"peak RSS (MiB)":>15} {"written (KiB)":>14}')
+	for case, metrics in results.items():
+		peak = f'{metrics["peak_rss"] / 2 ** 20:.1f}' if metrics['peak_rss'] is not None else '-'
+		written = f'{metrics["bytes_written"] / 2 ** 10:.1f}' if metrics['bytes_written'] is not None else '-'
+		wall_time = f'{metrics["wall_time"]:.4f}' if metrics['wall_time'] is not None else '-'
+		print(f'{case:<75} {wall_time:>14} {peak:>15} {written:>14}')
+
+
+def main(arguments=None):
+	parser = argparse.ArgumentParser(description='Benchmarks PyCharm workspace generation with synthetic configs')
+	parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+	                    help='numbers of interpreters of the synthetic jdk.table.xml files')
+	parser.add_argument('--projects', type=int, default=10, help='synthetic projects per case')
+	parser.add_argument('--repeat', type=int, default=3, help='repetitions of every case (best one is kept)')
+	parser.add_argument('--save', help='store the results as a baseline JSON file')
+	parser.add_argument('--compare', help='fail if results regressed against this baseline JSON file')
+	parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative regression (default 0.25)')
+	arguments = parser.parse_args(arguments)
+
+	results = run_suite(arguments.sizes, arguments.projects, arguments.repeat)
+	results[f'import[{PLUGIN_PACKAGE}]'] = { 'wall_time': measure_import(arguments.repeat), 'peak_rss': None, 'bytes_written': None }
+	print_results(results)
+	if arguments.save:
+		with open(arguments.save, 'w') as baseline_file:
+			json.dump(results, baseline_file, indent=2)
+	if arguments.compare:
+		with open(arguments.compare) as baseline_file:
+			regressions = compare(results, json.load(baseline_file), arguments.tolerance)
+		for regression in regressions:
+			print(f'REGRESSION {regression}')
+		return 1 if regressions else 0
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -13,16 +13,12 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
-from pathlib import Path
-import xml.etree.ElementTree as ET
+# This module is imported on every build using the plugin, so it only registers the plugin initializer and tasks.
+# Every task imports the modules doing the actual work when it runs.
 
 from pybuilder.core import init, task
 
-import pybuilder_pycharm_workspace.constants as const
 import pybuilder_pycharm_workspace.messages as msg
-from pybuilder_pycharm_workspace.errors import MissingPropertyError, NoPyCharmConfigDirError
-from pybuilder_pycharm_workspace.helpers import fill_and_write_template, underscore
-from pybuilder_pycharm_workspace.resources import templates as templates
 
 
 @init
@@ -33,8 +29,29 @@ def initialise_plugin(project):
 	:param pybuilder.core.Project project: PyBuilder project instance
 	:return: None
 	"""
-	const.IML_FILENAME = const.IML_FILENAME.format(project_name=project.name)
-	project.set_property_if_unset('pycharm_workspace_main_version', '2019')
+	project.set_property_if_unset('pycharm_workspace_main_version', None)
+	project.set_property_if_unset('pycharm_workspace_edition', None)
+	project.set_property_if_unset('pycharm_workspace_force', False)
+	project.set_property_if_unset('pycharm_workspace_venv_path', None)
+	project.set_property_if_unset('pycharm_workspace_trace_format', None)
+	project.set_property_if_unset('pycharm_workspace_batch_projects', [])
+	project.set_property_if_unset('pycharm_workspace_batch_processes', None)
+	project.set_property_if_unset('pycharm_workspace_profile_configurations', False)
+	project.set_property_if_unset('pycharm_workspace_profile_summary_size', 30)
+	project.set_property_if_unset('pycharm_workspace_test_shards', 0)
+	project.set_property_if_unset('pycharm_workspace_run_configurations', 'workspace')
+	project.set_property_if_unset('pycharm_workspace_task_configurations', True)
+	project.set_property_if_unset('pycharm_workspace_prewarm_bytecode', False)
+	project.set_property_if_unset('pycharm_workspace_prewarm_workers', None)
+	project.set_property_if_unset('pycharm_workspace_shared_sdk', False)
+	project.set_property_if_unset('pycharm_workspace_monorepo_depth', 3)
+	project.set_property_if_unset('pycharm_workspace_monorepo_sdk', 'shared')
+	project.set_property_if_unset('pycharm_workspace_exclude_scan_depth', 3)
+	project.set_property_if_unset('pycharm_workspace_exclude_scan_budget', 20000)
+	project.set_property_if_unset('pycharm_workspace_watch_debounce', 0.5)
+	project.set_property_if_unset('pycharm_workspace_watch_polling', False)
+	project.set_property_if_unset('pycharm_workspace_prune_dry_run', False)
+	project.set_property_if_unset('pycharm_workspace_prune_workers', None)
 
 
 @task(description=msg.TASK_DESCRIPTION_GENERATE_PYCHARM_WORKSPACE)
@@ -45,113 +62,252 @@ def generate_pycharm_workspace(project, logger):
 	It creates the ``.idea`` directory for the project and tells PyCharm the interpreter it should use with the
 	current project (``.\\venv`` in project's directory by default).
 
+	Generation is skipped when none of its inputs changed since the last run, unless ``pycharm_workspace_force``
+	property is set. Interpreter registration and ``.idea`` files writes run concurrently, and are all rolled back if
+	any of them fails (see ``workspace.generate_workspace``). Every phase is timed and summarised at the end (see
+	``tracing.report_phases``).
+
 	:param pybuilder.core.Project project: PyBuilder project instance
 	:param pybuilder.core.Logger logger: PyBuilder logger instance
 	:return: None
 	"""
+	from pybuilder_pycharm_workspace.errors import MissingPropertyError
+	from pybuilder_pycharm_workspace.fingerprint import is_workspace_up_to_date, save_workspace_fingerprint
+	from pybuilder_pycharm_workspace.helpers import to_bool
+	from pybuilder_pycharm_workspace.tracing import report_phases, tracer
+	from pybuilder_pycharm_workspace.verify import record_idea_file_hashes
+	from pybuilder_pycharm_workspace.workspace import generate_workspace
+
 	logger.info(msg.WORKSPACE_START)
 
 	if not project.get_property('pycharm_workspace_project_path'):
 		raise MissingPropertyError('pycharm_workspace_project_path')
 
-	add_project_interpreter(project, logger)
-	add_project_idea_directory(project, logger)
-	logger.info(msg.WORKSPACE_FINISH)
+	tracer.reset()
+	try:
+		with tracer.phase('fingerprint check'):
+			up_to_date = not to_bool(project.get_property('pycharm_workspace_force')) and is_workspace_up_to_date(project)
+		if up_to_date:
+			logger.info(msg.WORKSPACE_UP_TO_DATE)
+			return
+
+		generate_workspace(project, logger)
+		with tracer.phase('fingerprint save'):
+			save_workspace_fingerprint(project)
+		with tracer.phase('file hashes record'):
+			record_idea_file_hashes(project)
+		logger.info(msg.WORKSPACE_FINISH)
+	finally:
+		report_phases(project, logger)
+
+
+@task(description=msg.TASK_DESCRIPTION_GENERATE_PYCHARM_MONOREPO_WORKSPACE)
+def generate_pycharm_monorepo_workspace(project, logger):
+	"""
+	Monorepo plugin task.
+
+	It generates a single PyCharm workspace in the current project directory with a module for the project itself and
+	another one for every PyBuilder sub-project found below it, either sharing the project interpreter or with their
+	own ones (``pycharm_workspace_monorepo_sdk`` property).
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:return: None
+	:raises MissingPropertyError: If ``pycharm_workspace_project_path`` property is not set
+	:raises BatchGenerationError: If any sub-project module couldn't be generated
+	"""
+	import pybuilder_pycharm_workspace.constants as const
+	from pybuilder_pycharm_workspace.errors import MissingPropertyError
+	from pybuilder_pycharm_workspace.monorepo import generate_pycharm_monorepo_workspace as generate_workspace
+	from pybuilder_pycharm_workspace.tracing import report_phases, tracer
+
+	if not project.get_property('pycharm_workspace_project_path'):
+		raise MissingPropertyError('pycharm_workspace_project_path')
+	sdk_mode = str(project.get_property('pycharm_workspace_monorepo_sdk')).lower()
+	if sdk_mode not in (const.MONOREPO_SDK_SHARED, const.MONOREPO_SDK_MODULE):
+		logger.warn(msg.MONOREPO_UNKNOWN_SDK_MODE.format(sdk_mode=sdk_mode))
+		sdk_mode = const.MONOREPO_SDK_SHARED
+	processes = project.get_property('pycharm_workspace_batch_processes')
+
+	tracer.reset()
+	try:
+		generate_workspace(project, logger, int(project.get_property('pycharm_workspace_monorepo_depth')), sdk_mode,
+		                   int(processes) if processes else None)
+	finally:
+		report_phases(project, logger)
+
+
+@task(description=msg.TASK_DESCRIPTION_WATCH_PYCHARM_WORKSPACE)
+def watch_pycharm_workspace(project, logger):
+	"""
+	Watch mode plugin task.
+
+	It runs until interrupted, watching ``build.py``, the source directories, the virtual environment and the PyCharm
+	interpreters file. After every burst of changes only the affected artifact is regenerated: the whole workspace for
+	``build.py`` changes (loading the project again, in a fresh process), the IML file for source directory changes
+	and the interpreter entry for virtual environment or PyCharm interpreters file changes.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:return: None
+	:raises MissingPropertyError: If ``pycharm_workspace_project_path`` property is not set
+	"""
+	from pybuilder_pycharm_workspace.errors import MissingPropertyError
+	from pybuilder_pycharm_workspace.helpers import to_bool
+	from pybuilder_pycharm_workspace.watching import watch_workspace
+
+	if not project.get_property('pycharm_workspace_project_path'):
+		raise MissingPropertyError('pycharm_workspace_project_path')
+	try:
+		watch_workspace(project, logger, float(project.get_property('pycharm_workspace_watch_debounce')),
+		                to_bool(project.get_property('pycharm_workspace_watch_polling')))
+	except KeyboardInterrupt:
+		logger.info(msg.WATCH_STOPPED)
+
+
+@task(description=msg.TASK_DESCRIPTION_SUMMARIZE_PROFILES)
+def summarize_pycharm_profiles(project, logger):
+	"""
+	Profiling companion task.
+
+	It aggregates the profiles written by the profiling run configurations (see
+	``pycharm_workspace_profile_configurations`` property) and logs the functions where most time was spent, writing
+	the same summary into the reports directory.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:return: None
+	:raises MissingPropertyError: If ``pycharm_workspace_project_path`` property is not set
+	"""
+	from pybuilder_pycharm_workspace.errors import MissingPropertyError
+	from pybuilder_pycharm_workspace.profiling import summarize_profiles
+
+	if not project.get_property('pycharm_workspace_project_path'):
+		raise MissingPropertyError('pycharm_workspace_project_path')
+
+	summarize_profiles(project, logger, int(project.get_property('pycharm_workspace_profile_summary_size')))
 
 
-def add_project_interpreter(project, logger):
+@task(description=msg.TASK_DESCRIPTION_VERIFY_PYCHARM_WORKSPACE)
+def verify_pycharm_workspace(project, logger):
 	"""
-	Function in charge of adding project's virtual environment to PyCharm config.
+	Drift check plugin task, meant for pre-commit hooks and CI.
 
-	It checks the ``jdk.table.xml`` file for the existence of a previously configured interpreter with the same name.
-	If it doesn't exist, this function adds the interpreter for PyCharm for the virtual environment belonging to the
-	project. In case it finds one, this will be replaced by the new one.
+	It renders in memory the ``.idea`` directory files and the project interpreter ``generate_pycharm_workspace`` task
+	would write, compares them with the ones on disk and logs a compact diff of every file out of date. Nothing is
+	written: the plugin caches are only read (the file hashes ``generate_pycharm_workspace`` task records included).
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:return: None
+	:raises MissingPropertyError: If ``pycharm_workspace_project_path`` property is not set
+	:raises WorkspaceDriftError: If any file is out of date
+	"""
+	from pybuilder_pycharm_workspace.errors import MissingPropertyError, WorkspaceDriftError
+	from pybuilder_pycharm_workspace.verify import verify_workspace
+
+	if not project.get_property('pycharm_workspace_project_path'):
+		raise MissingPropertyError('pycharm_workspace_project_path')
+
+	drifts = verify_workspace(project, logger)
+	if drifts:
+		raise WorkspaceDriftError(len(drifts))
+	logger.info(msg.VERIFY_UP_TO_DATE)
+
+
+@task(description=msg.TASK_DESCRIPTION_GENERATE_PYCHARM_WORKSPACES)
+def generate_pycharm_workspaces_batch(project, logger):
+	"""
+	Batch plugin task.
+
+	It generates the workspace of every project listed in ``pycharm_workspace_batch_projects`` property, adding all
+	their interpreters to PyCharm config at once.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:return: None
+	:raises MissingPropertyError: If ``pycharm_workspace_batch_projects`` property is not set
+	:raises BatchGenerationError: If the workspace of any project couldn't be generated
+	"""
+	from pybuilder_pycharm_workspace.batch import generate_pycharm_workspaces
+	from pybuilder_pycharm_workspace.errors import MissingPropertyError
+
+	project_directories = project.get_property('pycharm_workspace_batch_projects')
+	if not project_directories:
+		raise MissingPropertyError('pycharm_workspace_batch_projects')
+	if isinstance(project_directories, str):
+		project_directories = [directory.strip() for directory in project_directories.split(',') if directory.strip()]
+	processes = project.get_property('pycharm_workspace_batch_processes')
+	generate_pycharm_workspaces(project, logger, project_directories, int(processes) if processes else None)
+
+
+@task(description=msg.TASK_DESCRIPTION_PRUNE_INTERPRETERS)
+def prune_pycharm_interpreters(project, logger):
+	"""
+	Garbage collection plugin task.
+
+	It removes from PyCharm config the interpreters created by the plugin whose virtual environment or project
+	directory no longer exists, so PyCharm doesn't validate and index them on every startup. Shared interpreters are
+	kept while any existing project still uses them. With ``pycharm_workspace_prune_dry_run`` property set, stale
+	interpreters are only listed.
 
 	:param pybuilder.core.Project project: PyBuilder project instance
 	:param pybuilder.core.Logger logger: PyBuilder logger instance
 	:return: None
 	:raises NoPyCharmConfigDirError: If the plugin can't find PyCharm config directory
 	"""
-	logger.info(msg.INTERPRETER_START)
-
-	for directory in [".PyCharm", ".PyCharmCE"]:
-		pycharm_config_path = list(Path.home().glob(f"{directory}{project.get_property('pycharm_workspace_main_version')}*"))[-1:]
-		if len(pycharm_config_path):
-			break
-	if not len(pycharm_config_path):
-		raise NoPyCharmConfigDirError
-	pycharm_config_path = pycharm_config_path[0]
-	logger.debug(msg.INTERPRETER_PYCHARM_LATEST.format(pycharm_config_name=pycharm_config_path.name))
-	pycharm_config_path = pycharm_config_path / 'config' / 'options'
-	logger.debug(msg.INTERPRETER_PYCHARM_LATEST_PATH.format(pycharm_config_path=pycharm_config_path))
-
-	project_interpreter = templates.INTERPRETER.format(
-		project_name=project.get_property('pycharm_workspace_project_path').name,
-		project_path=str(project.get_property('pycharm_workspace_project_path')).replace('\\\\', '\\'))
-	project_interpreter = ET.fromstring(project_interpreter)
-	interpreter_name = project_interpreter.find('name').attrib['value']
-	logger.debug(msg.INTERPRETER_NEW_NAME.format(interpreter_name=interpreter_name))
-	project.set_property('pycharm_workspace_project_interpreter_name', interpreter_name)
-
-	interpreters_file_path = str(pycharm_config_path / 'jdk.table.xml')
-	interpreters_file = ET.parse(interpreters_file_path)
-	interpreters_table = interpreters_file.getroot().find(".//component[@name='ProjectJdkTable']")
-	old_project_interpreter = interpreters_table.find(f".//name[@value='{interpreter_name}']..")
-	if old_project_interpreter is not None:
-		logger.info(msg.INTERPRETER_FOUND)
-		interpreters_table.remove(old_project_interpreter)
-	interpreters_table.append(project_interpreter)
-	interpreters_file.write(interpreters_file_path)
-
-	logger.debug(msg.INTERPRETER_FILE_OVERWRITTEN.format(interpreters_file_path=interpreters_file_path))
-
-
-def add_project_idea_directory(project, logger):
-	"""
-	Function in charge of adding PyCharm's ``.idea`` directory for the project.
-
-	This function should be always executed before launching ``add_project_interpreter``. It creates the directory and
-	includes the minimum necessary files on it filling the templates included in the plugin with the information of
-	the current project. These files are:
-
-	* IML file with project name defining project structure (as source folder etc.)
-	* ``modules.xml`` file with a reference to IML file
-	* ``misc.xml`` file with a reference to the interpreter configured by ``add_project_interpreter`` function
-	* ``workspace.xml`` file with run manager configurations to ease different PyBuilder buildings:
-
-		* Build with development environment configuration
-		* Build with development environment configuration and no testing
-		* Only run tests
-		* Build with production environment configuration
+	import pybuilder_pycharm_workspace.constants as const
+	from pybuilder_pycharm_workspace.helpers import to_bool
+	from pybuilder_pycharm_workspace.pruning import find_stale_interpreters, prune_interpreters
+	from pybuilder_pycharm_workspace.registry import open_registry
+	from pybuilder_pycharm_workspace.shared_sdks import referenced_shared_interpreters
+	from pybuilder_pycharm_workspace.workspace import find_pycharm_config_path
+
+	interpreters_file_path = str(find_pycharm_config_path(project, logger) / 'jdk.table.xml')
+	logger.info(msg.PRUNE_START.format(interpreters_file_path=interpreters_file_path))
+	workers = project.get_property('pycharm_workspace_prune_workers')
+	workers = int(workers) if workers else const.PRUNE_WORKERS
+	referenced = referenced_shared_interpreters(interpreters_file_path, logger)
+	stale_interpreters = [interpreter for interpreter in find_stale_interpreters(interpreters_file_path, workers)
+	                      if interpreter[0] not in referenced]
+	for name, home_path, project_path, size in stale_interpreters:
+		logger.info(msg.PRUNE_STALE_ENTRY.format(name=name, home_path=home_path, project_path=project_path, size=size))
+	if not stale_interpreters:
+		logger.info(msg.PRUNE_NOTHING)
+		return
+	if to_bool(project.get_property('pycharm_workspace_prune_dry_run')):
+		logger.info(msg.PRUNE_DRY_RUN.format(count=len(stale_interpreters),
+		                                     size=sum(interpreter[3] for interpreter in stale_interpreters)))
+		return
+
+	pruned, size_before, size_after = prune_interpreters(interpreters_file_path,
+	                                                     [interpreter[0] for interpreter in stale_interpreters], workers)
+	registry = open_registry(logger)
+	if registry:
+		with registry:
+			registry.refresh(interpreters_file_path)
+	logger.info(msg.PRUNE_FINISH.format(count=len(pruned), size_before=size_before, size_after=size_after,
+	                                    ratio=1 - size_after / size_before if size_before else 0))
+
+
+@task(description=msg.TASK_DESCRIPTION_LIST_INTERPRETERS)
+def list_pycharm_interpreters(project, logger):
+	"""
+	Lists the Python interpreters created by the plugin in every PyCharm config directory it has worked with.
 
 	:param pybuilder.core.Project project: PyBuilder project instance
 	:param pybuilder.core.Logger logger: PyBuilder logger instance
 	:return: None
 	"""
-	logger.info(msg.WORKSPACE_CREATING_IDEA_DIRECTORY)
-	pycharm_idea_directory = project.get_property('pycharm_workspace_project_path') / '.idea'
-	pycharm_idea_directory.mkdir(exist_ok=True)
-
-	logger.debug(msg.WORKSPACE_CREATING_FILE.format(file_name=const.IML_FILENAME))
-	unit_tests = templates.IML_SOURCEFOLDER_TEMPLATE.format(
-		directory=project.get_property('dir_source_unittest_python')) if project.get_property('dir_source_unittest_python') else ''
-	integration_tests = templates.IML_SOURCEFOLDER_TEMPLATE.format(
-		directory=project.get_property('dir_source_integrationtest_python')) if project.get_property('dir_source_integrationtest_python') else ''
-	fill_and_write_template(templates.IML_FILE, pycharm_idea_directory / const.IML_FILENAME,
-	                        **{ 'source_dir': (Path('src') / underscore(project.name)).as_posix(),
-                                'unit_tests': unit_tests,
-	                            'integration_tests': integration_tests,
-								'project_interpreter_name': project.get_property('pycharm_workspace_project_interpreter_name'),
-	                            'output_directory': project.get_property('dir_target') })
-
-	logger.debug(msg.WORKSPACE_CREATING_FILE.format(file_name=const.MODULES_FILENAME))
-	fill_and_write_template(templates.MODULES_FILE, pycharm_idea_directory / const.MODULES_FILENAME,
-	                        **{ 'project_file_name': const.IML_FILENAME })
-
-	logger.debug(msg.WORKSPACE_CREATING_FILE.format(file_name=const.MISC_FILENAME))
-	fill_and_write_template(templates.MISC_FILE, pycharm_idea_directory / const.MISC_FILENAME,
-                            **{ 'project_interpreter_name': project.get_property('pycharm_workspace_project_interpreter_name') })
-
-	logger.debug(msg.WORKSPACE_CREATING_FILE.format(file_name=const.WORKSPACE_FILENAME))
-	fill_and_write_template(templates.WORKSPACE_FILE, pycharm_idea_directory / const.WORKSPACE_FILENAME,
-	                        **{ 'project_name': project.name })
+	from pybuilder_pycharm_workspace.registry import open_registry
+
+	registry = open_registry(logger)
+	if not registry:
+		return
+	with registry:
+		interpreters = registry.list_interpreters(managed_only=True)
+	for interpreters_file_path, name, home_path, project_path in interpreters:
+		logger.info(msg.INTERPRETER_LIST_ENTRY.format(name=name, home_path=home_path, project_path=project_path,
+		                                              interpreters_file_path=interpreters_file_path))
+	if not interpreters:
+		logger.info(msg.INTERPRETER_LIST_EMPTY)
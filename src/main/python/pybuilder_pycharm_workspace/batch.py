@@ -0,0 +1,163 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import pickle
+from multiprocessing import get_context
+from pathlib import Path
+
+import pybuilder_pycharm_workspace.messages as msg
+from pybuilder_pycharm_workspace.errors import BatchGenerationError, WorkerError
+from pybuilder_pycharm_workspace.shared_sdks import shared_reference
+from pybuilder_pycharm_workspace.workspace import add_project_idea_directory, find_pycharm_config_path, \
+	register_interpreters, render_project_interpreter
+
+
+def load_project(project_directory, logger):
+	"""
+	Loads a PyBuilder project from its ``build.py`` file and runs its initializers, as ``pyb`` does before building.
+
+	:param str project_directory: Directory holding the project's ``build.py`` file
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:return: Initialised PyBuilder project instance
+	:rtype: pybuilder.core.Project
+	"""
+	from pybuilder.execution import ExecutionManager
+	from pybuilder.reactor import Reactor
+
+	reactor = Reactor(logger, ExecutionManager(logger))
+	reactor.prepare_build(project_directory=project_directory)
+	reactor.execution_manager.execute_initializers([], logger=logger, project=reactor.project, reactor=reactor)
+	reactor.project.set_property_if_unset('pycharm_workspace_project_path', Path(project_directory).resolve())
+	return reactor.project
+
+
+def map_projects(function, project_directories, processes=None, *arguments):
+	"""
+	Runs a function for every project in a process pool, loading each project in a fresh worker process.
+
+	PyBuilder registers plugin initializers when plugin modules are first imported, so a process can't load a second
+	project reliably: workers are spawned rather than forked (a forked worker would inherit the plugin modules the
+	main process imported for its own project), and replaced after every project.
+
+	:param collections.abc.Callable function: Picklable function taking a project directory and ``arguments``
+	:param list[str] project_directories: Directories holding the ``build.py`` file of every project
+	:param int or None processes: Number of worker processes (CPU count by default)
+	:param arguments: Additional arguments passed to the function
+	:return: Function result or raised exception by project directory, in the same order
+	:rtype: dict[str, object]
+	"""
+	results = {}
+	with get_context('spawn').Pool(processes, maxtasksperchild=1) as pool:
+		pending = { str(directory): pool.apply_async(call_project_function, (function, str(directory), *arguments))
+		            for directory in project_directories }
+		for project_directory, result in pending.items():
+			try:
+				results[project_directory] = result.get()
+			except Exception as error:
+				results[project_directory] = error
+	return results
+
+
+def call_project_function(function, project_directory, *arguments):
+	"""
+	Runs a function for a project in a worker process (see ``map_projects``).
+
+	Errors that can't be rebuilt in the main process (such as the ones whose constructor doesn't take their own
+	arguments) would break the process pool, so they are raised as ``WorkerError`` instead.
+
+	:param collections.abc.Callable function: Function taking a project directory and ``arguments``
+	:param str project_directory: Directory holding the project's ``build.py`` file
+	:param arguments: Additional arguments passed to the function
+	:return: Function result
+	:rtype: object
+	:raises WorkerError: If the function raised an error that can't be sent back to the main process
+	"""
+	try:
+		return function(project_directory, *arguments)
+	except Exception as error:
+		try:
+			pickle.loads(pickle.dumps(error))
+		except Exception:
+			raise WorkerError(error) from None
+		raise
+
+
+def render_project_workspace(project_directory):
+	"""
+	Loads a project and writes its ``.idea`` directory. Meant to be run in a worker process.
+
+	:param str project_directory: Directory holding the project's ``build.py`` file
+	:return: Interpreter name and ``<jdk>`` element text for the project, to be added to ``jdk.table.xml`` afterwards,
+	    and its shared interpreter reference (see ``shared_sdks.shared_reference``)
+	:rtype: tuple[str, str, tuple[str, tuple[str or None, str]]]
+	"""
+	from pybuilder.cli import StdOutLogger
+	from pybuilder.core import Logger
+
+	logger = StdOutLogger(Logger.WARN)
+	project = load_project(project_directory, logger)
+	interpreter_name, project_interpreter = render_project_interpreter(project, logger)
+	add_project_idea_directory(project, logger)
+	return interpreter_name, project_interpreter, shared_reference(project)
+
+
+def generate_pycharm_workspaces(project, logger, project_directories, processes=None):
+	"""
+	Generates the PyCharm workspace of many projects at once.
+
+	Every project's ``.idea`` directory is rendered in a process pool, then all their interpreters are added to the
+	PyCharm config directory of ``project`` with a single ``jdk.table.xml`` rewrite.
+
+	:param pybuilder.core.Project project: PyBuilder project instance whose PyCharm version is used
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:param list[str] project_directories: Directories holding the ``build.py`` file of every project
+	:param int or None processes: Number of worker processes (CPU count by default)
+	:return: Error of every project, ``None`` for the successful ones
+	:rtype: dict[str, Exception or None]
+	:raises BatchGenerationError: If the workspace of any project couldn't be generated
+	"""
+	logger.info(msg.BATCH_START.format(count=len(project_directories)))
+	pycharm_config_path = find_pycharm_config_path(project, logger)
+
+	results = {}
+	interpreters = {}
+	references = {}
+	for project_directory, result in map_projects(render_project_workspace, project_directories, processes).items():
+		if isinstance(result, Exception):
+			results[project_directory] = result
+		else:
+			interpreter_name, project_interpreter, reference = result
+			interpreters[interpreter_name] = project_interpreter
+			references.update([reference])
+			results[project_directory] = None
+
+	if interpreters:
+		interpreters_file_path = str(pycharm_config_path / 'jdk.table.xml')
+		try:
+			if register_interpreters(interpreters_file_path, interpreters, logger, references=references):
+				logger.debug(msg.INTERPRETER_FILE_OVERWRITTEN.format(interpreters_file_path=interpreters_file_path))
+		except Exception as error:
+			results.update({ directory: error for directory, result in results.items() if result is None })
+
+	for project_directory, error in results.items():
+		if error is None:
+			logger.info(msg.BATCH_PROJECT_SUCCESS.format(project_directory=project_directory))
+		else:
+			logger.error(msg.BATCH_PROJECT_FAILURE.format(project_directory=project_directory, error=error))
+	failures = sum(error is not None for error in results.values())
+	logger.info(msg.BATCH_FINISH.format(succeeded=len(results) - failures, failed=failures))
+	if failures:
+		raise BatchGenerationError(failures)
+	return results
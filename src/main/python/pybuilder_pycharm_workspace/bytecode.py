@@ -0,0 +1,165 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import importlib.util
+import os
+import py_compile
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+import pybuilder_pycharm_workspace.constants as const
+import pybuilder_pycharm_workspace.messages as msg
+from pybuilder_pycharm_workspace.virtualenvs import VERSION_PATTERN, find_virtualenv, project_virtualenv_path
+
+
+def prewarm_directories(project):
+	"""
+	Lists the directories whose modules are byte-compiled: the site-packages directories of the project's virtual
+	environment and the project source directories (``dir_source_*`` properties).
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:return: Existing directory paths
+	:rtype: list[str]
+	"""
+	venv_path = os.path.abspath(project_virtualenv_path(project))
+	directories = [path for path in find_virtualenv(venv_path).class_paths
+	               if os.path.commonpath([venv_path, os.path.abspath(path)]) == venv_path]
+	directories.extend(project.expand_path(f'${property_name}') for property_name in const.SOURCE_DIRECTORY_PROPERTIES
+	                   if project.get_property(property_name))
+	return [directory for directory in dict.fromkeys(directories) if os.path.isdir(directory)]
+
+
+def iter_sources(directory):
+	"""
+	Walks a directory looking for Python modules, skipping bytecode caches.
+
+	:param str directory: Directory path
+	:return: Generator of module paths
+	:rtype: collections.abc.Iterator[str]
+	"""
+	for root, directories, files in os.walk(directory):
+		directories[:] = [name for name in directories if name != '__pycache__']
+		for name in files:
+			if name.endswith('.py'):
+				yield os.path.join(root, name)
+
+
+def is_bytecode_stale(source_path):
+	"""
+	Checks whether the cached bytecode of a module is missing or out of date, reading only its header: the
+	interpreter magic number and the source modification time and size it was compiled from (hash based bytecode is
+	always considered up to date).
+
+	:param str source_path: Module path
+	:return: ``True`` if the module needs to be compiled
+	:rtype: bool
+	"""
+	try:
+		source_stat = os.stat(source_path)
+		with open(importlib.util.cache_from_source(source_path), 'rb') as bytecode_file:
+			header = bytecode_file.read(16)
+	except (OSError, ValueError):
+		return True
+	if len(header) < 16 or header[:4] != importlib.util.MAGIC_NUMBER:
+		return True
+	if int.from_bytes(header[4:8], 'little'):
+		return False
+	return (int.from_bytes(header[8:12], 'little') != int(source_stat.st_mtime) & 0xFFFFFFFF or
+	        int.from_bytes(header[12:16], 'little') != source_stat.st_size & 0xFFFFFFFF)
+
+
+def compile_sources(source_paths):
+	"""
+	Byte-compiles some modules, as ``import`` would do the first time they're imported.
+
+	:param list[str] source_paths: Module paths
+	:return: Number of modules compiled and failed, and seconds spent compiling
+	:rtype: tuple[int, int, float]
+	"""
+	compiled = failed = 0
+	start = time.perf_counter()
+	for source_path in source_paths:
+		try:
+			py_compile.compile(source_path, doraise=True, invalidation_mode=py_compile.PycInvalidationMode.TIMESTAMP)
+			compiled += 1
+		except (py_compile.PyCompileError, OSError, ValueError):
+			failed += 1
+	return compiled, failed, time.perf_counter() - start
+
+
+def prewarm_bytecode(project, logger, workers=None):
+	"""
+	Byte-compiles the modules of the project's virtual environment and source directories (see
+	``prewarm_directories``), so the first IDE run, build or test run don't pay for it.
+
+	Only modules whose bytecode is missing or stale are compiled, split among a pool of spawned worker processes (the
+	pre-warm may run along other threads, which forked workers could inherit in an inconsistent state). Bytecode
+	must match the virtual environment interpreter: when it isn't the running one (another Python version), the
+	virtual environment interpreter compiles them with ``compileall`` instead. Pre-warming is best effort: failures are
+	only logged, along with the ``compileall`` output when it fails.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:param int or None workers: Number of worker processes (CPU count by default)
+	:return: None
+	"""
+	venv_path = project_virtualenv_path(project)
+	virtualenv = find_virtualenv(venv_path)
+	directories = prewarm_directories(project)
+	logger.info(msg.BYTECODE_START.format(count=len(directories)))
+	start = time.perf_counter()
+
+	version_match = VERSION_PATTERN.match(virtualenv.version or '')
+	if version_match and (int(version_match.group(1)), int(version_match.group(2))) != sys.version_info[:2]:
+		if not os.path.isfile(virtualenv.interpreter_path):
+			logger.warn(msg.BYTECODE_NO_INTERPRETER.format(interpreter_path=virtualenv.interpreter_path))
+			return
+		try:
+			process = subprocess.run([virtualenv.interpreter_path, '-m', 'compileall', '-q', '-j', str(workers or 0), *directories],
+			                         stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, errors='replace')
+		except OSError as error:
+			logger.warn(msg.BYTECODE_FAILURE.format(error=error))
+			return
+		if process.returncode:
+			logger.warn(msg.BYTECODE_EXTERNAL_FAILURE.format(interpreter_path=virtualenv.interpreter_path,
+			                                                 return_code=process.returncode, output=process.stdout.strip()))
+			return
+		logger.info(msg.BYTECODE_EXTERNAL_FINISH.format(interpreter_path=virtualenv.interpreter_path,
+		                                                elapsed=time.perf_counter() - start))
+		return
+
+	sources = [source_path for directory in directories for source_path in iter_sources(directory)]
+	stale_sources = [source_path for source_path in sources if is_bytecode_stale(source_path)]
+	compiled = failed = 0
+	compile_time = 0.0
+	if stale_sources:
+		workers = workers or os.cpu_count() or 1
+		chunk_size = max(1, min(const.BYTECODE_CHUNK_SIZE, len(stale_sources) // workers))
+		chunks = [stale_sources[index:index + chunk_size] for index in range(0, len(stale_sources), chunk_size)]
+		try:
+			with ProcessPoolExecutor(min(workers, len(chunks)), mp_context=get_context('spawn')) as executor:
+				for chunk_compiled, chunk_failed, seconds in executor.map(compile_sources, chunks):
+					compiled += chunk_compiled
+					failed += chunk_failed
+					compile_time += seconds
+		except (OSError, BrokenProcessPool) as error:
+			logger.warn(msg.BYTECODE_FAILURE.format(error=error))
+			return
+	logger.info(msg.BYTECODE_FINISH.format(compiled=compiled, total=len(sources), failed=failed,
+	                                       elapsed=time.perf_counter() - start, compile_time=compile_time))
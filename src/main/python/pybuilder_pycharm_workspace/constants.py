@@ -17,3 +17,78 @@ IML_FILENAME = '{project_name}.iml'
 MODULES_FILENAME = 'modules.xml'
 MISC_FILENAME = 'misc.xml'
 WORKSPACE_FILENAME = 'workspace.xml'
+FINGERPRINT_FILENAME = '.pycharm_workspace_fingerprint.json'
+EXCLUSIONS_CACHE_FILENAME = '.pycharm_workspace_exclusions.json'
+TEST_TIMINGS_CACHE_FILENAME = '.pycharm_workspace_test_timings.json'
+RUN_CONFIGURATIONS_CACHE_FILENAME = '.pycharm_workspace_run_configurations.json'
+OWNED_CONFIGURATIONS_FILENAME = '.pycharm_workspace_configurations.json'
+
+FINGERPRINT_IGNORED_PROPERTIES = ('pycharm_workspace_force',
+                                  'pycharm_workspace_project_interpreter_name',
+                                  'pycharm_workspace_pycharm_config_path',
+                                  'pycharm_workspace_trace_format',
+                                  'pycharm_workspace_watch_debounce',
+                                  'pycharm_workspace_watch_polling',
+                                  'pycharm_workspace_profile_summary_size',
+                                  'pycharm_workspace_prune_dry_run',
+                                  'pycharm_workspace_prune_workers',
+                                  'pycharm_workspace_prewarm_workers')
+
+CACHE_DIRNAME = 'pybuilder_pycharm_workspace'
+REGISTRY_FILENAME = 'interpreters.sqlite3'
+DISCOVERY_CACHE_FILENAME = 'pycharm_configs.json'
+VERIFY_CACHE_FILENAME = 'verified_files.json'
+VIRTUALENVS_CACHE_FILENAME = 'virtualenvs.json'
+
+PYCHARM_PROFESSIONAL = 'professional'
+PYCHARM_COMMUNITY = 'community'
+
+LOCK_FILE_SUFFIX = '.lock'
+LOCK_TIMEOUT = 120.0
+LOCK_RETRY_DELAY = 0.05
+LOCK_MAX_RETRY_DELAY = 1.0
+
+TRACE_FORMAT_CHROME = 'chrome'
+TRACE_FORMAT_JSON = 'json'
+TRACE_FILENAME = 'pycharm_workspace_trace.json'
+REPORT_FILENAME = 'pycharm_workspace_report.json'
+
+PRUNE_WORKERS = 16
+PIPELINE_WORKERS = 6
+BYTECODE_CHUNK_SIZE = 200
+
+EXCLUDE_SCAN_DEPTH = 3
+EXCLUDE_SCAN_BUDGET = 20000
+EXCLUDED_DIRECTORY_PROPERTIES = ('dir_target', 'dir_dist')
+SOURCE_DIRECTORY_PROPERTIES = ('dir_source_main_python', 'dir_source_main_scripts', 'dir_source_unittest_python',
+                               'dir_source_integrationtest_python')
+EXCLUDED_DIRECTORY_NAMES = frozenset(('.tox', '.nox', '.eggs', '.mypy_cache', '.pytest_cache', '.hypothesis',
+                                      '.ipynb_checkpoints', '__pycache__', 'build', 'dist', 'htmlcov', 'node_modules',
+                                      '.venv', 'venv'))
+EXCLUDED_DIRECTORY_SUFFIXES = ('.egg-info', '.dist-info')
+SKIPPED_DIRECTORY_NAMES = frozenset(('.git', '.hg', '.svn'))
+HEAVY_DIRECTORY_FILES = 1000
+HEAVY_DIRECTORY_BYTES = 100 * 1024 * 1024
+
+MONOREPO_SCAN_DEPTH = 3
+MONOREPO_SDK_SHARED = 'shared'
+MONOREPO_SDK_MODULE = 'module'
+
+WATCH_DEBOUNCE = 0.5
+WATCH_POLL_INTERVAL = 1.0
+
+DEFAULT_REPORTS_DIRECTORY = 'target/reports'
+PROFILE_FILE_PREFIX = 'pycharm_workspace_profile_'
+PROFILE_SUMMARY_FILENAME = 'pycharm_workspace_profile_summary.txt'
+PROFILE_SUMMARY_SIZE = 30
+
+DEFAULT_UNITTEST_DIRECTORY = 'tests'
+DEFAULT_UNITTEST_MODULE_GLOB = '*_tests'
+TEST_SHARDS_AUTO = 'auto'
+
+RUN_CONFIGURATIONS_WORKSPACE = 'workspace'
+RUN_CONFIGURATIONS_DIRECTORIES = { 'idea': ('.idea/runConfigurations', '.xml'),
+                                   'run': ('.run', '.run.xml') }
+
+SHARED_SDK_FINGERPRINT_LENGTH = 12
+PYVENV_CFG_FINGERPRINT_KEYS = ('home', 'implementation', 'version', 'version_info', 'include-system-site-packages')
@@ -0,0 +1,163 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import json
+import os
+import re
+import sys
+from collections import namedtuple
+from pathlib import Path
+
+import pybuilder_pycharm_workspace.constants as const
+from pybuilder_pycharm_workspace.helpers import user_cache_directory, write_file_if_changed
+
+
+CONFIG_DIRECTORY_PATTERN = re.compile(r'^\.?PyCharm(?P<community>CE)?(?P<version>\d+(?:\.\d+)*)$')
+MAIN_VERSION_PATTERN = re.compile(r'^\d+(?:\.\d+)*$')
+
+PyCharmConfig = namedtuple('PyCharmConfig', ['path', 'edition', 'version', 'options_path'])
+PyCharmConfig.__doc__ = """
+PyCharm config directory found in the system.
+
+:param str path: Config directory path
+:param str edition: ``professional`` or ``community``
+:param tuple[int] version: Version numbers (e.g. ``(2019, 3)``)
+:param str options_path: Path of the directory holding ``jdk.table.xml`` file
+"""
+
+
+def config_parent_directories():
+	"""
+	Returns the directories where PyCharm creates its config directories, along with the layout they follow.
+
+	PyCharm 2019.3 and older versions keep ``~/.PyCharm<version>/config``, while newer ones use ``JetBrains/PyCharm<version>``
+	in the system config directory.
+
+	:return: Tuples of parent directory path and whether it holds legacy config directories
+	:rtype: list[tuple[str, bool]]
+	"""
+	home = Path.home()
+	if os.name == 'nt':
+		system_config_directory = Path(os.environ.get('APPDATA') or home / 'AppData' / 'Roaming')
+	elif sys.platform == 'darwin':
+		system_config_directory = home / 'Library' / 'Application Support'
+	else:
+		system_config_directory = Path(os.environ.get('XDG_CONFIG_HOME') or home / '.config')
+	return [(str(home), True), (str(system_config_directory / 'JetBrains'), False)]
+
+
+def scan_config_directories(parent_directory, legacy):
+	"""
+	Lists the PyCharm config directories inside a parent directory.
+
+	:param str parent_directory: Directory to scan
+	:param bool legacy: Whether the directory holds legacy (``~/.PyCharm<version>``) config directories
+	:return: Config directories found
+	:rtype: list[PyCharmConfig]
+	"""
+	configs = []
+	try:
+		entries = list(os.scandir(parent_directory))
+	except OSError:
+		return configs
+	for entry in entries:
+		match = CONFIG_DIRECTORY_PATTERN.match(entry.name)
+		if not match or entry.name.startswith('.') != legacy or not entry.is_dir():
+			continue
+		options_path = os.path.join(entry.path, 'config', 'options') if legacy else os.path.join(entry.path, 'options')
+		configs.append(PyCharmConfig(entry.path,
+		                             const.PYCHARM_COMMUNITY if match.group('community') else const.PYCHARM_PROFESSIONAL,
+		                             tuple(int(number) for number in match.group('version').split('.')),
+		                             options_path))
+	return configs
+
+
+def discover_pycharm_configs(save_cache=True):
+	"""
+	Lists every PyCharm config directory of the user, from the oldest version to the newest one.
+
+	The result is cached in the user cache directory along with the modification time of the scanned parent
+	directories, so they are only scanned again when a directory is added to or removed from them.
+
+	:param bool save_cache: Whether to update the cache after a scan
+	:return: Config directories found
+	:rtype: list[PyCharmConfig]
+	"""
+	parent_directories = config_parent_directories()
+	parent_mtimes = {}
+	for parent_directory, _ in parent_directories:
+		try:
+			parent_mtimes[parent_directory] = os.stat(parent_directory).st_mtime_ns
+		except OSError:
+			parent_mtimes[parent_directory] = None
+
+	cache_file_path = user_cache_directory() / const.DISCOVERY_CACHE_FILENAME
+	try:
+		with open(cache_file_path) as cache_file:
+			cache = json.load(cache_file)
+		if cache['parents'] == parent_mtimes:
+			return [PyCharmConfig(path, edition, tuple(version), options_path)
+			        for path, edition, version, options_path in cache['configs']]
+	except (OSError, ValueError, KeyError, TypeError):
+		pass
+
+	configs = []
+	for parent_directory, legacy in parent_directories:
+		configs.extend(scan_config_directories(parent_directory, legacy))
+	configs.sort(key=lambda config: (config.version, config.edition == const.PYCHARM_PROFESSIONAL))
+	if not save_cache:
+		return configs
+	try:
+		cache_file_path.parent.mkdir(parents=True, exist_ok=True)
+		write_file_if_changed(cache_file_path, json.dumps({ 'parents': parent_mtimes, 'configs': configs }))
+	except OSError:
+		pass
+	return configs
+
+
+def find_pycharm_config(main_version=None, edition=None, save_cache=True):
+	"""
+	Finds the newest PyCharm config directory matching a version and an edition.
+
+	Professional edition is preferred when both editions share the same version.
+
+	:param str or None main_version: Version prefix to match (e.g. ``2019`` or ``2019.3``), any version by default
+	:param str or None edition: ``professional`` or ``community``, any edition by default
+	:param bool save_cache: Whether to update the config directories cache (see ``discover_pycharm_configs``)
+	:return: Config directory found, or ``None`` if there is none
+	:rtype: PyCharmConfig or None
+	:raises ValueError: If the version isn't made of dot separated numbers
+	"""
+	version_prefix = parse_version_prefix(main_version)
+	for config in reversed(discover_pycharm_configs(save_cache)):
+		if config.version[:len(version_prefix)] == version_prefix and (not edition or config.edition == edition.lower()):
+			return config
+	return None
+
+
+def parse_version_prefix(main_version):
+	"""
+	Parses a version prefix such as ``2019`` or ``2019.3``.
+
+	:param str or None main_version: Version prefix, any version if empty
+	:return: Version numbers
+	:rtype: tuple[int]
+	:raises ValueError: If the version isn't made of dot separated numbers
+	"""
+	if not main_version:
+		return ()
+	if not MAIN_VERSION_PATTERN.match(str(main_version)):
+		raise ValueError(main_version)
+	return tuple(int(number) for number in str(main_version).split('.'))
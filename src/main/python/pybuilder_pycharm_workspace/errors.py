@@ -26,6 +26,18 @@ class MissingPropertyError(Exception):
 		super().__init__(message if message else msg.MISSING_PROPERTY_ERROR.format(property=property))
 
 
+class InvalidPropertyError(Exception):
+	def __init__(self, property, value, message=None):
+		"""
+		This exception is raised when a property value can't be used.
+
+		:param str property: Property name
+		:param value: Property value
+		:param str or None message: Custom exception message
+		"""
+		super().__init__(message if message else msg.INVALID_PROPERTY_ERROR.format(property=property, value=value))
+
+
 class NoPyCharmConfigDirError(Exception):
 	def __init__(self, message=None):
 		"""
@@ -44,3 +56,86 @@ class WritingFileError(Exception):
 		:param str or None message: Custom exception message
 		"""
 		super().__init__(message if message else msg.WRITING_FILE_ERROR.format(file=file_path, directory=directory))
+
+
+class FileLockTimeoutError(Exception):
+	def __init__(self, lock_file_path, timeout, message=None):
+		"""
+		This exception is raised when a lock file is held by another process for too long.
+
+		:param str lock_file_path: Lock file path
+		:param float timeout: Number of seconds waited
+		:param str or None message: Custom exception message
+		"""
+		super().__init__(message if message else msg.FILE_LOCK_TIMEOUT_ERROR.format(file=lock_file_path, timeout=timeout))
+
+
+class InterpretersFileError(Exception):
+	def __init__(self, interpreter_name, message=None):
+		"""
+		This exception is raised when PyCharm's interpreters file is malformed and the interpreter can't be placed on it.
+
+		:param str interpreter_name: Name of the interpreter being added
+		:param str or None message: Custom exception message
+		"""
+		super().__init__(message if message else msg.INTERPRETERS_FILE_ERROR.format(interpreter_name=interpreter_name))
+
+
+class InterpreterTemplateError(Exception):
+	def __init__(self, interpreter_name, message=None):
+		"""
+		This exception is raised when a rendered interpreter entry has no ``<jdk>`` element with a name.
+
+		:param str interpreter_name: Name of the interpreter being added
+		:param str or None message: Custom exception message
+		"""
+		super().__init__(message if message else msg.INTERPRETER_TEMPLATE_ERROR.format(interpreter_name=interpreter_name))
+
+
+class BatchGenerationError(Exception):
+	def __init__(self, failures, message=None):
+		"""
+		This exception is raised when the workspace of some projects couldn't be generated in batch mode.
+
+		:param int failures: Number of projects that failed
+		:param str or None message: Custom exception message
+		"""
+		super().__init__(message if message else msg.BATCH_GENERATION_ERROR.format(failures=failures))
+
+
+class WorkerError(Exception):
+	def __init__(self, error, message=None):
+		"""
+		This exception is raised in place of an error of a worker process that can't be sent back to the main process.
+
+		:param Exception error: Original error
+		:param str or None message: Custom exception message
+		"""
+		super().__init__(message if message else msg.WORKER_ERROR.format(error_type=type(error).__name__, error=error))
+
+	def __reduce__(self):
+		return type(self), (None, str(self))
+
+
+class WorkspaceDriftError(Exception):
+	def __init__(self, drifted_files, message=None):
+		"""
+		This exception is raised when the workspace files of the project are out of date.
+
+		:param int drifted_files: Number of files out of date
+		:param str or None message: Custom exception message
+		"""
+		super().__init__(message if message else msg.WORKSPACE_DRIFT_ERROR.format(count=drifted_files))
+
+
+class PipelineError(Exception):
+	def __init__(self, failures, message=None):
+		"""
+		This exception is raised when some stages of the workspace generation pipeline failed (and were rolled back).
+
+		:param dict[str, Exception] failures: Errors raised by the failed stages, by stage name
+		:param str or None message: Custom exception message
+		"""
+		self.failures = failures
+		super().__init__(message if message else msg.PIPELINE_ERROR.format(count=len(failures), failures='; '.join(
+			f'{stage} ({error})' for stage, error in failures.items())))
@@ -0,0 +1,212 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import json
+import os
+from collections import deque
+
+import pybuilder_pycharm_workspace.constants as const
+from pybuilder_pycharm_workspace.helpers import underscore, write_file_if_changed
+from pybuilder_pycharm_workspace.resources import templates as templates
+from pybuilder_pycharm_workspace.tracing import tracer
+from pybuilder_pycharm_workspace.virtualenvs import project_virtualenv_path
+
+
+def relative_project_path(project, path):
+	"""
+	Converts a path to a POSIX path relative to the project directory.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param str path: Absolute path, or relative to the project directory
+	:return: Relative path, or ``None`` if it's the project directory or it's outside of it
+	:rtype: str or None
+	"""
+	relative_path = os.path.relpath(os.path.join(str(project.get_property('pycharm_workspace_project_path')), path),
+	                                str(project.get_property('pycharm_workspace_project_path')))
+	if relative_path == os.curdir or relative_path.split(os.sep)[0] == os.pardir:
+		return None
+	return relative_path.replace(os.sep, '/')
+
+
+def property_excluded_folders(project):
+	"""
+	Lists the folders excluded from the project whatever their contents: the fixed ones, the virtual environment
+	(``pycharm_workspace_venv_path`` property) when it's inside the project and those the PyBuilder ``dir_*``
+	properties point to (target directory, and distribution directory when it's outside of the former).
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:return: Excluded folder paths relative to the project directory
+	:rtype: list[str]
+	"""
+	folders = list(templates.IML_EXCLUDED_FOLDERS)
+	paths = [str(project_virtualenv_path(project))]
+	paths.extend(project.expand_path(f'${property_name}') for property_name in const.EXCLUDED_DIRECTORY_PROPERTIES
+	             if project.get_property(property_name))
+	for path in paths:
+		folder = relative_project_path(project, path)
+		if folder and not any(is_at_or_below(folder, excluded) for excluded in folders):
+			folders.append(folder)
+	return folders
+
+
+def is_at_or_below(folder, parent):
+	"""
+	Tells whether a folder is another one or any folder inside it.
+
+	:param str folder: Folder path relative to the project directory
+	:param str parent: Folder path relative to the project directory
+	:return: ``True`` if ``folder`` is ``parent`` or one of its descendants
+	:rtype: bool
+	"""
+	return folder == parent or folder.startswith(parent + '/')
+
+
+def is_protected(folder, protected):
+	"""
+	Tells whether a folder must never be excluded: it's a source folder, is inside one or holds one.
+
+	:param str folder: Folder path relative to the project directory
+	:param list[str] protected: Source folder paths relative to the project directory (see ``protected_folders``)
+	:return: ``True`` if the folder must be indexed
+	:rtype: bool
+	"""
+	return any(is_at_or_below(folder, source) or is_at_or_below(source, folder) for source in protected)
+
+
+def protected_folders(project):
+	"""
+	Lists the source folders of the project, which are never excluded, nor any of their parents or their contents.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:return: Source folder paths relative to the project directory
+	:rtype: list[str]
+	"""
+	folders = [f'src/{underscore(project.name)}']
+	for property_name in const.SOURCE_DIRECTORY_PROPERTIES:
+		if project.get_property(property_name):
+			folder = relative_project_path(project, project.expand_path(f'${property_name}'))
+			if folder:
+				folders.append(folder)
+	return folders
+
+
+def scan_directory(path):
+	"""
+	Lists a directory, summing up its direct contents.
+
+	:param str path: Directory path
+	:return: Modification time, number of files, total size of the files, whether any of them is a Python module and
+	    names of the subdirectories (symbolic links excluded)
+	:rtype: list
+	"""
+	file_count, total_size, has_python, subdirectories = 0, 0, False, []
+	with os.scandir(path) as entries:
+		for entry in entries:
+			if entry.is_dir(follow_symlinks=False):
+				subdirectories.append(entry.name)
+			elif entry.is_file(follow_symlinks=False):
+				file_count += 1
+				total_size += entry.stat(follow_symlinks=False).st_size
+				has_python = has_python or entry.name.endswith('.py')
+	return [os.stat(path).st_mtime_ns, file_count, total_size, has_python, sorted(subdirectories)]
+
+
+def is_heavy_directory(file_count, total_size, has_python):
+	"""
+	Tells whether a directory looks like data or generated output PyCharm shouldn't index: it holds many files or
+	many bytes, and no Python module.
+
+	:param int file_count: Number of files in the directory
+	:param int total_size: Total size of the files in bytes
+	:param bool has_python: Whether any of the files is a Python module
+	:return: ``True`` if the directory should be excluded
+	:rtype: bool
+	"""
+	return not has_python and (file_count >= const.HEAVY_DIRECTORY_FILES or total_size >= const.HEAVY_DIRECTORY_BYTES)
+
+
+def discover_excluded_folders(project, max_depth=const.EXCLUDE_SCAN_DEPTH, budget=const.EXCLUDE_SCAN_BUDGET,
+                              save_cache=True):
+	"""
+	Finds the folders PyCharm shouldn't index in the project directory.
+
+	Besides the folders excluded by PyBuilder properties (see ``property_excluded_folders``), the project directory is
+	walked breadth first up to ``max_depth`` levels, or until ``budget`` directory entries were listed. Directories
+	with well-known generated names (``.tox``, ``build``, ``node_modules``...) and heavy directories (see
+	``is_heavy_directory``) are excluded and not walked further. Source folders, their parents and everything inside
+	them are never excluded (see ``is_protected``), so source folders aren't walked either.
+
+	The summary of every directory is cached in the ``.idea`` directory along with its modification time, so only the
+	directories with added, removed or renamed entries are listed again on later runs. Files growing in place don't
+	change the modification time of their directory, so such size changes are only noticed once the directory changes.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param int max_depth: Maximum depth of the walked directories (0 disables the walk)
+	:param int budget: Maximum number of directory entries listed
+	:param bool save_cache: Whether to update the directory summaries cache
+	:return: Excluded folder paths relative to the project directory, sorted
+	:rtype: list[str]
+	"""
+	project_path = str(project.get_property('pycharm_workspace_project_path'))
+	excluded = property_excluded_folders(project)
+	protected = protected_folders(project)
+	cache_file_path = os.path.join(project_path, '.idea', const.EXCLUSIONS_CACHE_FILENAME)
+	try:
+		with open(cache_file_path) as cache_file:
+			cached = json.load(cache_file)['directories']
+	except (OSError, ValueError, KeyError, TypeError):
+		cached = {}
+
+	scanned = {}
+	with tracer.phase('excluded folders discovery') as phase:
+		queue = deque([('', 0)]) if max_depth > 0 else deque()
+		while queue and budget > 0:
+			folder, depth = queue.popleft()
+			path = os.path.join(project_path, folder)
+			try:
+				summary = cached.get(folder)
+				if not summary or os.stat(path).st_mtime_ns != summary[0]:
+					summary = scan_directory(path)
+					phase.count(directories_listed=1)
+			except OSError:
+				continue
+			scanned[folder] = summary
+			_, file_count, total_size, has_python, subdirectories = summary
+			budget -= file_count + len(subdirectories)
+
+			if folder and not is_protected(folder, protected) and is_heavy_directory(file_count, total_size, has_python):
+				excluded.append(folder)
+				continue
+			if depth + 1 > max_depth:
+				continue
+			for name in subdirectories:
+				child = f'{folder}/{name}' if folder else name
+				if name in const.SKIPPED_DIRECTORY_NAMES or child in excluded \
+						or any(is_at_or_below(child, source) for source in protected):
+					continue
+				if name in const.EXCLUDED_DIRECTORY_NAMES or name.endswith(const.EXCLUDED_DIRECTORY_SUFFIXES):
+					if not is_protected(child, protected):
+						excluded.append(child)
+						continue
+				queue.append((child, depth + 1))
+		phase.count(directories=len(scanned))
+
+	if not save_cache:
+		return sorted(set(excluded))
+	try:
+		write_file_if_changed(cache_file_path, json.dumps({ 'directories': scanned }, sort_keys=True))
+	except OSError:
+		pass
+	return sorted(set(excluded))
@@ -0,0 +1,170 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import hashlib
+import json
+import os
+import sqlite3
+
+import pybuilder_pycharm_workspace.constants as const
+from pybuilder_pycharm_workspace.helpers import user_cache_directory, write_file_if_changed
+from pybuilder_pycharm_workspace.resources import templates as templates
+from pybuilder_pycharm_workspace.jdk_table import entry_hash, read_interpreter_entries
+from pybuilder_pycharm_workspace.registry import InterpretersRegistry
+from pybuilder_pycharm_workspace.shared_sdks import is_shared_sdk, shared_interpreter_name
+from pybuilder_pycharm_workspace.virtualenvs import project_virtualenv_path, virtualenv_stamps
+
+
+def compute_fingerprint(project, pycharm_config_path):
+	"""
+	Computes a digest of every input used to generate the PyCharm workspace.
+
+	The inputs are the plugin and directory properties of the project, the project name, the templates version, the
+	PyCharm config directory path, the project's interpreter name and the hash of its entry in ``jdk.table.xml`` (see
+	``interpreter_entry_hash``, so interpreters other projects register don't matter) and the modification data of the
+	virtual environment files the interpreter entry is read from (see ``virtualenvs.virtualenv_stamps``). The
+	modification times of the directories the excluded folders discovery listed (see
+	``exclusions.discover_excluded_folders``) are included too, so directories added to or removed from any of them
+	(which may have to be excluded) trigger a new generation. So does the unit test reports directory when test shards
+	are generated from its timings, and so does ``build.py``, which registers the tasks run configurations are derived
+	from. With ``pycharm_workspace_shared_sdk`` property set, the interpreter name is derived from the installed
+	distributions (see ``shared_sdks.shared_interpreter_name``).
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param str pycharm_config_path: PyCharm ``config/options`` directory path
+	:return: Hexadecimal digest, or ``None`` if the PyCharm config directory can't be inspected
+	:rtype: str or None
+	"""
+	if not pycharm_config_path or not os.path.isdir(pycharm_config_path):
+		return None
+	project_path = project.get_property('pycharm_workspace_project_path')
+	if is_shared_sdk(project):
+		interpreter_name = shared_interpreter_name(project)
+	else:
+		interpreter_name = templates.INTERPRETER_NAME.format(project_name=project_path.name)
+
+	properties = { key: value for key, value in project.properties.items()
+	               if key.startswith(('pycharm_workspace_', 'dir_')) and key not in const.FINGERPRINT_IGNORED_PROPERTIES }
+	inputs = { 'project_name': project.name,
+	           'properties': properties,
+	           'templates_version': templates.TEMPLATES_VERSION,
+	           'pycharm_config_path': str(pycharm_config_path),
+	           'interpreter': [interpreter_name,
+	                           interpreter_entry_hash(os.path.join(str(pycharm_config_path), 'jdk.table.xml'), interpreter_name)],
+	           'virtualenv': virtualenv_stamps(project_virtualenv_path(project)),
+	           'directories': scanned_directory_mtimes(project),
+	           'build_file': path_stamp(project_path / 'build.py') }
+	if project.get_property('pycharm_workspace_test_shards') and project.get_property('dir_target'):
+		inputs['test_reports_mtime'] = path_stamp(project.expand_path('$dir_target', 'reports'))[0]
+	return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def path_stamp(path):
+	"""
+	Reads the modification time and size of a file or directory.
+
+	:param str or pathlib.Path path: File or directory path
+	:return: Modification time and size, both ``None`` if the path doesn't exist
+	:rtype: list[int or None]
+	"""
+	try:
+		path_stat = os.stat(path)
+	except OSError:
+		return [None, None]
+	return [path_stat.st_mtime_ns, path_stat.st_size]
+
+
+def interpreter_entry_hash(interpreters_file_path, interpreter_name):
+	"""
+	Returns the hash of an interpreter entry (see ``jdk_table.entry_hash``), from the interpreters registry while the
+	interpreters file didn't change since it was indexed, or read from the file otherwise. The registry is only read.
+
+	:param str interpreters_file_path: ``jdk.table.xml`` file path
+	:param str interpreter_name: Interpreter name
+	:return: Entry hash, ``None`` if the file doesn't hold the interpreter
+	:rtype: str or None
+	"""
+	registry = None
+	if (user_cache_directory() / const.REGISTRY_FILENAME).is_file():
+		try:
+			registry = InterpretersRegistry(read_only=True)
+		except (OSError, sqlite3.Error):
+			pass
+	if registry:
+		with registry:
+			if registry.is_fresh(interpreters_file_path):
+				entry = registry.get(interpreters_file_path, interpreter_name)
+				return entry[3] if entry else None
+	interpreter = read_interpreter_entries(interpreters_file_path, [interpreter_name])[interpreter_name]
+	return entry_hash(interpreter) if interpreter else None
+
+
+def scanned_directory_mtimes(project):
+	"""
+	Reads the current modification times of the directories the last excluded folders discovery listed, as stored in
+	its cache (see ``exclusions.discover_excluded_folders``).
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:return: Modification time by directory path relative to the project directory, ``None`` for the missing ones
+	:rtype: dict[str, int or None]
+	"""
+	project_path = project.get_property('pycharm_workspace_project_path')
+	try:
+		with open(project_path / '.idea' / const.EXCLUSIONS_CACHE_FILENAME) as cache_file:
+			directories = json.load(cache_file)['directories']
+	except (OSError, ValueError, KeyError, TypeError):
+		return {}
+	return { folder: path_stamp(project_path / folder)[0] for folder in directories }
+
+
+def is_workspace_up_to_date(project):
+	"""
+	Checks whether the stored fingerprint of the last generated workspace matches the current inputs.
+
+	It doesn't glob for PyCharm config directories: the config directory stored along with the fingerprint is the one
+	checked. ``jdk.table.xml`` is only read when it changed since the interpreters registry indexed it.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:return: ``True`` if nothing changed since the last generation
+	:rtype: bool
+	"""
+	pycharm_idea_directory = project.get_property('pycharm_workspace_project_path') / '.idea'
+	try:
+		with open(pycharm_idea_directory / const.FINGERPRINT_FILENAME) as fingerprint_file:
+			state = json.load(fingerprint_file)
+		fingerprint, pycharm_config_path = state['fingerprint'], state['pycharm_config_path']
+	except (OSError, ValueError, KeyError, TypeError):
+		return False
+
+	for file_name in (const.IML_FILENAME.format(project_name=project.name), const.MODULES_FILENAME, const.MISC_FILENAME, const.WORKSPACE_FILENAME):
+		if not os.path.isfile(pycharm_idea_directory / file_name):
+			return False
+	return compute_fingerprint(project, pycharm_config_path) == fingerprint
+
+
+def save_workspace_fingerprint(project):
+	"""
+	Stores the fingerprint of the inputs used to generate the workspace in the ``.idea`` directory.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:return: None
+	"""
+	pycharm_config_path = project.get_property('pycharm_workspace_pycharm_config_path')
+	fingerprint = compute_fingerprint(project, pycharm_config_path)
+	if fingerprint is None:
+		return
+	pycharm_idea_directory = project.get_property('pycharm_workspace_project_path') / '.idea'
+	write_file_if_changed(pycharm_idea_directory / const.FINGERPRINT_FILENAME,
+	                      json.dumps({ 'fingerprint': fingerprint, 'pycharm_config_path': str(pycharm_config_path) }))
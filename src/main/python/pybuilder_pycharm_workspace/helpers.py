@@ -13,9 +13,32 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+import os
 import re
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
 
-from pybuilder_pycharm_workspace.errors import WritingFileError
+if os.name == 'nt':
+	import msvcrt
+else:
+	import fcntl
+
+import pybuilder_pycharm_workspace.constants as const
+from pybuilder_pycharm_workspace.errors import FileLockTimeoutError, WritingFileError
+
+
+def fill_template(template, **fields):
+	"""
+	Fills a template with some values.
+
+	:param str template: Text to format
+	:param dict[str, str] fields: Collection of template's fields with their values
+	:return: Filled template
+	:rtype: str
+	"""
+	return template.strip().format(**fields)
 
 
 def fill_and_write_template(template, output_path, **fields):
@@ -25,17 +48,178 @@ def fill_and_write_template(template, output_path, **fields):
 	:param str template: Text to format
 	:param str output_path: Path where the new file will be saved
 	:param dict[str, str] fields: Collection of template's fields with the new values to write
-	:return: None
+	:return: ``True`` if the file was written, ``False`` if it already had the same contents
+	:rtype: bool
 	:raises WritingFileError: If there was an error while trying to write the file
 	"""
 	try:
-		project_metadata = template.strip().format(**fields)
-		with open(output_path, 'w') as project_file:
-			project_file.write(project_metadata)
+		return write_file_if_changed(output_path, fill_template(template, **fields))
 	except:
 		raise WritingFileError(template, output_path)
 
 
+def write_file_if_changed(output_path, contents):
+	"""
+	Writes a text file atomically, only if its current contents differ from the new ones.
+
+	:param str or pathlib.Path output_path: Path where the file will be saved
+	:param str contents: Text to write
+	:return: ``True`` if the file was written, ``False`` if it already had the same contents
+	:rtype: bool
+	"""
+	return write_chunks_if_changed(output_path, lambda: (contents,))
+
+
+def file_has_contents(file_path, chunks):
+	"""
+	Compares a text file with some contents as they are generated, stopping at the first difference.
+
+	:param str file_path: File path
+	:param collections.abc.Iterable[str] chunks: Contents to compare
+	:return: ``True`` if the file exists and holds exactly the same contents
+	:rtype: bool
+	"""
+	try:
+		with open(file_path, encoding='utf-8', newline='') as current_file:
+			for chunk in chunks:
+				if current_file.read(len(chunk)) != chunk:
+					return False
+			return not current_file.read(1)
+	except (OSError, UnicodeDecodeError):
+		return False
+
+
+def write_chunks_if_changed(output_path, chunks_factory):
+	"""
+	Writes a text file atomically from streamed contents, only if its current contents differ from the new ones.
+
+	Contents are first compared with the current file as they are generated and, only if they differ, generated again
+	into a temporary file in the same directory, which then replaces the destination file. Readers never see a
+	half-written file and the whole contents are never held in memory. Line breaks are written and compared as they
+	are, with no platform translation.
+
+	:param str or pathlib.Path output_path: Path where the file will be saved
+	:param collections.abc.Callable[[], collections.abc.Iterable[str]] chunks_factory: Callable returning the contents
+	    to write as an iterable of strings (it may be called twice)
+	:return: ``True`` if the file was written, ``False`` if it already had the same contents
+	:rtype: bool
+	"""
+	output_path = str(output_path)
+	if file_has_contents(output_path, chunks_factory()):
+		return False
+
+	temp_file_path = f'{output_path}.{uuid.uuid4().hex}.tmp'
+	try:
+		with open(temp_file_path, 'x', encoding='utf-8', newline='') as temp_file:
+			temp_file.writelines(chunks_factory())
+		os.replace(temp_file_path, output_path)
+	except BaseException:
+		if os.path.exists(temp_file_path):
+			os.unlink(temp_file_path)
+		raise
+	return True
+
+
+def read_file_snapshot(file_path):
+	"""
+	Reads the current contents of a file, so they can be restored later with ``restore_file_snapshot``.
+
+	:param str or pathlib.Path file_path: File path
+	:return: File contents, ``None`` if the file doesn't exist
+	:rtype: bytes or None
+	"""
+	try:
+		with open(file_path, 'rb') as snapshot_file:
+			return snapshot_file.read()
+	except FileNotFoundError:
+		return None
+
+
+def restore_file_snapshot(file_path, contents):
+	"""
+	Puts back the contents of a file read with ``read_file_snapshot``, atomically.
+
+	:param str or pathlib.Path file_path: File path
+	:param bytes or None contents: File contents, ``None`` to remove the file
+	:return: None
+	"""
+	file_path = str(file_path)
+	if contents is None:
+		try:
+			os.unlink(file_path)
+		except FileNotFoundError:
+			pass
+		return
+	temp_file_path = f'{file_path}.{uuid.uuid4().hex}.tmp'
+	try:
+		with open(temp_file_path, 'xb') as temp_file:
+			temp_file.write(contents)
+		os.replace(temp_file_path, file_path)
+	except BaseException:
+		if os.path.exists(temp_file_path):
+			os.unlink(temp_file_path)
+		raise
+
+
+def lock_file_range(lock_file):
+	"""
+	Tries to lock the first byte of an open lock file without waiting.
+
+	:param io.BufferedRandom lock_file: Lock file open for update
+	:return: None
+	:raises OSError: If another process holds the lock
+	"""
+	if os.name == 'nt':
+		lock_file.seek(0)
+		msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+	else:
+		fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def unlock_file_range(lock_file):
+	"""
+	Releases the lock taken with ``lock_file_range``.
+
+	:param io.BufferedRandom lock_file: Lock file open for update
+	:return: None
+	"""
+	if os.name == 'nt':
+		lock_file.seek(0)
+		msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+	else:
+		fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def file_lock(lock_file_path, timeout=const.LOCK_TIMEOUT):
+	"""
+	Holds an exclusive advisory lock on a lock file while the context is active, waiting for other processes to
+	release it first. Attempts are retried with an exponential backoff until the timeout expires.
+
+	:param str lock_file_path: Lock file path (created if it doesn't exist)
+	:param float timeout: Maximum number of seconds to wait for the lock
+	:return: Context manager
+	:raises FileLockTimeoutError: If the lock couldn't be acquired in time
+	"""
+	with open(lock_file_path, 'a+b') as lock_file:
+		deadline = time.monotonic() + timeout
+		delay = const.LOCK_RETRY_DELAY
+		while True:
+			try:
+				lock_file_range(lock_file)
+				break
+			except OSError:
+				remaining = deadline - time.monotonic()
+				if remaining <= 0:
+					raise FileLockTimeoutError(lock_file_path, timeout) from None
+				time.sleep(min(delay, remaining))
+				delay = min(delay * 2, const.LOCK_MAX_RETRY_DELAY)
+		try:
+			yield
+		finally:
+			unlock_file_range(lock_file)
+
+
 def underscore(word):
 	"""
 	``underscore()`` function taken from ``inflection`` library.
@@ -51,3 +235,32 @@ def underscore(word):
 	word = re.sub(r"([a-z\d])([A-Z])", r"\1_\2", word)
 	word = word.replace('-', '_')
 	return word.lower()
+
+
+def to_bool(value):
+	"""
+	Converts a property value to boolean, accepting strings set from command line (``-P property=true``).
+
+	:param value: Property value
+	:return: Boolean value of the property
+	:rtype: bool
+	"""
+	if isinstance(value, str):
+		return value.strip().lower() in ('1', 'true', 'yes', 'on')
+	return bool(value)
+
+
+def user_cache_directory():
+	"""
+	Returns the directory where the plugin keeps its cache files for the current user.
+
+	It's ``%LOCALAPPDATA%`` on Windows and ``$XDG_CACHE_HOME`` (``~/.cache`` by default) on other systems.
+
+	:return: Plugin cache directory path (it may not exist yet)
+	:rtype: pathlib.Path
+	"""
+	if os.name == 'nt' and os.environ.get('LOCALAPPDATA'):
+		cache_directory = Path(os.environ['LOCALAPPDATA'])
+	else:
+		cache_directory = Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache')
+	return cache_directory / const.CACHE_DIRNAME
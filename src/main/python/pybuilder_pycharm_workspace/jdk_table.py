@@ -0,0 +1,386 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+from xml.sax.saxutils import escape, unescape
+
+from pybuilder_pycharm_workspace.errors import InterpreterTemplateError, InterpretersFileError
+from pybuilder_pycharm_workspace.tracing import tracer
+
+
+JDK_START = b'<jdk'
+JDK_END = b'</jdk>'
+COMPONENT_END = b'</component>'
+JDK_TABLE_COMPONENT_PATTERN = re.compile(rb'<component\s+name="ProjectJdkTable"\s*(/?)>')
+APPLICATION_END = b'</application>'
+EMPTY_INTERPRETERS_FILE = b'<application>\n  <component name="ProjectJdkTable">\n  </component>\n</application>\n'
+ENTRY_INDENT = b'    '
+JDK_PATTERN = re.compile(rb'<jdk\b.*?</jdk>', re.DOTALL)
+JDK_NAME_PATTERN = re.compile(rb'<name\s+value="([^"]*)"')
+JDK_HOME_PATH_PATTERN = re.compile(rb'<homePath\s+value="([^"]*)"')
+JDK_PROJECT_PATH_PATTERN = re.compile(rb'ASSOCIATED_PROJECT_PATH="([^"]*)"')
+
+
+def escape_attribute(value):
+	"""
+	Escapes a value the same way XML serializers do it for attribute values.
+
+	:param str value: Attribute value
+	:return: Escaped attribute value
+	:rtype: str
+	"""
+	return escape(value, { '"': '&quot;' })
+
+
+def unescape_attribute(value):
+	"""
+	Decodes and unescapes an attribute value read from an XML file.
+
+	:param bytes value: Raw attribute value
+	:return: Attribute value
+	:rtype: str
+	"""
+	return unescape(value.decode('utf-8'), { '&quot;': '"' })
+
+
+def entry_hash(interpreter):
+	"""
+	Hashes an interpreter entry ignoring its indentation and line breaks, so an entry read from the interpreters file
+	and the same one rendered from the template share the same hash.
+
+	:param bytes or str interpreter: ``<jdk>`` element text
+	:return: Hexadecimal digest
+	:rtype: str
+	"""
+	if isinstance(interpreter, str):
+		interpreter = interpreter.encode('utf-8')
+	return hashlib.sha1(b' '.join(interpreter.split())).hexdigest()
+
+
+def iter_interpreters(data):
+	"""
+	Iterates over every ``<jdk>`` element of the interpreters file without building any XML tree.
+
+	:param bytes or mmap.mmap data: ``jdk.table.xml`` file contents
+	:return: Generator of tuples with interpreter name, home path, associated project path (``None`` if missing),
+	    content hash and start and end offsets of the element
+	:rtype: collections.abc.Iterator[tuple[str, str or None, str or None, str, int, int]]
+	"""
+	for match in JDK_PATTERN.finditer(data):
+		entry = match.group(0)
+		name = JDK_NAME_PATTERN.search(entry)
+		if not name:
+			continue
+		home_path = JDK_HOME_PATH_PATTERN.search(entry)
+		project_path = JDK_PROJECT_PATH_PATTERN.search(entry)
+		yield (unescape_attribute(name.group(1)),
+		       unescape_attribute(home_path.group(1)) if home_path else None,
+		       unescape_attribute(project_path.group(1)) if project_path else None,
+		       entry_hash(entry), match.start(), match.end())
+
+
+def parse_interpreter(interpreter_name, interpreter):
+	"""
+	Reads the name, paths and content hash of a rendered interpreter entry (see ``iter_interpreters``).
+
+	:param str interpreter_name: Name the interpreter was rendered with
+	:param str interpreter: ``<jdk>`` element text
+	:return: Tuple as yielded by ``iter_interpreters``
+	:rtype: tuple[str, str or None, str or None, str, int, int]
+	:raises InterpreterTemplateError: If the entry has no ``<jdk>`` element with a name
+	"""
+	entry = next(iter_interpreters(interpreter.encode('utf-8')), None)
+	if entry is None:
+		raise InterpreterTemplateError(interpreter_name)
+	return entry
+
+
+def read_interpreters(interpreters_file_path):
+	"""
+	Reads every interpreter of the interpreters file, streaming it from a memory mapped file.
+
+	:param str interpreters_file_path: ``jdk.table.xml`` file path
+	:return: List of tuples as yielded by ``iter_interpreters``
+	:rtype: list[tuple[str, str or None, str or None, str, int, int]]
+	"""
+	try:
+		with open(interpreters_file_path, 'rb') as interpreters_file:
+			if not os.fstat(interpreters_file.fileno()).st_size:
+				return []
+			with mmap.mmap(interpreters_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+				return list(iter_interpreters(data))
+	except FileNotFoundError:
+		return []
+
+
+def find_interpreters(data, interpreter_names):
+	"""
+	Finds the byte offsets of the ``<jdk>`` elements of some interpreters in a single pass, without building any XML
+	tree.
+
+	:param bytes or mmap.mmap data: ``jdk.table.xml`` file contents
+	:param collections.abc.Iterable[str] interpreter_names: Names of the interpreters to look for
+	:return: Start and end offsets (end excluded) of every element found for each name, in file order
+	:rtype: dict[str, list[tuple[int, int]]]
+	:raises InterpretersFileError: If an element found is not properly closed
+	"""
+	escaped_names = sorted({ re.escape(escape_attribute(name).encode('utf-8')) for name in interpreter_names }, reverse=True)
+	if not escaped_names:
+		return {}
+	name_pattern = re.compile(rb'<name\s+value="(' + b'|'.join(escaped_names) + rb')"\s*/>')
+	interpreters = {}
+	for match in name_pattern.finditer(data):
+		interpreter_name = unescape_attribute(match.group(1))
+		start = data.rfind(JDK_START, 0, match.start())
+		end = data.find(JDK_END, match.end())
+		if start < 0 or end < 0:
+			raise InterpretersFileError(interpreter_name)
+		interpreters.setdefault(interpreter_name, []).append((start, end + len(JDK_END)))
+	return interpreters
+
+
+def find_interpreter(data, interpreter_name):
+	"""
+	Finds the byte offsets of the ``<jdk>`` element of an interpreter without building any XML tree.
+
+	:param bytes or mmap.mmap data: ``jdk.table.xml`` file contents
+	:param str interpreter_name: Name of the interpreter to look for
+	:return: Start and end offsets of the first element found (end excluded) or ``None`` if not found
+	:rtype: tuple[int, int] or None
+	:raises InterpretersFileError: If the element found is not properly closed
+	"""
+	spans = find_interpreters(data, [interpreter_name]).get(interpreter_name)
+	return spans[0] if spans else None
+
+
+def read_interpreter_entries(interpreters_file_path, interpreter_names):
+	"""
+	Reads the ``<jdk>`` elements of some interpreters, unindented so they can be put back with
+	``replace_interpreters`` exactly as they were.
+
+	:param str interpreters_file_path: ``jdk.table.xml`` file path
+	:param collections.abc.Iterable[str] interpreter_names: Names of the interpreters to read
+	:return: Element texts by name (the first one, if the name is duplicated), ``None`` for the interpreters not found
+	:rtype: dict[str, str or None]
+	:raises InterpretersFileError: If an element found is not properly closed
+	"""
+	entries = dict.fromkeys(interpreter_names)
+	try:
+		with open(interpreters_file_path, 'rb') as interpreters_file:
+			if not os.fstat(interpreters_file.fileno()).st_size:
+				return entries
+			with mmap.mmap(interpreters_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+				for interpreter_name, [(start, end), *_] in find_interpreters(data, entries).items():
+					indent = line_indent(data, start) or b''
+					lines = data[start:end].splitlines()
+					entries[interpreter_name] = b'\n'.join(lines[:1] + [line[len(indent):] if line.startswith(indent) else line
+					                                                     for line in lines[1:]]).decode('utf-8')
+	except FileNotFoundError:
+		pass
+	return entries
+
+
+def line_indent(data, offset):
+	"""
+	Returns the whitespace preceding an offset in its line, or ``None`` if there is any other character before it.
+
+	:param bytes or mmap.mmap data: File contents
+	:param int offset: Offset to inspect
+	:return: Indentation bytes
+	:rtype: bytes or None
+	"""
+	line_start = data.rfind(b'\n', 0, offset) + 1
+	indent = data[line_start:offset]
+	return indent if not indent.strip() else None
+
+
+def indent_entry(interpreter, indent):
+	"""
+	Indents every line of an interpreter entry but the first one, which is placed at an already indented offset.
+
+	:param str interpreter: ``<jdk>`` element text
+	:param bytes indent: Indentation to apply
+	:return: Encoded and indented element
+	:rtype: bytes
+	"""
+	lines = interpreter.strip().encode('utf-8').splitlines()
+	return b'\n'.join(lines[:1] + [indent + line for line in lines[1:]])
+
+
+def plan_insertion(data, interpreters):
+	"""
+	Computes where new interpreter entries go in the interpreters file.
+
+	:param bytes or mmap.mmap data: ``jdk.table.xml`` file contents
+	:param dict[str, str] interpreters: ``<jdk>`` element texts of the new interpreters by name
+	:return: Start and end offsets of the bytes to replace and the bytes to put instead
+	:rtype: tuple[int, int, bytes]
+	:raises InterpretersFileError: If the file has no place where the interpreters could be added
+	"""
+	entries = (b'\n' + ENTRY_INDENT).join(indent_entry(interpreter, ENTRY_INDENT) for interpreter in interpreters.values())
+	component = JDK_TABLE_COMPONENT_PATTERN.search(data)
+	if component and component.group(1):
+		return component.start(), component.end(), b'<component name="ProjectJdkTable">\n' + ENTRY_INDENT + entries + b'\n  </component>'
+	if component:
+		end = data.find(COMPONENT_END, component.end())
+		if end < 0:
+			raise InterpretersFileError(', '.join(interpreters))
+		indent = line_indent(data, end)
+		if indent is None:
+			return end, end, b'\n' + ENTRY_INDENT + entries + b'\n  '
+		line_start = end - len(indent)
+		return line_start, line_start, ENTRY_INDENT + entries + b'\n'
+
+	end = data.rfind(APPLICATION_END)
+	if end < 0:
+		raise InterpretersFileError(', '.join(interpreters))
+	return end, end, b'  <component name="ProjectJdkTable">\n' + ENTRY_INDENT + entries + b'\n  </component>\n'
+
+
+def removal_span(data, start, end):
+	"""
+	Widens the span of an element being removed to its whole lines when nothing else shares them, so removing it
+	doesn't leave blank lines behind.
+
+	:param bytes or mmap.mmap data: File contents
+	:param int start: Start offset of the element
+	:param int end: End offset of the element (excluded)
+	:return: Start and end offsets of the bytes to remove
+	:rtype: tuple[int, int]
+	"""
+	indent = line_indent(data, start)
+	if indent is None or data[end:end + 1] != b'\n':
+		return start, end
+	return start - len(indent), end + 1
+
+
+def plan_splices(data, interpreters):
+	"""
+	Computes every change needed to add some interpreters to the interpreters file, replacing the existing entries with
+	the same names in place, and to remove others. When a name is duplicated in the file, its first entry is replaced
+	and the rest are removed.
+
+	:param bytes or mmap.mmap data: ``jdk.table.xml`` file contents
+	:param dict[str, str or None] interpreters: ``<jdk>`` element texts of the interpreters by name, ``None`` for the
+	    interpreters to remove
+	:return: Sorted list of start and end offsets of the bytes to replace along with the bytes to put instead, and the
+	    names of the replaced or removed interpreters
+	:rtype: tuple[list[tuple[int, int, bytes]], set[str]]
+	:raises InterpretersFileError: If the file is malformed
+	"""
+	with tracer.phase('jdk table parse', bytes=len(data)) as phase:
+		old_interpreters = find_interpreters(data, interpreters)
+		phase.count(elements=sum(map(len, old_interpreters.values())))
+	with tracer.phase('jdk table replace', elements=len(interpreters)):
+		splices = []
+		for interpreter_name, [(start, end), *duplicates] in old_interpreters.items():
+			splices.extend(removal_span(data, *span) + (b'',) for span in duplicates)
+			if interpreters[interpreter_name] is None:
+				splices.append(removal_span(data, start, end) + (b'',))
+				continue
+			indent = line_indent(data, start)
+			splices.append((start, end, indent_entry(interpreters[interpreter_name], ENTRY_INDENT if indent is None else indent)))
+		new_interpreters = { name: interpreter for name, interpreter in interpreters.items()
+		                     if name not in old_interpreters and interpreter is not None }
+		if new_interpreters:
+			splices.append(plan_insertion(data, new_interpreters))
+	return sorted(splices), set(old_interpreters)
+
+
+def write_spliced(file_path, data, splices):
+	"""
+	Writes a copy of ``data`` with some byte ranges replaced into a temporary file next to ``file_path``.
+
+	Contents are copied through as raw slices, so the rest of the file is never decoded nor rebuilt.
+
+	:param str file_path: Destination file path
+	:param bytes or mmap.mmap data: Original file contents
+	:param list[tuple[int, int, bytes]] splices: Sorted, non overlapping start and end offsets of the replaced bytes
+	    along with the new bytes
+	:return: Temporary file path, to be moved in place of ``file_path`` once ``data`` is released
+	:rtype: str
+	"""
+	directory = os.path.dirname(os.path.abspath(file_path))
+	with tracer.phase('jdk table write') as phase, \
+			tempfile.NamedTemporaryFile(dir=directory, prefix='.jdk.table.', suffix='.tmp', delete=False) as temp_file:
+		try:
+			with memoryview(data) as view:
+				position = 0
+				for start, end, entry in splices:
+					temp_file.write(view[position:start])
+					temp_file.write(entry)
+					position = end
+				temp_file.write(view[position:])
+			phase.count(bytes_written=temp_file.tell())
+		except BaseException:
+			temp_file.close()
+			os.unlink(temp_file.name)
+			raise
+	return temp_file.name
+
+
+def replace_interpreters(interpreters_file_path, interpreters):
+	"""
+	Adds some interpreters to PyCharm's ``jdk.table.xml`` file in a single rewrite, replacing every other one with the
+	same names, and removes others.
+
+	The file is memory mapped and the old ``<jdk>`` elements are located by byte offset, so memory use stays flat and
+	runtime linear in file size no matter how many interpreters the file holds.
+
+	:param str interpreters_file_path: ``jdk.table.xml`` file path
+	:param dict[str, str or None] interpreters: ``<jdk>`` element texts of the interpreters by name, ``None`` for the
+	    interpreters to remove
+	:return: Names of the previous interpreters replaced or removed and whether the file was rewritten (it's not when
+	    every entry already had the same contents)
+	:rtype: tuple[set[str], bool]
+	:raises InterpretersFileError: If the interpreters file is malformed
+	"""
+	temp_file_path = None
+	try:
+		with open(interpreters_file_path, 'rb') as interpreters_file:
+			if os.fstat(interpreters_file.fileno()).st_size:
+				with mmap.mmap(interpreters_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+					splices, replaced = plan_splices(data, interpreters)
+					if all(data[start:end] == entry for start, end, entry in splices):
+						return replaced, False
+					temp_file_path = write_spliced(interpreters_file_path, data, splices)
+				os.chmod(temp_file_path, os.fstat(interpreters_file.fileno()).st_mode & 0o777)
+	except FileNotFoundError:
+		pass
+
+	if temp_file_path is None:
+		splices, replaced = plan_splices(EMPTY_INTERPRETERS_FILE, interpreters)
+		temp_file_path = write_spliced(interpreters_file_path, EMPTY_INTERPRETERS_FILE, splices)
+	os.replace(temp_file_path, interpreters_file_path)
+	return replaced, True
+
+
+def replace_interpreter(interpreters_file_path, interpreter_name, interpreter):
+	"""
+	Adds an interpreter to PyCharm's ``jdk.table.xml`` file, replacing any other one with the same name.
+
+	:param str interpreters_file_path: ``jdk.table.xml`` file path
+	:param str interpreter_name: Name of the interpreter
+	:param str interpreter: ``<jdk>`` element text of the interpreter
+	:return: ``True`` if a previous interpreter with the same name was replaced
+	:rtype: bool
+	:raises InterpretersFileError: If the interpreters file is malformed
+	"""
+	replaced, _ = replace_interpreters(interpreters_file_path, { interpreter_name: interpreter })
+	return bool(replaced)
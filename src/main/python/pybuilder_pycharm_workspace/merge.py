@@ -0,0 +1,277 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import re
+from xml.sax.saxutils import unescape
+
+from pybuilder_pycharm_workspace.errors import WritingFileError
+from pybuilder_pycharm_workspace.helpers import write_chunks_if_changed
+from pybuilder_pycharm_workspace.jdk_table import escape_attribute
+from pybuilder_pycharm_workspace.serializer import INDENT, iter_xml, write_document
+
+ROOT_END_PATTERN = re.compile(r'</project>\s*$')
+SELECTED_PATTERN = re.compile(r'\sselected="([^"]*)"')
+
+
+def find_element(text, tag, name, start=0, end=None, element_type=None):
+	"""
+	Locates the first element with some tag and ``name`` attribute (and ``type`` attribute, if given) in a range of an
+	XML document.
+
+	Elements of the same tag are expected not to nest, which holds for ``workspace.xml`` components and run
+	configurations.
+
+	:param str text: Document text
+	:param str tag: Element tag
+	:param str name: Unescaped ``name`` attribute value
+	:param int start: Start offset of the searched range
+	:param int end: End offset of the searched range (excluded), document end by default
+	:param str or None element_type: Unescaped ``type`` attribute value, any by default
+	:return: Start and end offsets of the element (end excluded) or ``None`` if not found
+	:rtype: tuple[int, int] or None
+	"""
+	end = len(text) if end is None else end
+	type_lookahead = rf'(?=[^>]*?\btype="{re.escape(escape_attribute(element_type))}")' if element_type is not None else ''
+	pattern = re.compile(rf'<{tag}\s(?=[^>]*?\bname="{re.escape(escape_attribute(name))}"){type_lookahead}[^>]*?(/?)>')
+	match = pattern.search(text, start, end)
+	if not match:
+		return None
+	if match.group(1):
+		return match.start(), match.end()
+	close_start = text.find(f'</{tag}>', match.end(), end)
+	if close_start < 0:
+		return None
+	return match.start(), close_start + len(tag) + 3
+
+
+def line_indent(text, offset):
+	"""
+	Returns the whitespace preceding an offset in its line, or ``None`` if there is any other character before it.
+
+	:param str text: Document text
+	:param int offset: Offset to inspect
+	:return: Indentation
+	:rtype: str or None
+	"""
+	indent = text[text.rfind('\n', 0, offset) + 1:offset]
+	return indent if not indent.strip() else None
+
+
+def removal_span(text, start, end):
+	"""
+	Widens the span of an element being removed to its whole line when nothing else shares it, so removing it doesn't
+	leave a blank line behind.
+
+	:param str text: Document text
+	:param int start: Start offset of the element
+	:param int end: End offset of the element (excluded)
+	:return: Start and end offsets of the text to remove
+	:rtype: tuple[int, int]
+	"""
+	indent = line_indent(text, start)
+	if indent is None or text[end:end + 1] != '\n':
+		return start, end
+	return start - len(indent), end + 1
+
+
+def render_element(node, indent):
+	"""
+	Serializes an element placed at an already indented offset, indenting its following lines.
+
+	:param pybuilder_pycharm_workspace.model.Node node: Element to serialize
+	:param str indent: Indentation of the element
+	:return: Element text without leading indentation nor trailing line break
+	:rtype: str
+	"""
+	return ''.join(indent + line for line in iter_xml(node))[len(indent):-1]
+
+
+def insert_children(text, parent_start, parent_end, tag, nodes):
+	"""
+	Computes the splice appending some children to an element, right before its closing tag.
+
+	:param str text: Document text
+	:param int parent_start: Start offset of the parent element
+	:param int parent_end: End offset of the parent element (excluded)
+	:param str tag: Parent element tag
+	:param list[pybuilder_pycharm_workspace.model.Node] nodes: Children to append
+	:return: Start and end offsets of the text to replace and the text to put instead
+	:rtype: tuple[int, int, str]
+	"""
+	parent_indent = line_indent(text, parent_start) or ''
+	child_indent = parent_indent + INDENT
+	children = ''.join(child_indent + render_element(node, child_indent) + '\n' for node in nodes)
+	if text.startswith('/>', parent_end - 2):
+		opening_tag = text[parent_start:parent_end - 2].rstrip()
+		return parent_start, parent_end, f'{opening_tag}>\n{children}{parent_indent}</{tag}>'
+	close_start = parent_end - len(tag) - 3
+	line_start = text.rfind('\n', 0, close_start) + 1
+	if text[line_start:close_start].strip():
+		return close_start, close_start, '\n' + children + parent_indent
+	return line_start, line_start, children
+
+
+def insert_before(text, offset, nodes):
+	"""
+	Computes the splice inserting some elements right before another one, at its indentation.
+
+	:param str text: Document text
+	:param int offset: Start offset of the following element
+	:param list[pybuilder_pycharm_workspace.model.Node] nodes: Elements to insert
+	:return: Start and end offsets of the text to replace and the text to put instead
+	:rtype: tuple[int, int, str]
+	"""
+	indent = line_indent(text, offset)
+	if indent is None:
+		return offset, offset, ''.join(render_element(node, '') for node in nodes)
+	line_start = offset - len(indent)
+	return line_start, line_start, ''.join(indent + render_element(node, indent) + '\n' for node in nodes)
+
+
+def merge_run_manager(text, run_manager, removed_configurations=()):
+	"""
+	Patches the run configurations owned by the plugin into an existing ``workspace.xml`` document.
+
+	Only the ``RunManager`` component is touched: configurations with the same types and names as the plugin ones are
+	replaced in place, missing ones are appended along with their ``list`` items, the removed ones (the ones the plugin
+	no longer renders or moved out of the document) are deleted, and every other byte of the document is kept. The
+	selected configuration is updated too, unless the user selected one the plugin doesn't own. The whole component is
+	appended to the document when it has none.
+
+	:param str text: Current document text
+	:param pybuilder_pycharm_workspace.model.Node run_manager: ``RunManager`` component rendered by the plugin
+	:param collections.abc.Iterable[tuple[str, str, str]] removed_configurations: Type, name and ``list`` item value
+	    of the configurations to remove
+	:return: Merged document text, or ``None`` if the document structure isn't recognised
+	:rtype: str or None
+	"""
+	root_end = ROOT_END_PATTERN.search(text)
+	if not root_end:
+		return None
+	component = find_element(text, 'component', 'RunManager', 0, root_end.start())
+	if component is None:
+		return text[:root_end.start()] + INDENT + render_element(run_manager, INDENT) + '\n' + text[root_end.start():]
+
+	component_start, component_end = component
+	if text.startswith('/>', component_end - 2):
+		indent = line_indent(text, component_start)
+		return text[:component_start] + render_element(run_manager, INDENT if indent is None else indent) + text[component_end:]
+	configurations = [node for node in run_manager.children if node.tag == 'configuration']
+	items = next((node.children for node in run_manager.children if node.tag == 'list'), ())
+	removed_configurations = list(removed_configurations)
+	splices, missing_configurations = [], []
+	for configuration in configurations:
+		attributes = dict(configuration.attributes)
+		span = find_element(text, 'configuration', attributes['name'], component_start, component_end, attributes['type'])
+		if span is None:
+			missing_configurations.append(configuration)
+			continue
+		indent = line_indent(text, span[0])
+		splices.append((span[0], span[1], render_element(configuration, INDENT * 2 if indent is None else indent)))
+	for configuration_type, name, item_value in removed_configurations:
+		span = find_element(text, 'configuration', name, component_start, component_end, configuration_type)
+		if span is not None:
+			splices.append(removal_span(text, *span) + ('',))
+		item = re.compile(rf'<item\s+itemvalue="{re.escape(escape_attribute(item_value))}"\s*/>').search(text, component_start, component_end)
+		if item:
+			splices.append(removal_span(text, *item.span()) + ('',))
+	owned_items = { dict(item.attributes)['itemvalue'] for item in items } | { item_value for _, _, item_value in removed_configurations }
+	selected_splice = patch_selected(text, component_start, dict(run_manager.attributes).get('selected'), owned_items)
+	if selected_splice:
+		splices.append(selected_splice)
+
+	list_match = re.compile(r'<list(\s[^>]*)?(/?)>').search(text, component_start, component_end)
+	if list_match and not list_match.group(2):
+		list_span = (list_match.start(), text.find('</list>', list_match.end(), component_end) + len('</list>'))
+	else:
+		list_span = list_match.span() if list_match else None
+	list_text = text[list_span[0]:list_span[1]] if list_span else ''
+	missing_items = [item for item in items
+	                 if f'itemvalue="{escape_attribute(dict(item.attributes)["itemvalue"])}"' not in list_text]
+
+	if not list_span:
+		new_children = missing_configurations + [node for node in run_manager.children if node.tag == 'list']
+		splices.append(insert_children(text, component_start, component_end, 'component', new_children))
+	else:
+		if missing_configurations:
+			splices.append(insert_before(text, list_span[0], missing_configurations))
+		if missing_items:
+			splices.append(insert_children(text, list_span[0], list_span[1], 'list', missing_items))
+
+	merged, offset = [], 0
+	for start, end, replacement in sorted(splices, key=lambda splice: splice[:2]):
+		merged.append(text[offset:start])
+		merged.append(replacement)
+		offset = end
+	merged.append(text[offset:])
+	return ''.join(merged)
+
+
+def patch_selected(text, component_start, selected, owned_items):
+	"""
+	Computes the splice setting the ``selected`` attribute of the ``RunManager`` component opening tag, unless it
+	already selects a configuration the plugin doesn't own.
+
+	:param str text: Document text
+	:param int component_start: Start offset of the component
+	:param str or None selected: ``list`` item value of the configuration to select, ``None`` to select none
+	:param set[str] owned_items: ``list`` item values of the configurations owned by the plugin
+	:return: Start and end offsets of the text to replace and the text to put instead, or ``None`` if the attribute
+	    is kept as it is
+	:rtype: tuple[int, int, str] or None
+	"""
+	tag_end = text.index('>', component_start)
+	current = SELECTED_PATTERN.search(text, component_start, tag_end)
+	if current and unescape(current.group(1), { '&quot;': '"' }) not in owned_items:
+		return None
+	attribute = f' selected="{escape_attribute(selected)}"' if selected else ''
+	if current:
+		return (current.start(), current.end(), attribute) if current.group(0) != attribute else None
+	return (tag_end, tag_end, attribute) if attribute else None
+
+
+def write_merged_workspace(output_path, root, removed_configurations=()):
+	"""
+	Writes a ``workspace.xml`` document, merging its ``RunManager`` component into the existing file if there is any.
+
+	The rest of the existing file (window layout, breakpoints, user run configurations...) is left byte-for-byte
+	identical, and the file isn't written at all when the merge doesn't change it. Missing, empty or unrecognised files
+	are replaced by the whole document.
+
+	:param str or pathlib.Path output_path: ``workspace.xml`` file path
+	:param pybuilder_pycharm_workspace.model.Node root: Whole document rendered by the plugin
+	:param collections.abc.Iterable[tuple[str, str, str]] removed_configurations: Type, name and ``list`` item value
+	    of the run configurations to remove (see ``merge_run_manager``)
+	:return: ``True`` if the file was written
+	:rtype: bool
+	:raises WritingFileError: If there was an error while trying to write the file
+	"""
+	try:
+		with open(output_path, encoding='utf-8') as workspace_file:
+			text = workspace_file.read()
+	except (OSError, UnicodeDecodeError):
+		text = ''
+	run_manager = next((node for node in root.children
+	                    if node.tag == 'component' and ('name', 'RunManager') in node.attributes), None)
+	merged = merge_run_manager(text, run_manager, removed_configurations) if text.strip() and run_manager else None
+	if merged is None:
+		return write_document(output_path, root)
+	if merged == text:
+		return False
+	try:
+		return write_chunks_if_changed(output_path, lambda: (merged,))
+	except OSError:
+		raise WritingFileError(os.path.basename(output_path), os.path.dirname(output_path))
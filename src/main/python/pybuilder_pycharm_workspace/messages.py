@@ -14,6 +14,13 @@
 #   limitations under the License.
 
 TASK_DESCRIPTION_GENERATE_PYCHARM_WORKSPACE = "Generates PyCharm workspace files fo the current project"
+TASK_DESCRIPTION_GENERATE_PYCHARM_WORKSPACES = "Generates PyCharm workspace files for every project listed in pycharm_workspace_batch_projects"
+TASK_DESCRIPTION_GENERATE_PYCHARM_MONOREPO_WORKSPACE = "Generates a single PyCharm workspace with a module for every PyBuilder sub-project of the current project"
+TASK_DESCRIPTION_WATCH_PYCHARM_WORKSPACE = "Watches the current project and regenerates PyCharm workspace files affected by every change"
+TASK_DESCRIPTION_SUMMARIZE_PROFILES = "Summarises the profiles written by PyCharm profiling run configurations into the hottest functions"
+TASK_DESCRIPTION_VERIFY_PYCHARM_WORKSPACE = "Checks, without writing anything, that PyCharm workspace files of the current project are up to date"
+TASK_DESCRIPTION_PRUNE_INTERPRETERS = "Removes PyCharm interpreters created by the plugin whose virtualenv or project no longer exists"
+TASK_DESCRIPTION_LIST_INTERPRETERS = "Lists PyCharm interpreters created by the plugin across all projects"
 
 INTERPRETER_START = "Creating new Python interpreter for project's virtualenv"
 INTERPRETER_PYCHARM_LATEST = "Latest PyCharm config directory detected: {pycharm_config_name}"
@@ -21,12 +28,79 @@ INTERPRETER_PYCHARM_LATEST_PATH = "PyCharm config directory detected: '{pycharm_
 INTERPRETER_NEW_NAME = "New Python interpreter name: '{interpreter_name}'"
 INTERPRETER_FOUND = "A Python interpreter found with the same name (replacing it)"
 INTERPRETER_FILE_OVERWRITTEN = "'{interpreters_file_path}' file overwritten"
+INTERPRETER_UP_TO_DATE = "Python interpreter '{interpreter_name}' is up to date"
+INTERPRETER_LIST_ENTRY = "{name}: '{home_path}' (project '{project_path}', {interpreters_file_path})"
+INTERPRETER_LIST_EMPTY = "No Python interpreters created by the plugin found"
+PRUNE_START = "Looking for stale Python interpreters in '{interpreters_file_path}'"
+PRUNE_STALE_ENTRY = "Stale Python interpreter {name}: '{home_path}' (project '{project_path}', {size} bytes)"
+PRUNE_NOTHING = "No stale Python interpreters found"
+PRUNE_DRY_RUN = "Dry run: {count} stale Python interpreters would be removed ({size} bytes)"
+PRUNE_FINISH = "{count} stale Python interpreters removed, interpreters file shrank from {size_before} to {size_after} bytes ({ratio:.1%} smaller)"
+SHARED_SDK_REFERENCES = "Shared Python interpreter '{interpreter_name}' used by {count} projects"
+SHARED_SDK_RELEASED = "Shared Python interpreter '{interpreter_name}' no longer used by any project (removing it)"
+REGISTRY_UNAVAILABLE = "Interpreters registry can't be used, interpreters file will be read instead: {error}"
 
 WORKSPACE_START = "Generating PyCharm project files"
 WORKSPACE_CREATING_IDEA_DIRECTORY = "Creating new .idea directory"
 WORKSPACE_CREATING_FILE = "Creating new {file_name} file in PyCharm .idea directory"
 WORKSPACE_FINISH = "PyCharm workspace created"
+WORKSPACE_RUN_CONFIGURATIONS_UNKNOWN_LOCATION = "Unknown run configurations location '{location}' (use 'workspace', 'idea' or 'run'), they will be written into workspace.xml"
+WORKSPACE_RUN_CONFIGURATIONS_WRITTEN = "{changed} run configuration files written or removed ({count} run configurations)"
+WORKSPACE_UP_TO_DATE = "PyCharm workspace is up to date (set 'pycharm_workspace_force' property to regenerate it)"
+VERIFY_DRIFT = "{file_name} is out of date:"
+VERIFY_MISSING_FILE = "File not found"
+VERIFY_MISSING_INTERPRETER = "Python interpreter '{interpreter_name}' not found"
+VERIFY_INTERPRETER_SKIPPED = "No PyCharm configuration directory found, the project interpreter is not checked"
+VERIFY_LEFTOVER_FILE = "File no longer generated, it would be removed"
+VERIFY_UP_TO_DATE = "PyCharm workspace files are up to date"
+
+BATCH_START = "Generating PyCharm workspaces for {count} projects"
+BATCH_PROJECT_SUCCESS = "'{project_directory}': workspace generated"
+BATCH_PROJECT_FAILURE = "'{project_directory}': workspace not generated ({error})"
+BATCH_FINISH = "PyCharm workspaces generated: {succeeded} succeeded, {failed} failed"
+
+MONOREPO_START = "Generating PyCharm workspace for {count} sub-projects"
+MONOREPO_UNKNOWN_SDK_MODE = "Unknown SDK mode '{sdk_mode}' (use 'shared' or 'module'), modules will share the project interpreter"
+MONOREPO_MODULE_SUCCESS = "'{module_directory}': module generated"
+MONOREPO_MODULE_FAILURE = "'{module_directory}': module not generated ({error})"
+MONOREPO_FINISH = "PyCharm workspace generated with {modules} modules and {interpreters} interpreters, {failed} sub-projects failed"
+
+WATCH_START = "Watching {count} paths for changes ({watcher}), press Ctrl+C to stop"
+WATCH_CHANGES = "Changed: {paths} (regenerating {artifacts})"
+WATCH_REGENERATION_FAILURE = "PyCharm workspace couldn't be regenerated: {error}"
+WATCH_STOPPED = "Stopped watching for changes"
+
+PROFILE_NOT_FOUND = "No profiles found in '{reports_path}', run any 'profile' run configuration first"
+PROFILE_SUMMARY_HEADER = "Hottest functions of {count} profiles ({total:.3f} s in total):"
+PROFILE_SOURCE = "  {profile_path}"
+PROFILE_SUMMARY_WRITTEN = "Profile summary written to '{summary_path}'"
+
+BYTECODE_START = "Pre-compiling the bytecode of {count} virtualenv and source directories"
+BYTECODE_FINISH = "Bytecode pre-warmed in {elapsed:.2f} s: {compiled} of {total} modules compiled ({compile_time:.2f} s of compilation across workers), {failed} failed"
+BYTECODE_EXTERNAL_FINISH = "Bytecode pre-warmed by '{interpreter_path}' in {elapsed:.2f} s"
+BYTECODE_EXTERNAL_FAILURE = "Bytecode pre-warm by '{interpreter_path}' failed with exit code {return_code}:\n{output}"
+BYTECODE_FAILURE = "Bytecode couldn't be pre-warmed: {error}"
+BYTECODE_NO_INTERPRETER = "Virtualenv interpreter '{interpreter_path}' not found, bytecode not pre-warmed"
+
+PIPELINE_STAGE_FAILURE = "Stage '{stage}' failed: {error}"
+PIPELINE_STAGE_SKIPPED = "Stage '{stage}' skipped, a previous stage failed"
+PIPELINE_STAGE_ROLLED_BACK = "Stage '{stage}' rolled back"
+PIPELINE_UNKNOWN_DEPENDENCIES = "depends on unknown stages {dependencies}"
+PIPELINE_ROLLBACK_FAILURE = "Stage '{stage}' couldn't be rolled back: {error}"
+
+TRACE_TOTAL = "PyCharm workspace task took {elapsed:.1f} ms ({count} phases timed)"
+TRACE_SUMMARY = "PyCharm workspace phase timings:"
+TRACE_WRITTEN = "Phase timings written to '{output_path}'"
+TRACE_UNKNOWN_FORMAT = "Unknown trace format '{trace_format}' (use 'chrome' or 'json'), phase timings not written"
 
 MISSING_PROPERTY_ERROR = "Plugin property '{property}' not set in build.py file"
+INVALID_PROPERTY_ERROR = "Plugin property '{property}' has an invalid value '{value}' in build.py file"
 NO_PYCHARM_CONFIG_DIR_ERROR = "No PyCharm configuration directory found in user system path. Please launch PyCharm for the first time"
 WRITING_FILE_ERROR = "There was an error trying to write '{file}' into {directory} directory"
+FILE_LOCK_TIMEOUT_ERROR = "Lock file '{file}' is still held by another process after {timeout} seconds"
+INTERPRETERS_FILE_ERROR = "PyCharm interpreters file is malformed, '{interpreter_name}' interpreter can't be added to it"
+INTERPRETER_TEMPLATE_ERROR = "Python interpreter '{interpreter_name}' template has no <jdk> element with a name"
+BATCH_GENERATION_ERROR = "PyCharm workspace couldn't be generated for {failures} projects"
+PIPELINE_ERROR = "PyCharm workspace couldn't be generated, {count} stages failed: {failures}"
+WORKER_ERROR = "{error_type} in worker process: {error}"
+WORKSPACE_DRIFT_ERROR = "PyCharm workspace is out of date in {count} files, run generate_pycharm_workspace task to update it"
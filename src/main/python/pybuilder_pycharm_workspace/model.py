@@ -0,0 +1,315 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+PYTHON_CONFIGURATION_TYPE = 'PythonConfigurationType'
+TESTS_CONFIGURATION_TYPE = 'tests'
+COMPOUND_CONFIGURATION_TYPE = 'CompoundRunConfigurationType'
+
+
+class Node:
+	"""
+	XML element of a PyCharm document.
+
+	Attributes are kept as a tuple of name and value pairs so elements with the same tag and attribute names share the
+	same compiled shape in the serializer (see ``serializer.iter_xml``).
+	"""
+	__slots__ = ('tag', 'attributes', 'children')
+
+	def __init__(self, tag, attributes=(), children=()):
+		"""
+		:param str tag: Element tag
+		:param tuple[tuple[str, str]] attributes: Attribute names and unescaped values
+		:param list[Node] or tuple[Node] children: Child elements
+		"""
+		self.tag = tag
+		self.attributes = tuple(attributes)
+		self.children = children
+
+
+def option(name, value):
+	"""
+	Builds an ``<option>`` element.
+
+	:param str name: Option name
+	:param str value: Option value
+	:return: Option element
+	:rtype: Node
+	"""
+	return Node('option', (('name', name), ('value', value)))
+
+
+class SourceFolder:
+	"""
+	Source folder of a module content root.
+	"""
+	__slots__ = ('path', 'is_test_source')
+
+	def __init__(self, path, is_test_source=False):
+		"""
+		:param str path: Folder path relative to the module directory
+		:param bool is_test_source: Whether the folder holds tests
+		"""
+		self.path = path
+		self.is_test_source = is_test_source
+
+	def to_node(self):
+		return Node('sourceFolder', (('url', f'file://$MODULE_DIR$/{self.path}'),
+		                             ('isTestSource', 'true' if self.is_test_source else 'false')))
+
+
+class ExcludeFolder:
+	"""
+	Folder excluded from a module content root.
+	"""
+	__slots__ = ('path',)
+
+	def __init__(self, path):
+		"""
+		:param str path: Folder path relative to the module directory
+		"""
+		self.path = path
+
+	def to_node(self):
+		return Node('excludeFolder', (('url', f'file://$MODULE_DIR$/{self.path}'),))
+
+
+class PythonRunConfiguration:
+	"""
+	Run configuration launching a Python script.
+	"""
+	__slots__ = ('name', 'module_name', 'parameters', 'script_name', 'working_directory', 'interpreter_options', 'envs')
+	type_label = 'Python'
+	configuration_type = PYTHON_CONFIGURATION_TYPE
+
+	def __init__(self, name, module_name, parameters, script_name='$PROJECT_DIR$/build.py',
+	             working_directory='$PROJECT_DIR$', interpreter_options='', envs=(('PYTHONUNBUFFERED', '1'),)):
+		"""
+		:param str name: Configuration name
+		:param str module_name: Name of the module the configuration belongs to
+		:param str parameters: Script parameters
+		:param str script_name: Script path
+		:param str working_directory: Working directory
+		:param str interpreter_options: Python interpreter options
+		:param tuple[tuple[str, str]] envs: Environment variables names and values
+		"""
+		self.name = name
+		self.module_name = module_name
+		self.parameters = parameters
+		self.script_name = script_name
+		self.working_directory = working_directory
+		self.interpreter_options = interpreter_options
+		self.envs = envs
+
+	def to_node(self):
+		return Node('configuration', (('name', self.name), ('type', self.configuration_type), ('factoryName', 'Python')), (
+			Node('module', (('name', self.module_name),)),
+			option('INTERPRETER_OPTIONS', self.interpreter_options),
+			option('PARENT_ENVS', 'true'),
+			Node('envs', (), [Node('env', (('name', name), ('value', value))) for name, value in self.envs]),
+			option('SDK_HOME', ''),
+			option('WORKING_DIRECTORY', self.working_directory),
+			option('IS_MODULE_SDK', 'true'),
+			option('ADD_CONTENT_ROOTS', 'true'),
+			option('ADD_SOURCE_ROOTS', 'true'),
+			Node('EXTENSION', (('ID', 'PythonCoverageRunConfigurationExtension'), ('runner', 'coverage.py'))),
+			option('SCRIPT_NAME', self.script_name),
+			option('PARAMETERS', self.parameters),
+			option('SHOW_COMMAND_LINE', 'false'),
+			option('EMULATE_TERMINAL', 'false'),
+			option('MODULE_MODE', 'false'),
+			option('REDIRECT_INPUT', 'false'),
+			option('INPUT_FILE', ''),
+			Node('method', (('v', '2'),))))
+
+
+class UnittestsRunConfiguration:
+	"""
+	Run configuration launching ``unittest`` tests of a directory, or of a custom list of test modules.
+	"""
+	__slots__ = ('name', 'module_name', 'target', 'pattern', 'target_type', 'additional_arguments', 'working_directory')
+	type_label = 'Python tests'
+	configuration_type = TESTS_CONFIGURATION_TYPE
+
+	def __init__(self, name, module_name, target, pattern='test_*.py', target_type='PATH', additional_arguments='',
+	             working_directory=''):
+		"""
+		:param str name: Configuration name
+		:param str module_name: Name of the module the configuration belongs to
+		:param str target: Tests directory path (empty for ``CUSTOM`` target type)
+		:param str pattern: Test files pattern
+		:param str target_type: ``PATH`` to run the tests of ``target``, ``CUSTOM`` to pass ``additional_arguments``
+		    to ``unittest`` instead
+		:param str additional_arguments: Additional ``unittest`` arguments, such as test module names
+		:param str working_directory: Working directory
+		"""
+		self.name = name
+		self.module_name = module_name
+		self.target = target
+		self.pattern = pattern
+		self.target_type = target_type
+		self.additional_arguments = additional_arguments
+		self.working_directory = working_directory
+
+	def to_node(self):
+		return Node('configuration', (('name', self.name), ('type', self.configuration_type), ('factoryName', 'Unittests'),
+		                              ('nameIsGenerated', 'true')), (
+			Node('module', (('name', self.module_name),)),
+			option('INTERPRETER_OPTIONS', ''),
+			option('PARENT_ENVS', 'true'),
+			option('SDK_HOME', ''),
+			option('WORKING_DIRECTORY', self.working_directory),
+			option('IS_MODULE_SDK', 'true'),
+			option('ADD_CONTENT_ROOTS', 'true'),
+			option('ADD_SOURCE_ROOTS', 'true'),
+			Node('EXTENSION', (('ID', 'PythonCoverageRunConfigurationExtension'), ('runner', 'coverage.py'))),
+			option('_new_pattern', f'"{self.pattern}"'),
+			option('_new_additionalArguments', f'"{self.additional_arguments}"'),
+			option('_new_target', f'"{self.target}"'),
+			option('_new_targetType', f'"{self.target_type}"'),
+			Node('method', (('v', '2'),))))
+
+
+class CompoundRunConfiguration:
+	"""
+	Run configuration launching other run configurations concurrently.
+	"""
+	__slots__ = ('name', 'configurations')
+	type_label = 'Compound Run Configuration'
+	configuration_type = COMPOUND_CONFIGURATION_TYPE
+
+	def __init__(self, name, configurations):
+		"""
+		:param str name: Configuration name
+		:param list[PythonRunConfiguration or UnittestsRunConfiguration] configurations: Configurations to launch
+		"""
+		self.name = name
+		self.configurations = configurations
+
+	def to_node(self):
+		return Node('configuration', (('name', self.name), ('type', self.configuration_type)), (
+			*(Node('toRun', (('name', configuration.name), ('type', configuration.configuration_type)))
+			  for configuration in self.configurations),
+			Node('method', (('v', '2'),))))
+
+
+def configuration_item(configuration):
+	"""
+	Returns the identifier PyCharm uses to reference a run configuration.
+
+	:param PythonRunConfiguration or UnittestsRunConfiguration or CompoundRunConfiguration configuration: Run
+	    configuration
+	:return: Configuration identifier
+	:rtype: str
+	"""
+	return f'{configuration.type_label}.{configuration.name}'
+
+
+def configuration_entry(configuration):
+	"""
+	Returns what identifies a run configuration in ``workspace.xml`` file: its type, its name and the ``list`` item
+	value referencing it.
+
+	:param PythonRunConfiguration or UnittestsRunConfiguration or CompoundRunConfiguration configuration: Run
+	    configuration
+	:return: Configuration type, name and item value
+	:rtype: tuple[str, str, str]
+	"""
+	return configuration.configuration_type, configuration.name, configuration_item(configuration)
+
+
+def run_manager_component(configurations, selected=None):
+	"""
+	Builds the ``RunManager`` component holding some run configurations.
+
+	:param list[PythonRunConfiguration or UnittestsRunConfiguration or CompoundRunConfiguration] configurations: Run
+	    configurations, in the order they are listed by PyCharm
+	:param PythonRunConfiguration or UnittestsRunConfiguration or None selected: Configuration selected by default
+	:return: Component element
+	:rtype: Node
+	"""
+	attributes = (('name', 'RunManager'),) + ((('selected', configuration_item(selected)),) if selected else ())
+	return Node('component', attributes, (
+		*(configuration.to_node() for configuration in configurations),
+		Node('list', (), [Node('item', (('itemvalue', configuration_item(configuration)),)) for configuration in configurations])))
+
+
+def properties_component(properties):
+	"""
+	Builds the ``PropertiesComponent`` component.
+
+	:param tuple[tuple[str, str]] properties: Property names and values
+	:return: Component element
+	:rtype: Node
+	"""
+	return Node('component', (('name', 'PropertiesComponent'),),
+	            [Node('property', (('name', name), ('value', value))) for name, value in properties])
+
+
+def workspace_document(components):
+	"""
+	Builds a ``workspace.xml`` document.
+
+	:param collections.abc.Iterable[Node] components: Document components
+	:return: Root element
+	:rtype: Node
+	"""
+	return Node('project', (('version', '4'),), components)
+
+
+def run_configuration_document(configuration):
+	"""
+	Builds a shared run configuration document (``.idea/runConfigurations`` or ``.run`` directory file).
+
+	:param PythonRunConfiguration or UnittestsRunConfiguration or CompoundRunConfiguration configuration: Run
+	    configuration
+	:return: Root element
+	:rtype: Node
+	"""
+	return Node('component', (('name', 'ProjectRunConfigurationManager'),), (configuration.to_node(),))
+
+
+def module_document(source_folders, exclude_folders, interpreter_name):
+	"""
+	Builds a module (IML) document with a single content root in the module directory.
+
+	:param list[SourceFolder] source_folders: Source folders
+	:param list[ExcludeFolder] exclude_folders: Excluded folders
+	:param str interpreter_name: Name of the module interpreter
+	:return: Root element
+	:rtype: Node
+	"""
+	return Node('module', (('type', 'PYTHON_MODULE'), ('version', '4')), (
+		Node('component', (('name', 'NewModuleRootManager'),), (
+			Node('content', (('url', 'file://$MODULE_DIR$'),),
+			     [folder.to_node() for folder in source_folders] + [folder.to_node() for folder in exclude_folders]),
+			Node('orderEntry', (('type', 'jdk'), ('jdkName', interpreter_name), ('jdkType', 'Python SDK'))),
+			Node('orderEntry', (('type', 'sourceFolder'), ('forTests', 'false'))))),
+		Node('component', (('name', 'TestRunnerService'),), (
+			option('projectConfiguration', 'Unittests'),
+			option('PROJECT_TEST_RUNNER', 'Unittests')))))
+
+
+def modules_document(module_file_paths):
+	"""
+	Builds a ``modules.xml`` document.
+
+	:param list[str] module_file_paths: IML file paths of the project modules, relative to ``$PROJECT_DIR$``
+	:return: Root element
+	:rtype: Node
+	"""
+	return Node('project', (('version', '4'),), (
+		Node('component', (('name', 'ProjectModuleManager'),), (
+			Node('modules', (), [Node('module', (('fileurl', f'file://$PROJECT_DIR$/{path}'), ('filepath', f'$PROJECT_DIR$/{path}')))
+			                     for path in module_file_paths]),)),))
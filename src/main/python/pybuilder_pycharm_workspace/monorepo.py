@@ -0,0 +1,144 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+from pathlib import Path
+
+import pybuilder_pycharm_workspace.constants as const
+import pybuilder_pycharm_workspace.messages as msg
+from pybuilder_pycharm_workspace.batch import load_project, map_projects
+from pybuilder_pycharm_workspace.errors import BatchGenerationError
+from pybuilder_pycharm_workspace.serializer import write_document
+from pybuilder_pycharm_workspace.shared_sdks import shared_reference
+from pybuilder_pycharm_workspace.workspace import add_project_idea_directory, build_module_document, \
+	find_pycharm_config_path, register_interpreters, render_project_interpreter
+
+
+def discover_module_directories(root_directory, max_depth=const.MONOREPO_SCAN_DEPTH):
+	"""
+	Finds the PyBuilder sub-projects of a repository: the directories holding a ``build.py`` file below the root one.
+
+	Directories with generated or version control names aren't walked, nor the sub-projects themselves (modules don't
+	nest).
+
+	:param str root_directory: Repository root directory
+	:param int max_depth: Maximum depth of the walked directories
+	:return: Sub-project directories, sorted
+	:rtype: list[str]
+	"""
+	module_directories = []
+	pending = [(str(root_directory), 0)]
+	while pending:
+		directory, depth = pending.pop()
+		try:
+			with os.scandir(directory) as entries:
+				subdirectories = [entry.path for entry in entries
+				                  if entry.is_dir(follow_symlinks=False) and entry.name not in const.SKIPPED_DIRECTORY_NAMES
+				                  and entry.name not in const.EXCLUDED_DIRECTORY_NAMES and entry.name not in ('.idea', '.pybuilder')]
+		except OSError:
+			continue
+		for subdirectory in subdirectories:
+			if os.path.isfile(os.path.join(subdirectory, 'build.py')):
+				module_directories.append(subdirectory)
+			elif depth + 1 < max_depth:
+				pending.append((subdirectory, depth + 1))
+	return sorted(module_directories)
+
+
+def render_module(module_directory, interpreter_name=None):
+	"""
+	Loads a sub-project and writes its IML file in its directory. Meant to be run in a worker process.
+
+	:param str module_directory: Directory holding the sub-project's ``build.py`` file
+	:param str or None interpreter_name: Name of the interpreter shared by every module, ``None`` to give the module
+	    its own interpreter
+	:return: Module IML file path, interpreter name and ``<jdk>`` element text for the module, and its shared
+	    interpreter reference (see ``shared_sdks.shared_reference``), both ``None`` when sharing the root interpreter
+	:rtype: tuple[str, tuple[str, str] or None, tuple[str, tuple[str or None, str]] or None]
+	"""
+	from pybuilder.cli import StdOutLogger
+	from pybuilder.core import Logger
+
+	logger = StdOutLogger(Logger.WARN)
+	project = load_project(module_directory, logger)
+	interpreter = reference = None
+	if interpreter_name:
+		project.set_property('pycharm_workspace_project_interpreter_name', interpreter_name)
+	else:
+		interpreter = render_project_interpreter(project, logger)
+		reference = shared_reference(project)
+	iml_file_path = Path(module_directory) / const.IML_FILENAME.format(project_name=project.name)
+	write_document(iml_file_path, build_module_document(project))
+	return str(iml_file_path), interpreter, reference
+
+
+def generate_pycharm_monorepo_workspace(project, logger, max_depth=const.MONOREPO_SCAN_DEPTH,
+                                        sdk_mode=const.MONOREPO_SDK_SHARED, processes=None):
+	"""
+	Generates a single PyCharm workspace for a repository holding many PyBuilder sub-projects, so PyCharm opens and
+	indexes the whole tree once.
+
+	Every sub-project found below the root project (see ``discover_module_directories``) is loaded in a process pool
+	and gets its IML file written in its own directory. The root project ``.idea`` directory then gets a single
+	``modules.xml`` file listing the root module and every sub-project module. Modules either share the root project
+	interpreter or get their own one, and all the interpreters are added to ``jdk.table.xml`` in a single rewrite.
+
+	:param pybuilder.core.Project project: Root PyBuilder project instance
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:param int max_depth: Maximum depth of the directories walked looking for sub-projects
+	:param str sdk_mode: ``shared`` to use the root project interpreter in every module, ``module`` to give each
+	    module its own one
+	:param int or None processes: Number of worker processes (CPU count by default)
+	:return: Error of every sub-project, ``None`` for the successful ones
+	:rtype: dict[str, Exception or None]
+	:raises BatchGenerationError: If any sub-project couldn't be loaded or its module couldn't be written
+	"""
+	root_directory = project.get_property('pycharm_workspace_project_path')
+	module_directories = discover_module_directories(str(root_directory), max_depth)
+	logger.info(msg.MONOREPO_START.format(count=len(module_directories)))
+	pycharm_config_path = find_pycharm_config_path(project, logger)
+	interpreter_name, project_interpreter = render_project_interpreter(project, logger)
+	interpreters = { interpreter_name: project_interpreter }
+	references = dict([shared_reference(project)])
+	shared_interpreter_name = interpreter_name if sdk_mode == const.MONOREPO_SDK_SHARED else None
+
+	results = {}
+	module_file_paths = []
+	for module_directory, result in map_projects(render_module, module_directories, processes, shared_interpreter_name).items():
+		if isinstance(result, Exception):
+			results[module_directory] = result
+			continue
+		iml_file_path, interpreter, reference = result
+		module_file_paths.append(Path(os.path.relpath(iml_file_path, str(root_directory))).as_posix())
+		if interpreter:
+			interpreters[interpreter[0]] = interpreter[1]
+			references.update([reference])
+		results[module_directory] = None
+
+	add_project_idea_directory(project, logger, module_file_paths)
+	interpreters_file_path = str(pycharm_config_path / 'jdk.table.xml')
+	if register_interpreters(interpreters_file_path, interpreters, logger, references=references):
+		logger.debug(msg.INTERPRETER_FILE_OVERWRITTEN.format(interpreters_file_path=interpreters_file_path))
+
+	for module_directory, error in results.items():
+		if error is None:
+			logger.info(msg.MONOREPO_MODULE_SUCCESS.format(module_directory=module_directory))
+		else:
+			logger.error(msg.MONOREPO_MODULE_FAILURE.format(module_directory=module_directory, error=error))
+	failures = sum(error is not None for error in results.values())
+	logger.info(msg.MONOREPO_FINISH.format(modules=len(module_file_paths) + 1, interpreters=len(interpreters), failed=failures))
+	if failures:
+		raise BatchGenerationError(failures)
+	return results
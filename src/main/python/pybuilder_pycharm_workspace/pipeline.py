@@ -0,0 +1,98 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pybuilder_pycharm_workspace.constants as const
+import pybuilder_pycharm_workspace.messages as msg
+from pybuilder_pycharm_workspace.errors import PipelineError
+
+
+class Stage:
+	"""
+	Step of a pipeline, run once the stages it depends on succeeded.
+	"""
+	__slots__ = ('name', 'run', 'dependencies', 'rollback')
+
+	def __init__(self, name, run, dependencies=(), rollback=None):
+		"""
+		:param str name: Stage name, unique in its pipeline
+		:param collections.abc.Callable[[], None] run: Callable doing the stage work
+		:param collections.abc.Iterable[str] dependencies: Names of the stages that must succeed before this one starts
+		:param collections.abc.Callable[[], None] or None rollback: Callable undoing the stage work when any stage of the
+		    pipeline fails
+		"""
+		self.name = name
+		self.run = run
+		self.dependencies = tuple(dependencies)
+		self.rollback = rollback
+
+
+def run_pipeline(stages, logger, workers=const.PIPELINE_WORKERS):
+	"""
+	Runs the stages of a pipeline on a thread pool, starting every stage as soon as all its dependencies succeeded, so
+	independent I/O overlaps.
+
+	Once any stage fails no other stage is started. When the running ones finish, the stages that succeeded are rolled
+	back in reverse completion order and the errors of every failed stage are raised together.
+
+	:param collections.abc.Iterable[Stage] stages: Pipeline stages
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:param int workers: Maximum number of stages run at the same time
+	:return: None
+	:raises PipelineError: If any stage failed, or depends on a stage that isn't part of the pipeline (then no stage
+	    is run)
+	"""
+	pending = { stage.name: stage for stage in stages }
+	unknown_dependencies = { stage.name: ValueError(msg.PIPELINE_UNKNOWN_DEPENDENCIES.format(
+		dependencies=', '.join(sorted(set(stage.dependencies) - pending.keys()))))
+		for stage in pending.values() if not pending.keys() >= set(stage.dependencies) }
+	if unknown_dependencies:
+		raise PipelineError(unknown_dependencies)
+	succeeded = []
+	failures = {}
+	with ThreadPoolExecutor(max_workers=workers) as executor:
+		running = {}
+		while True:
+			if not failures:
+				finished = { stage.name for stage in succeeded }
+				for stage in [stage for stage in pending.values() if finished.issuperset(stage.dependencies)]:
+					del pending[stage.name]
+					running[executor.submit(stage.run)] = stage
+			if not running:
+				break
+			done, _ = wait(running, return_when=FIRST_COMPLETED)
+			for future in done:
+				stage = running.pop(future)
+				error = future.exception()
+				if error is None:
+					succeeded.append(stage)
+				else:
+					logger.error(msg.PIPELINE_STAGE_FAILURE.format(stage=stage.name, error=error))
+					failures[stage.name] = error
+	if not failures:
+		return
+
+	for stage in pending.values():
+		logger.debug(msg.PIPELINE_STAGE_SKIPPED.format(stage=stage.name))
+	for stage in reversed(succeeded):
+		if stage.rollback is None:
+			continue
+		try:
+			stage.rollback()
+			logger.warn(msg.PIPELINE_STAGE_ROLLED_BACK.format(stage=stage.name))
+		except Exception as error:
+			logger.error(msg.PIPELINE_ROLLBACK_FAILURE.format(stage=stage.name, error=error))
+	raise PipelineError(failures)
@@ -0,0 +1,110 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import glob
+import os
+import pstats
+import re
+
+import pybuilder_pycharm_workspace.constants as const
+import pybuilder_pycharm_workspace.messages as msg
+from pybuilder_pycharm_workspace.exclusions import relative_project_path
+from pybuilder_pycharm_workspace.helpers import write_file_if_changed
+from pybuilder_pycharm_workspace.model import PythonRunConfiguration
+from pybuilder_pycharm_workspace.resources import templates as templates
+from pybuilder_pycharm_workspace.run_configurations import build_configuration_parameters
+
+
+def reports_directory(project):
+	"""
+	Returns the directory where profiling run configurations write their profiles.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:return: ``dir_reports`` directory relative to the project directory (``target/reports`` if it's not set), or its
+	    absolute path if it's outside of the project
+	:rtype: str
+	"""
+	if not project.get_property('dir_reports'):
+		return const.DEFAULT_REPORTS_DIRECTORY
+	reports_path = project.expand_path('$dir_reports')
+	return relative_project_path(project, reports_path) or reports_path
+
+
+def profile_file_name(configuration_name):
+	"""
+	Returns the name of the profile file written by the profiling variant of a run configuration.
+
+	:param str configuration_name: Name of the profiled run configuration
+	:return: File name
+	:rtype: str
+	"""
+	return f'{const.PROFILE_FILE_PREFIX}{re.sub(r"[^0-9A-Za-z]+", "_", configuration_name).strip("_")}.prof'
+
+
+def build_profile_configurations(project):
+	"""
+	Builds the profiling variants of the build run configurations: one running each of them under ``cProfile``, with
+	its profile written into the reports directory, and one running ``build (develop)`` with ``-X importtime``.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:return: Run configurations
+	:rtype: list[PythonRunConfiguration]
+	"""
+	reports = reports_directory(project)
+	configurations = [PythonRunConfiguration(templates.PROFILE_RUN_CONFIGURATION_NAME.format(name=name), project.name, parameters,
+	                                         interpreter_options=f'-m cProfile -o {reports}/{profile_file_name(name)}')
+	                  for name, parameters in build_configuration_parameters(project)]
+	configurations.extend(PythonRunConfiguration(templates.IMPORT_TIME_RUN_CONFIGURATION_NAME.format(name=name), project.name,
+	                                             parameters, interpreter_options='-X importtime')
+	                      for name, parameters in build_configuration_parameters(project)
+	                      if name == templates.IMPORT_TIME_RUN_CONFIGURATION)
+	return configurations
+
+
+def summarize_profiles(project, logger, size=const.PROFILE_SUMMARY_SIZE):
+	"""
+	Aggregates the profiles written by the profiling run configurations into a summary of the functions where most
+	time was spent, logged and written into the reports directory.
+
+	Every profiling configuration overwrites its own profile file, so the summary covers the latest run of each one.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:param int size: Number of functions in the summary
+	:return: Summary file path, or ``None`` if no profile was found
+	:rtype: str or None
+	"""
+	reports_path = os.path.join(str(project.get_property('pycharm_workspace_project_path')), reports_directory(project))
+	profile_paths = sorted(glob.glob(os.path.join(reports_path, f'{const.PROFILE_FILE_PREFIX}*.prof')), key=os.path.getmtime)
+	if not profile_paths:
+		logger.warn(msg.PROFILE_NOT_FOUND.format(reports_path=reports_path))
+		return None
+
+	stats = pstats.Stats(*profile_paths)
+	rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:size]
+	lines = [msg.PROFILE_SUMMARY_HEADER.format(count=len(profile_paths), total=stats.total_tt),
+	         *(msg.PROFILE_SOURCE.format(profile_path=path) for path in profile_paths),
+	         f'{"own (s)":>10}  {"total (s)":>10}  {"calls":>10}  function']
+	for (file_name, line_number, function_name), (primitive_calls, calls, own_time, total_time, _) in rows:
+		calls_text = str(calls) if calls == primitive_calls else f'{calls}/{primitive_calls}'
+		location = f'{file_name}:{line_number}' if line_number else file_name
+		lines.append(f'{own_time:>10.4f}  {total_time:>10.4f}  {calls_text:>10}  {function_name} ({location})')
+	for line in lines:
+		logger.info(line)
+
+	summary_path = os.path.join(reports_path, const.PROFILE_SUMMARY_FILENAME)
+	write_file_if_changed(summary_path, '\n'.join(lines) + '\n')
+	logger.info(msg.PROFILE_SUMMARY_WRITTEN.format(summary_path=summary_path))
+	return summary_path
@@ -0,0 +1,86 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pybuilder_pycharm_workspace.constants as const
+from pybuilder_pycharm_workspace.helpers import file_lock
+from pybuilder_pycharm_workspace.jdk_table import read_interpreters, replace_interpreters
+from pybuilder_pycharm_workspace.registry import InterpretersRegistry
+
+
+def expand_pycharm_path(path):
+	"""
+	Expands PyCharm path macros (``$USER_HOME$``) and normalizes path separators for the current system.
+
+	:param str path: Path as stored by PyCharm
+	:return: Filesystem path
+	:rtype: str
+	"""
+	path = path.replace('$USER_HOME$', str(Path.home()))
+	if path.startswith('file://'):
+		path = path[len('file://'):]
+	return os.path.normpath(path.replace('\\', os.sep).replace('/', os.sep))
+
+
+def find_stale_interpreters(interpreters_file_path, workers=const.PRUNE_WORKERS, interpreter_names=None):
+	"""
+	Finds the interpreters created by the plugin whose home path or associated project path no longer exists.
+
+	Paths are checked in a thread pool, as they often live in network filesystems where every ``stat`` call is slow.
+
+	:param str interpreters_file_path: ``jdk.table.xml`` file path
+	:param int workers: Number of threads checking paths
+	:param collections.abc.Container[str] or None interpreter_names: Names of the only interpreters to check, every
+	    interpreter created by the plugin if not given
+	:return: Stale interpreters as tuples of name, home path, associated project path and entry size in bytes
+	:rtype: list[tuple[str, str or None, str or None, int]]
+	"""
+	interpreters = [interpreter for interpreter in read_interpreters(interpreters_file_path)
+	                if InterpretersRegistry.is_managed(interpreter[0])
+	                and (interpreter_names is None or interpreter[0] in interpreter_names)]
+	paths = { expand_pycharm_path(path) for _, home_path, project_path, _, _, _ in interpreters
+	          for path in (home_path, project_path) if path }
+	with ThreadPoolExecutor(workers) as executor:
+		existing_paths = { path for path, exists in zip(paths, executor.map(os.path.exists, paths)) if exists }
+
+	return [(name, home_path, project_path, end - start)
+	        for name, home_path, project_path, _, start, end in interpreters
+	        if any(path and expand_pycharm_path(path) not in existing_paths for path in (home_path, project_path))]
+
+
+def prune_interpreters(interpreters_file_path, interpreter_names, workers=const.PRUNE_WORKERS):
+	"""
+	Removes some stale interpreters from the interpreters file in a single rewrite, holding its lock.
+
+	They're checked again once the lock is held (see ``find_stale_interpreters``), so an interpreter registered again
+	by a concurrent build since they were found isn't removed.
+
+	:param str interpreters_file_path: ``jdk.table.xml`` file path
+	:param list[str] interpreter_names: Names of the stale interpreters to remove
+	:param int workers: Number of threads checking paths
+	:return: Names of the interpreters removed and file size before and after the removal in bytes
+	:rtype: tuple[list[str], int, int]
+	"""
+	with file_lock(interpreters_file_path + const.LOCK_FILE_SUFFIX):
+		size_before = os.path.getsize(interpreters_file_path)
+		stale_names = [interpreter[0] for interpreter in find_stale_interpreters(interpreters_file_path, workers,
+		                                                                        set(interpreter_names))]
+		if stale_names:
+			replace_interpreters(interpreters_file_path, { name: None for name in stale_names })
+		size_after = os.path.getsize(interpreters_file_path)
+	return stale_names, size_before, size_after
@@ -0,0 +1,338 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import re
+import sqlite3
+from pathlib import Path
+
+import pybuilder_pycharm_workspace.constants as const
+import pybuilder_pycharm_workspace.messages as msg
+from pybuilder_pycharm_workspace.helpers import user_cache_directory
+from pybuilder_pycharm_workspace.jdk_table import read_interpreters
+from pybuilder_pycharm_workspace.resources import templates as templates
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS interpreters_files (
+	path TEXT PRIMARY KEY,
+	mtime_ns INTEGER NOT NULL,
+	size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS interpreters (
+	file_path TEXT NOT NULL,
+	name TEXT NOT NULL,
+	home_path TEXT,
+	project_path TEXT,
+	content_hash TEXT NOT NULL,
+	managed INTEGER NOT NULL,
+	PRIMARY KEY (file_path, name)
+);
+CREATE TABLE IF NOT EXISTS shared_interpreters (
+	id INTEGER PRIMARY KEY AUTOINCREMENT,
+	file_path TEXT NOT NULL,
+	project_path TEXT NOT NULL,
+	name TEXT NOT NULL,
+	venv_path TEXT NOT NULL,
+	UNIQUE (file_path, project_path)
+);
+"""
+MANAGED_NAME_PATTERN = re.compile('^' + re.escape(templates.INTERPRETER_NAME).replace(re.escape('{project_name}'), '.+') + '$')
+
+
+class InterpretersRegistry:
+	"""
+	Local SQLite index of the interpreters found in PyCharm's ``jdk.table.xml`` files.
+
+	Every indexed file is stored along with its modification time and size, so its entries are trusted only while the
+	file remains untouched. Otherwise, the file is scanned again before answering.
+	"""
+
+	def __init__(self, database_path=None, read_only=False):
+		"""
+		:param str or None database_path: SQLite database path (user cache directory by default)
+		:param bool read_only: Whether to open an existing database read-only, so nothing is ever written to it
+		"""
+		if database_path is None:
+			database_path = user_cache_directory() / const.REGISTRY_FILENAME
+			if not read_only:
+				database_path.parent.mkdir(parents=True, exist_ok=True)
+		if read_only:
+			self.connection = sqlite3.connect(f'{Path(database_path).resolve().as_uri()}?mode=ro', timeout=30, uri=True)
+		else:
+			self.connection = sqlite3.connect(str(database_path), timeout=30)
+			self.connection.executescript(SCHEMA)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	def close(self):
+		"""
+		Closes the database connection.
+
+		:return: None
+		"""
+		self.connection.close()
+
+	def commit(self):
+		"""
+		Stores the pending shared interpreter reference changes (see ``set_shared_reference``).
+
+		:return: None
+		"""
+		self.connection.commit()
+
+	def rollback(self):
+		"""
+		Discards the pending shared interpreter reference changes (see ``set_shared_reference``).
+
+		:return: None
+		"""
+		self.connection.rollback()
+
+	def is_fresh(self, interpreters_file_path):
+		"""
+		Checks whether the indexed entries of an interpreters file match its current contents.
+
+		:param str interpreters_file_path: ``jdk.table.xml`` file path
+		:return: ``True`` if the file didn't change since it was indexed
+		:rtype: bool
+		"""
+		try:
+			stat = os.stat(interpreters_file_path)
+		except OSError:
+			return False
+		row = self.connection.execute('SELECT mtime_ns, size FROM interpreters_files WHERE path = ?',
+		                              (str(interpreters_file_path),)).fetchone()
+		return row == (stat.st_mtime_ns, stat.st_size)
+
+	def refresh(self, interpreters_file_path, force=False):
+		"""
+		Indexes again every interpreter of an interpreters file if it changed since it was indexed.
+
+		:param str interpreters_file_path: ``jdk.table.xml`` file path
+		:param bool force: Index the file even if it didn't change
+		:return: None
+		"""
+		if not force and self.is_fresh(interpreters_file_path):
+			return
+		interpreters_file_path = str(interpreters_file_path)
+		interpreters = read_interpreters(interpreters_file_path)
+		with self.connection:
+			self.connection.execute('DELETE FROM interpreters WHERE file_path = ?', (interpreters_file_path,))
+			self.connection.executemany(
+				'INSERT OR REPLACE INTO interpreters VALUES (?, ?, ?, ?, ?, ?)',
+				[(interpreters_file_path, name, home_path, project_path, content_hash, self.is_managed(name))
+				 for name, home_path, project_path, content_hash, _, _ in interpreters])
+			self.store_file_stat(interpreters_file_path)
+
+	def store_file_stat(self, interpreters_file_path):
+		"""
+		Stores the current modification time and size of an interpreters file, or forgets it if it doesn't exist.
+
+		:param str interpreters_file_path: ``jdk.table.xml`` file path
+		:return: None
+		"""
+		try:
+			stat = os.stat(interpreters_file_path)
+		except OSError:
+			self.connection.execute('DELETE FROM interpreters_files WHERE path = ?', (interpreters_file_path,))
+			return
+		self.connection.execute('INSERT OR REPLACE INTO interpreters_files VALUES (?, ?, ?)',
+		                        (interpreters_file_path, stat.st_mtime_ns, stat.st_size))
+
+	def is_current(self, interpreters_file_path, name, content_hash):
+		"""
+		Checks, without reading the interpreters file, whether it already holds an interpreter with the same contents.
+
+		:param str interpreters_file_path: ``jdk.table.xml`` file path
+		:param str name: Interpreter name
+		:param str content_hash: Hash of the interpreter entry (see ``jdk_table.entry_hash``)
+		:return: ``True`` if the indexed file didn't change and its entry has the same hash
+		:rtype: bool
+		"""
+		if not self.is_fresh(interpreters_file_path):
+			return False
+		row = self.connection.execute('SELECT content_hash FROM interpreters WHERE file_path = ? AND name = ?',
+		                              (str(interpreters_file_path), name)).fetchone()
+		return row is not None and row[0] == content_hash
+
+	def get(self, interpreters_file_path, name):
+		"""
+		Looks an interpreter up by name.
+
+		:param str interpreters_file_path: ``jdk.table.xml`` file path
+		:param str name: Interpreter name
+		:return: Tuple with name, home path, associated project path and content hash, or ``None`` if not found
+		:rtype: tuple[str, str or None, str or None, str] or None
+		"""
+		self.refresh(interpreters_file_path)
+		return self.connection.execute(
+			'SELECT name, home_path, project_path, content_hash FROM interpreters WHERE file_path = ? AND name = ?',
+			(str(interpreters_file_path), name)).fetchone()
+
+	def record(self, interpreters_file_path, name, home_path, project_path, content_hash):
+		"""
+		Updates the index after the plugin wrote an interpreter into an interpreters file that was indexed right before.
+
+		:param str interpreters_file_path: ``jdk.table.xml`` file path
+		:param str name: Interpreter name
+		:param str or None home_path: Interpreter home path
+		:param str or None project_path: Interpreter associated project path
+		:param str content_hash: Hash of the interpreter entry
+		:return: None
+		"""
+		interpreters_file_path = str(interpreters_file_path)
+		with self.connection:
+			self.connection.execute('INSERT OR REPLACE INTO interpreters VALUES (?, ?, ?, ?, ?, ?)',
+			                        (interpreters_file_path, name, home_path, project_path, content_hash,
+			                         self.is_managed(name)))
+			self.store_file_stat(interpreters_file_path)
+
+	def list_interpreters(self, interpreters_file_path=None, managed_only=False):
+		"""
+		Lists the indexed interpreters, refreshing the index of the files that changed.
+
+		:param str or None interpreters_file_path: Only list interpreters of this file (all known files by default)
+		:param bool managed_only: Only list interpreters created by the plugin
+		:return: List of tuples with interpreters file path, name, home path and associated project path
+		:rtype: list[tuple[str, str, str or None, str or None]]
+		"""
+		if interpreters_file_path is None:
+			paths = [row[0] for row in self.connection.execute('SELECT path FROM interpreters_files')]
+		else:
+			paths = [str(interpreters_file_path)]
+		for path in paths:
+			self.refresh(path)
+		query = 'SELECT file_path, name, home_path, project_path FROM interpreters WHERE managed >= ?'
+		arguments = [int(managed_only)]
+		if interpreters_file_path is not None:
+			query += ' AND file_path = ?'
+			arguments.append(str(interpreters_file_path))
+		return self.connection.execute(query + ' ORDER BY file_path, name', arguments).fetchall()
+
+	def set_shared_reference(self, interpreters_file_path, project_path, name, venv_path):
+		"""
+		Records that a project uses a shared interpreter, replacing the shared interpreter it used before, if any. The
+		change is left pending until ``commit`` (or the next method storing index changes) is called.
+
+		:param str interpreters_file_path: ``jdk.table.xml`` file path
+		:param str project_path: Project directory
+		:param str name: Shared interpreter name
+		:param str venv_path: Virtual environment directory of the project
+		:return: Name of the shared interpreter the project used before, if it was another one
+		:rtype: str or None
+		"""
+		interpreters_file_path, project_path = str(interpreters_file_path), str(project_path)
+		previous_name = self.shared_reference_name(interpreters_file_path, project_path)
+		if previous_name == name:
+			self.connection.execute('UPDATE shared_interpreters SET venv_path = ? WHERE file_path = ? AND project_path = ?',
+			                        (str(venv_path), interpreters_file_path, project_path))
+			return None
+		self.connection.execute('DELETE FROM shared_interpreters WHERE file_path = ? AND project_path = ?',
+		                        (interpreters_file_path, project_path))
+		self.connection.execute('INSERT INTO shared_interpreters (file_path, project_path, name, venv_path) VALUES (?, ?, ?, ?)',
+		                        (interpreters_file_path, project_path, name, str(venv_path)))
+		return previous_name
+
+	def remove_shared_reference(self, interpreters_file_path, project_path):
+		"""
+		Records that a project no longer uses any shared interpreter. The change is left pending until ``commit`` (or
+		the next method storing index changes) is called.
+
+		:param str interpreters_file_path: ``jdk.table.xml`` file path
+		:param str project_path: Project directory
+		:return: Name of the shared interpreter the project used, if any
+		:rtype: str or None
+		"""
+		interpreters_file_path, project_path = str(interpreters_file_path), str(project_path)
+		previous_name = self.shared_reference_name(interpreters_file_path, project_path)
+		if previous_name is not None:
+			self.connection.execute('DELETE FROM shared_interpreters WHERE file_path = ? AND project_path = ?',
+			                        (interpreters_file_path, project_path))
+		return previous_name
+
+	def shared_reference_name(self, interpreters_file_path, project_path):
+		"""
+		Looks up the shared interpreter a project uses.
+
+		:param str interpreters_file_path: ``jdk.table.xml`` file path
+		:param str project_path: Project directory
+		:return: Shared interpreter name, ``None`` if the project doesn't use any
+		:rtype: str or None
+		"""
+		row = self.connection.execute('SELECT name FROM shared_interpreters WHERE file_path = ? AND project_path = ?',
+		                              (str(interpreters_file_path), str(project_path))).fetchone()
+		return row[0] if row else None
+
+	def shared_references(self, interpreters_file_path, name):
+		"""
+		Lists the projects using a shared interpreter, in the order they started using it.
+
+		:param str interpreters_file_path: ``jdk.table.xml`` file path
+		:param str name: Shared interpreter name
+		:return: List of tuples with project directory and its virtual environment directory
+		:rtype: list[tuple[str, str]]
+		"""
+		return self.connection.execute('SELECT project_path, venv_path FROM shared_interpreters WHERE file_path = ? AND name = ? '
+		                               'ORDER BY id', (str(interpreters_file_path), name)).fetchall()
+
+	def prune_shared_references(self, interpreters_file_path):
+		"""
+		Forgets the shared interpreter references of the projects whose directory no longer exists.
+
+		:param str interpreters_file_path: ``jdk.table.xml`` file path
+		:return: Names of the shared interpreters still referenced
+		:rtype: set[str]
+		"""
+		interpreters_file_path = str(interpreters_file_path)
+		rows = self.connection.execute('SELECT project_path, name FROM shared_interpreters WHERE file_path = ?',
+		                               (interpreters_file_path,)).fetchall()
+		missing = [(interpreters_file_path, project_path) for project_path, _ in rows if not os.path.isdir(project_path)]
+		with self.connection:
+			self.connection.executemany('DELETE FROM shared_interpreters WHERE file_path = ? AND project_path = ?', missing)
+		return { name for project_path, name in rows if (interpreters_file_path, project_path) not in missing }
+
+	@staticmethod
+	def is_managed(name):
+		"""
+		Checks whether an interpreter name follows the plugin naming convention.
+
+		:param str name: Interpreter name
+		:return: ``True`` if the interpreter was created by the plugin
+		:rtype: bool
+		"""
+		return bool(MANAGED_NAME_PATTERN.match(name))
+
+
+def open_registry(logger, read_only=False):
+	"""
+	Opens the interpreters registry, tolerating an unusable cache directory or database.
+
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:param bool read_only: Whether to open it read-only (see ``InterpretersRegistry``), only if it already exists
+	:return: Registry instance or ``None`` if it can't be opened
+	:rtype: InterpretersRegistry or None
+	"""
+	if read_only and not (user_cache_directory() / const.REGISTRY_FILENAME).is_file():
+		return None
+	try:
+		return InterpretersRegistry(read_only=read_only)
+	except (OSError, sqlite3.Error) as error:
+		logger.warn(msg.REGISTRY_UNAVAILABLE.format(error=error))
+		return None
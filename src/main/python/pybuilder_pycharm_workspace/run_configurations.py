@@ -0,0 +1,198 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import hashlib
+import json
+import re
+
+import pybuilder_pycharm_workspace.constants as const
+from pybuilder_pycharm_workspace.helpers import read_file_snapshot, restore_file_snapshot, to_bool, write_chunks_if_changed, \
+	write_file_if_changed
+from pybuilder_pycharm_workspace.model import PythonRunConfiguration, run_configuration_document
+from pybuilder_pycharm_workspace.resources import templates as templates
+from pybuilder_pycharm_workspace.serializer import iter_xml
+
+FILE_NAME_PATTERN = re.compile(r'[^\w\-.]')
+EXCLUDE_OPTION = '--exclude='
+
+
+def registered_tasks(project):
+	"""
+	Lists the PyBuilder tasks registered for the project being built, but the ones of this plugin.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:return: Task names, sorted, or ``None`` if they aren't known (the project isn't being built by PyBuilder)
+	:rtype: list[str] or None
+	"""
+	try:
+		from pybuilder.reactor import Reactor
+	except ImportError:
+		return None
+	reactor = Reactor.current_instance()
+	if reactor is None or reactor.project is not project:
+		return None
+	return sorted(task.name for task in reactor.execution_manager.tasks
+	              if any(executable.source != __package__ for executable in task.executables))
+
+
+def build_configuration_parameters(project):
+	"""
+	Returns the build run configurations (``templates.BUILD_RUN_CONFIGURATIONS``) adapted to the registered tasks:
+	tasks not registered are dropped from their parameters, and so are the configurations left without any task.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:return: Configuration names and parameters
+	:rtype: list[tuple[str, str]]
+	"""
+	tasks = registered_tasks(project)
+	if tasks is None:
+		return list(templates.BUILD_RUN_CONFIGURATIONS)
+	tasks = set(tasks)
+	configurations = []
+	for name, parameters in templates.BUILD_RUN_CONFIGURATIONS:
+		script, *arguments = parameters.split()
+		arguments = [argument for argument in arguments if is_registered_argument(argument, tasks)]
+		if any(not argument.startswith('-') for argument in arguments):
+			configurations.append((name, ' '.join([script, *arguments])))
+	return configurations
+
+
+def is_registered_argument(argument, tasks):
+	"""
+	Checks whether a PyBuilder command line argument can be kept: it's an option, or it names (or excludes) a
+	registered task.
+
+	:param str argument: Command line argument
+	:param set[str] tasks: Registered task names
+	:return: ``False`` if the argument names a task not registered
+	:rtype: bool
+	"""
+	if argument.startswith(EXCLUDE_OPTION):
+		return argument[len(EXCLUDE_OPTION):] in tasks
+	return argument.startswith('-') or argument in tasks
+
+
+def build_task_configurations(project):
+	"""
+	Builds a run configuration for every registered task (see ``registered_tasks``), unless
+	``pycharm_workspace_task_configurations`` property is unset.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:return: Run configurations
+	:rtype: list[PythonRunConfiguration]
+	"""
+	if not to_bool(project.get_property('pycharm_workspace_task_configurations')):
+		return []
+	return [PythonRunConfiguration(templates.TASK_RUN_CONFIGURATION_NAME.format(task=task), project.name,
+	                               templates.TASK_RUN_CONFIGURATION_PARAMETERS.format(task=task))
+	        for task in registered_tasks(project) or ()]
+
+
+def run_configurations_location(project):
+	"""
+	Returns where run configurations are written, according to ``pycharm_workspace_run_configurations`` property.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:return: ``workspace`` for ``workspace.xml``, or a key of ``constants.RUN_CONFIGURATIONS_DIRECTORIES``
+	:rtype: str
+	"""
+	location = str(project.get_property('pycharm_workspace_run_configurations') or const.RUN_CONFIGURATIONS_WORKSPACE).lower()
+	return location if location in const.RUN_CONFIGURATIONS_DIRECTORIES else const.RUN_CONFIGURATIONS_WORKSPACE
+
+
+def run_configuration_file_name(configuration, suffix):
+	"""
+	Returns the file name PyCharm gives to a shared run configuration (every character but letters, digits, dashes
+	and dots replaced by underscores).
+
+	:param PythonRunConfiguration or UnittestsRunConfiguration or CompoundRunConfiguration configuration: Run
+	    configuration
+	:param str suffix: File name suffix
+	:return: File name
+	:rtype: str
+	"""
+	return FILE_NAME_PATTERN.sub('_', configuration.name) + suffix
+
+
+def render_run_configuration_files(project, configurations):
+	"""
+	Renders a shared run configuration file for every run configuration.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param list[PythonRunConfiguration or UnittestsRunConfiguration or CompoundRunConfiguration] configurations: Run
+	    configurations
+	:return: File contents by path relative to the project directory, empty when run configurations are written into
+	    ``workspace.xml``
+	:rtype: dict[str, str]
+	"""
+	location = run_configurations_location(project)
+	if location == const.RUN_CONFIGURATIONS_WORKSPACE:
+		return {}
+	directory, suffix = const.RUN_CONFIGURATIONS_DIRECTORIES[location]
+	return { f'{directory}/{run_configuration_file_name(configuration, suffix)}':
+		         ''.join(iter_xml(run_configuration_document(configuration))) for configuration in configurations }
+
+
+def write_run_configuration_files(project, configurations):
+	"""
+	Writes a shared run configuration file for every run configuration, in the directory selected by
+	``pycharm_workspace_run_configurations`` property, and removes the ones the plugin wrote before and no longer
+	renders.
+
+	The hash of every file written is kept in ``.idea`` directory along with its modification time and size: files
+	whose rendered contents have the same hash and weren't touched since aren't read nor written again.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param list[PythonRunConfiguration or UnittestsRunConfiguration or CompoundRunConfiguration] configurations: Run
+	    configurations
+	:return: Previous contents of the files written or removed (``None`` for new files), by path, so the changes can
+	    be undone with ``helpers.restore_file_snapshot``, and the number of files rendered
+	:rtype: tuple[dict[pathlib.Path, bytes or None], int]
+	"""
+	project_path = project.get_property('pycharm_workspace_project_path')
+	cache_file_path = project_path / '.idea' / const.RUN_CONFIGURATIONS_CACHE_FILENAME
+	try:
+		with open(cache_file_path) as cache_file:
+			hashes = json.load(cache_file)
+	except (OSError, ValueError):
+		hashes = {}
+
+	files = render_run_configuration_files(project, configurations)
+	snapshots = {}
+	new_hashes = {}
+	for relative_path, contents in files.items():
+		file_path = project_path / relative_path
+		content_hash = hashlib.sha256(contents.encode('utf-8')).hexdigest()
+		try:
+			file_stat = file_path.stat()
+			if hashes.get(relative_path) == [file_stat.st_mtime_ns, file_stat.st_size, content_hash]:
+				new_hashes[relative_path] = hashes[relative_path]
+				continue
+		except OSError:
+			file_path.parent.mkdir(parents=True, exist_ok=True)
+		snapshot = read_file_snapshot(file_path)
+		if write_chunks_if_changed(file_path, lambda: (contents,)):
+			snapshots[file_path] = snapshot
+		file_stat = file_path.stat()
+		new_hashes[relative_path] = [file_stat.st_mtime_ns, file_stat.st_size, content_hash]
+	for relative_path in hashes.keys() - files.keys():
+		file_path = project_path / relative_path
+		snapshot = read_file_snapshot(file_path)
+		if snapshot is not None:
+			restore_file_snapshot(file_path, None)
+			snapshots[file_path] = snapshot
+	if hashes or new_hashes:
+		write_file_if_changed(cache_file_path, json.dumps(new_hashes, sort_keys=True))
+	return snapshots, len(files)
@@ -0,0 +1,97 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+
+from pybuilder_pycharm_workspace.errors import WritingFileError
+from pybuilder_pycharm_workspace.helpers import write_chunks_if_changed
+from pybuilder_pycharm_workspace.jdk_table import escape_attribute
+
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>\n'
+INDENT = '  '
+
+shapes = {}
+
+
+def compile_shape(tag, attribute_names):
+	"""
+	Compiles the opening, closing and empty tag formats of an element shape (tag and attribute names).
+
+	Compiled shapes are cached, so every shape is only built once no matter how many elements share it.
+
+	:param str tag: Element tag
+	:param tuple[str] attribute_names: Attribute names
+	:return: Opening tag, closing tag and empty element format methods, to be called with escaped attribute values
+	:rtype: tuple[collections.abc.Callable, str, collections.abc.Callable]
+	"""
+	shape = shapes.get((tag, attribute_names))
+	if shape is None:
+		attributes = ''.join(f' {name}="{{{index}}}"' for index, name in enumerate(attribute_names))
+		shape = (f'<{tag}{attributes}>\n'.format, f'</{tag}>\n', f'<{tag}{attributes} />\n'.format)
+		shapes[(tag, attribute_names)] = shape
+	return shape
+
+
+def iter_xml(node, depth=0):
+	"""
+	Serializes an element and its children line by line.
+
+	:param pybuilder_pycharm_workspace.model.Node node: Element to serialize
+	:param int depth: Indentation level of the element
+	:return: Generator of serialized lines
+	:rtype: collections.abc.Iterator[str]
+	"""
+	open_format, close_tag, empty_format = compile_shape(node.tag, tuple(name for name, _ in node.attributes))
+	values = [escape_attribute(value) for _, value in node.attributes]
+	indent = INDENT * depth
+	children = iter(node.children)
+	first_child = next(children, None)
+	if first_child is None:
+		yield indent + empty_format(*values)
+		return
+	yield indent + open_format(*values)
+	yield from iter_xml(first_child, depth + 1)
+	for child in children:
+		yield from iter_xml(child, depth + 1)
+	yield indent + close_tag
+
+
+def iter_document(root):
+	"""
+	Serializes a whole XML document.
+
+	:param pybuilder_pycharm_workspace.model.Node root: Root element
+	:return: Generator of serialized lines
+	:rtype: collections.abc.Iterator[str]
+	"""
+	yield XML_DECLARATION
+	yield from iter_xml(root)
+
+
+def write_document(output_path, root):
+	"""
+	Streams an XML document to a file, leaving the file untouched if it already holds the same document.
+
+	:param str or pathlib.Path output_path: Path where the document will be saved
+	:param pybuilder_pycharm_workspace.model.Node root: Root element
+	:return: ``True`` if the file was written
+	:rtype: bool
+	:raises WritingFileError: If there was an error while trying to write the file
+	"""
+	try:
+		return write_chunks_if_changed(output_path, lambda: iter_document(root))
+	except OSError:
+		raise WritingFileError(os.path.basename(output_path), os.path.dirname(output_path))
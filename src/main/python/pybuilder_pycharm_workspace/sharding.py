@@ -0,0 +1,192 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import heapq
+import json
+import os
+from pathlib import Path
+from xml.etree import ElementTree
+
+import pybuilder_pycharm_workspace.constants as const
+from pybuilder_pycharm_workspace.exclusions import relative_project_path
+from pybuilder_pycharm_workspace.helpers import write_file_if_changed
+from pybuilder_pycharm_workspace.model import CompoundRunConfiguration, UnittestsRunConfiguration
+from pybuilder_pycharm_workspace.resources import templates as templates
+
+
+def unittest_directory(project):
+	"""
+	Returns the unit tests directory of the project (``dir_source_unittest_python`` property, ``tests`` if it's not set).
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:return: Directory path relative to the project directory
+	:rtype: str
+	"""
+	if not project.get_property('dir_source_unittest_python'):
+		return const.DEFAULT_UNITTEST_DIRECTORY
+	return relative_project_path(project, project.expand_path('$dir_source_unittest_python')) or const.DEFAULT_UNITTEST_DIRECTORY
+
+
+def unittest_pattern(project):
+	"""
+	Returns the file name pattern of the unit test modules (``unittest_module_glob`` property, as PyBuilder matches them).
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:return: File name pattern
+	:rtype: str
+	"""
+	module_glob = project.get_property('unittest_module_glob') or const.DEFAULT_UNITTEST_MODULE_GLOB
+	return module_glob if module_glob.endswith('.py') else f'{module_glob}.py'
+
+
+def find_test_modules(project):
+	"""
+	Lists the unit test modules of the project.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:return: Dotted module names relative to the unit tests directory, sorted
+	:rtype: list[str]
+	"""
+	test_directory = project.get_property('pycharm_workspace_project_path') / unittest_directory(project)
+	return sorted('.'.join(path.relative_to(test_directory).with_suffix('').parts)
+	              for path in test_directory.rglob(unittest_pattern(project)) if path.is_file())
+
+
+def read_report_durations(report_path):
+	"""
+	Sums up the test durations of a JUnit XML report (as written by ``xmlrunner``) by test module.
+
+	:param str report_path: Report file path
+	:return: Durations in seconds by dotted module name
+	:rtype: dict[str, float]
+	"""
+	durations = {}
+	for _, element in ElementTree.iterparse(report_path):
+		if element.tag == 'testcase':
+			module_name = element.get('classname', '').rpartition('.')[0]
+			if module_name:
+				durations[module_name] = durations.get(module_name, 0.0) + float(element.get('time') or 0)
+		element.clear()
+	return durations
+
+
+def read_test_durations(project, save_cache=True):
+	"""
+	Reads the test durations recorded by PyBuilder unit test reports in ``$dir_target/reports``.
+
+	Parsed reports are cached in the ``.idea`` directory by modification time, so only new or changed reports are
+	parsed. When many reports hold the same module, the most recent one wins.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param bool save_cache: Whether to update the parsed reports cache
+	:return: Durations in seconds by dotted module name
+	:rtype: dict[str, float]
+	"""
+	reports_path = project.expand_path('$dir_target', 'reports') if project.get_property('dir_target') else None
+	cache_file_path = project.get_property('pycharm_workspace_project_path') / '.idea' / const.TEST_TIMINGS_CACHE_FILENAME
+	try:
+		with open(cache_file_path) as cache_file:
+			cached = json.load(cache_file)['reports']
+	except (OSError, ValueError, KeyError, TypeError):
+		cached = {}
+
+	reports = {}
+	try:
+		report_paths = [entry.path for entry in os.scandir(reports_path)
+		                if entry.name.startswith('TEST-') and entry.name.endswith('.xml')] if reports_path else []
+	except OSError:
+		report_paths = []
+	for report_path in report_paths:
+		try:
+			mtime = os.stat(report_path).st_mtime_ns
+			cached_report = cached.get(report_path)
+			reports[report_path] = cached_report if cached_report and cached_report[0] == mtime else \
+				[mtime, read_report_durations(report_path)]
+		except (OSError, ElementTree.ParseError, ValueError):
+			continue
+
+	if save_cache:
+		try:
+			write_file_if_changed(cache_file_path, json.dumps({ 'reports': reports }, sort_keys=True))
+		except OSError:
+			pass
+	durations = {}
+	for _, report_durations in sorted(reports.values(), key=lambda report: report[0]):
+		durations.update(report_durations)
+	return durations
+
+
+def split_shards(durations, count):
+	"""
+	Splits test modules into shards of roughly equal total duration, placing the longest modules first into the
+	shard with the lowest total so far.
+
+	:param dict[str, float] durations: Durations in seconds by module name
+	:param int count: Maximum number of shards
+	:return: Module names of every shard, sorted, without empty shards
+	:rtype: list[list[str]]
+	"""
+	shards = [[] for _ in range(count)]
+	totals = [(0.0, index) for index in range(count)]
+	for module_name in sorted(durations, key=lambda name: (-durations[name], name)):
+		total, index = heapq.heappop(totals)
+		shards[index].append(module_name)
+		heapq.heappush(totals, (total + durations[module_name], index))
+	return [sorted(shard) for shard in shards if shard]
+
+
+def shard_count(project):
+	"""
+	Returns the number of test shards requested with ``pycharm_workspace_test_shards`` property.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:return: Number of shards (CPU count for ``auto``), 0 if sharding is disabled
+	:rtype: int
+	"""
+	shards = project.get_property('pycharm_workspace_test_shards')
+	if str(shards).lower() == const.TEST_SHARDS_AUTO:
+		return os.cpu_count() or 1
+	return int(shards) if shards else 0
+
+
+def build_shard_configurations(project, count, save_cache=True):
+	"""
+	Builds a unit tests run configuration for every test shard, and a compound configuration launching them all
+	concurrently.
+
+	Modules without recorded duration are assumed to last the average duration of the others (one second if there is
+	none).
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param int count: Number of shards
+	:param bool save_cache: Whether to update the parsed reports cache (see ``read_test_durations``)
+	:return: Run configurations, empty if the project has no test modules
+	:rtype: list[UnittestsRunConfiguration or CompoundRunConfiguration]
+	"""
+	modules = find_test_modules(project)
+	if not modules:
+		return []
+	recorded = read_test_durations(project, save_cache)
+	known = [recorded[module] for module in modules if module in recorded]
+	default_duration = sum(known) / len(known) if known else 1.0
+	shards = split_shards({ module: recorded.get(module, default_duration) for module in modules }, count)
+
+	working_directory = f'$PROJECT_DIR$/{unittest_directory(project)}'
+	configurations = [UnittestsRunConfiguration(templates.TEST_SHARD_RUN_CONFIGURATION_NAME.format(project_name=project.name, index=index),
+	                                            project.name, '', unittest_pattern(project), target_type='CUSTOM',
+	                                            additional_arguments=' '.join(shard), working_directory=working_directory)
+	                  for index, shard in enumerate(shards, 1)]
+	return configurations + [CompoundRunConfiguration(templates.TEST_SHARDS_RUN_CONFIGURATION_NAME.format(project_name=project.name),
+	                                                  configurations)]
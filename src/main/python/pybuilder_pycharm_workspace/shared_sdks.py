@@ -0,0 +1,173 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+
+import pybuilder_pycharm_workspace.constants as const
+import pybuilder_pycharm_workspace.messages as msg
+from pybuilder_pycharm_workspace.helpers import to_bool
+from pybuilder_pycharm_workspace.registry import open_registry
+from pybuilder_pycharm_workspace.resources import templates as templates
+from pybuilder_pycharm_workspace.virtualenvs import project_virtualenv_path, render_interpreter, virtualenv_fingerprint
+
+
+def is_shared_sdk(project):
+	"""
+	Checks whether projects with identical virtual environments share their interpreter
+	(``pycharm_workspace_shared_sdk`` property).
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:return: ``True`` if the project uses a shared interpreter
+	:rtype: bool
+	"""
+	return to_bool(project.get_property('pycharm_workspace_shared_sdk'))
+
+
+def shared_interpreter_name(project):
+	"""
+	Returns the name of the interpreter shared by every project whose virtual environment has the same fingerprint
+	(see ``virtualenvs.virtualenv_fingerprint``) as the project one.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:return: Shared interpreter name
+	:rtype: str
+	"""
+	fingerprint = virtualenv_fingerprint(project_virtualenv_path(project), [project.name])
+	return templates.SHARED_INTERPRETER_NAME.format(fingerprint=fingerprint[:const.SHARED_SDK_FINGERPRINT_LENGTH])
+
+
+def shared_interpreter_owner(references):
+	"""
+	Picks the project whose virtual environment backs a shared interpreter: the first one that started using it and
+	still has its virtual environment, so the entry doesn't change while that project keeps using it.
+
+	:param list[tuple[str, str]] references: Project and virtual environment directories of the projects using the
+	    interpreter, in the order they started using it
+	:return: Project and virtual environment directories, ``None`` if none of them is left
+	:rtype: tuple[str, str] or None
+	"""
+	return next(((project_path, venv_path) for project_path, venv_path in references if os.path.isdir(venv_path)), None)
+
+
+def render_shared_interpreter(project, interpreter_name, logger, save_cache=True):
+	"""
+	Fills the interpreter template for the shared interpreter of the project, backed by the virtual environment of its
+	owner (see ``shared_interpreter_owner``), or the project one if there is none.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param str interpreter_name: Shared interpreter name
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:param bool save_cache: Whether to update the caches read along (the interpreters registry is opened read-only
+	    otherwise)
+	:return: ``<jdk>`` element text
+	:rtype: str
+	"""
+	owner = None
+	pycharm_config_path = project.get_property('pycharm_workspace_pycharm_config_path')
+	registry = open_registry(logger, read_only=not save_cache) if pycharm_config_path else None
+	if registry:
+		with registry:
+			owner = shared_interpreter_owner(registry.shared_references(str(pycharm_config_path / 'jdk.table.xml'), interpreter_name))
+	project_path, venv_path = owner or (project.get_property('pycharm_workspace_project_path'), project_virtualenv_path(project))
+	return render_interpreter(interpreter_name, venv_path, project_path, associated=False, save_cache=save_cache)
+
+
+def shared_reference(project):
+	"""
+	Describes the shared interpreter the project uses, to be recorded by ``update_shared_references``.
+
+	:param pybuilder.core.Project project: PyBuilder project instance, with its interpreter name already computed
+	:return: Project directory, and shared interpreter name (``None`` when ``pycharm_workspace_shared_sdk`` property
+	    isn't set) and virtual environment directory
+	:rtype: tuple[str, tuple[str or None, str]]
+	"""
+	interpreter_name = project.get_property('pycharm_workspace_project_interpreter_name') if is_shared_sdk(project) else None
+	return str(project.get_property('pycharm_workspace_project_path')), (interpreter_name, str(project_virtualenv_path(project)))
+
+
+def project_shared_references(project, interpreters_file_path, logger):
+	"""
+	Returns the shared interpreter reference of the project to record along with its interpreter: always with
+	``pycharm_workspace_shared_sdk`` property set, otherwise only when the registry still holds a reference of the
+	project to release, so projects not using shared interpreters don't write to the registry.
+
+	:param pybuilder.core.Project project: PyBuilder project instance, with its interpreter name already computed
+	:param str interpreters_file_path: ``jdk.table.xml`` file path
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:return: Shared interpreter reference by project directory (see ``shared_reference``), ``None`` if there is nothing
+	    to record
+	:rtype: dict[str, tuple[str or None, str]] or None
+	"""
+	project_path, reference = shared_reference(project)
+	if not is_shared_sdk(project):
+		registry = open_registry(logger, read_only=True)
+		if not registry:
+			return None
+		with registry:
+			if registry.shared_reference_name(interpreters_file_path, project_path) is None:
+				return None
+	return { project_path: reference }
+
+
+def update_shared_references(registry, interpreters_file_path, references, logger):
+	"""
+	Records the shared interpreter some projects use (see ``shared_reference``), and works out the changes the shared
+	interpreters they used before need: removal when no other project uses them anymore, or rendering them again from
+	another virtual environment if one of the projects was backing them. The registry changes are left pending, to be
+	committed once the interpreters file is rewritten.
+
+	:param pybuilder_pycharm_workspace.registry.InterpretersRegistry registry: Open interpreters registry
+	:param str interpreters_file_path: ``jdk.table.xml`` file path
+	:param dict[str, tuple[str or None, str]] references: Shared interpreter name (``None`` for projects not using
+	    any) and virtual environment directory by project directory
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:return: ``<jdk>`` element texts of the interpreters to change by name, ``None`` for the ones to remove
+	:rtype: dict[str, str or None]
+	"""
+	changes = {}
+	for project_path, (interpreter_name, venv_path) in references.items():
+		if interpreter_name:
+			previous_name = registry.set_shared_reference(interpreters_file_path, project_path, interpreter_name, venv_path)
+			logger.debug(msg.SHARED_SDK_REFERENCES.format(interpreter_name=interpreter_name,
+			                                              count=len(registry.shared_references(interpreters_file_path, interpreter_name))))
+		else:
+			previous_name = registry.remove_shared_reference(interpreters_file_path, project_path)
+		if previous_name is not None:
+			changes[previous_name] = None
+
+	for previous_name in changes:
+		owner = shared_interpreter_owner(registry.shared_references(interpreters_file_path, previous_name))
+		if owner is None:
+			logger.info(msg.SHARED_SDK_RELEASED.format(interpreter_name=previous_name))
+		else:
+			changes[previous_name] = render_interpreter(previous_name, owner[1], owner[0], associated=False)
+	return changes
+
+
+def referenced_shared_interpreters(interpreters_file_path, logger):
+	"""
+	Lists the shared interpreters still used by some existing project, forgetting the references of the projects
+	whose directory no longer exists.
+
+	:param str interpreters_file_path: ``jdk.table.xml`` file path
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:return: Shared interpreter names
+	:rtype: set[str]
+	"""
+	registry = open_registry(logger)
+	if not registry:
+		return set()
+	with registry:
+		return registry.prune_shared_references(interpreters_file_path)
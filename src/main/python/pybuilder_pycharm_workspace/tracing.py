@@ -0,0 +1,177 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pybuilder_pycharm_workspace.constants as const
+import pybuilder_pycharm_workspace.messages as msg
+
+
+class TraceEvent:
+	"""
+	Timed phase of the plugin execution along with its counters (bytes, elements...).
+	"""
+	__slots__ = ('name', 'start', 'duration', 'thread', 'counters')
+
+	def __init__(self, name, counters):
+		"""
+		:param str name: Phase name
+		:param dict[str, int] counters: Initial counters
+		"""
+		self.name = name
+		self.start = 0
+		self.duration = 0
+		self.thread = threading.get_ident()
+		self.counters = counters
+
+	def count(self, **counters):
+		"""
+		Adds values to the counters of the phase.
+
+		:param dict[str, int] counters: Values to add by counter name
+		:return: None
+		"""
+		for name, value in counters.items():
+			self.counters[name] = self.counters.get(name, 0) + value
+
+
+class Tracer:
+	"""
+	Collector of the phases timed during a plugin task.
+	"""
+
+	def __init__(self):
+		self.origin = time.perf_counter_ns()
+		self.events = []
+		self.lock = threading.Lock()
+
+	def reset(self):
+		"""
+		Forgets every recorded phase.
+
+		:return: None
+		"""
+		with self.lock:
+			self.origin = time.perf_counter_ns()
+			self.events = []
+
+	@contextmanager
+	def phase(self, name, **counters):
+		"""
+		Times the phase run while the context is active.
+
+		:param str name: Phase name
+		:param dict[str, int] counters: Initial counters of the phase
+		:return: Context manager returning the phase event, whose counters can be updated
+		"""
+		event = TraceEvent(name, counters)
+		event.start = time.perf_counter_ns()
+		try:
+			yield event
+		finally:
+			event.duration = time.perf_counter_ns() - event.start
+			with self.lock:
+				self.events.append(event)
+
+	def elapsed(self):
+		"""
+		Returns the time elapsed since the tracer was created or last reset.
+
+		:return: Elapsed time in milliseconds
+		:rtype: float
+		"""
+		return (time.perf_counter_ns() - self.origin) / 1e6
+
+	def summary(self):
+		"""
+		Formats the recorded phases as a table, in the order they started.
+
+		:return: Table lines
+		:rtype: list[str]
+		"""
+		events = sorted(self.events, key=lambda event: event.start)
+		width = max([len(event.name) for event in events] + [len('Phase')])
+		lines = [f'{"Phase":<{width}}  {"Time (ms)":>10}  Counters']
+		for event in events:
+			counters = ', '.join(f'{name}={value}' for name, value in event.counters.items())
+			lines.append(f'{event.name:<{width}}  {event.duration / 1e6:>10.3f}  {counters}')
+		return lines
+
+	def write_chrome_trace(self, output_path):
+		"""
+		Writes the recorded phases in Chrome trace event format (``chrome://tracing`` or Perfetto), so traces of several
+		runs or machines can be combined.
+
+		:param str output_path: Trace file path
+		:return: None
+		"""
+		process = os.getpid()
+		trace_events = [{ 'name': event.name, 'ph': 'X', 'pid': process, 'tid': event.thread,
+		                  'ts': (event.start - self.origin) / 1e3, 'dur': event.duration / 1e3, 'args': event.counters }
+		                for event in self.events]
+		with open(output_path, 'w') as trace_file:
+			json.dump({ 'traceEvents': trace_events, 'displayTimeUnit': 'ms' }, trace_file)
+
+	def write_report(self, output_path):
+		"""
+		Writes the recorded phases as a JSON report.
+
+		:param str output_path: Report file path
+		:return: None
+		"""
+		report = [{ 'name': event.name, 'start_ms': (event.start - self.origin) / 1e6, 'duration_ms': event.duration / 1e6,
+		            'counters': event.counters } for event in sorted(self.events, key=lambda event: event.start)]
+		with open(output_path, 'w') as report_file:
+			json.dump(report, report_file, indent=2)
+
+
+tracer = Tracer()
+
+
+def report_phases(project, logger):
+	"""
+	Logs the total time of the task and, at debug level, the phases timed during it as a summary table. Depending on
+	``pycharm_workspace_trace_format`` property (``chrome`` or ``json``), the phases are written into ``dir_target``
+	directory too.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:return: None
+	"""
+	logger.info(msg.TRACE_TOTAL.format(elapsed=tracer.elapsed(), count=len(tracer.events)))
+	logger.debug(msg.TRACE_SUMMARY)
+	for line in tracer.summary():
+		logger.debug(line)
+
+	trace_format = project.get_property('pycharm_workspace_trace_format')
+	if not trace_format:
+		return
+	trace_format = trace_format.lower()
+	if trace_format not in (const.TRACE_FORMAT_CHROME, const.TRACE_FORMAT_JSON):
+		logger.warn(msg.TRACE_UNKNOWN_FORMAT.format(trace_format=trace_format))
+		return
+	output_directory = project.expand_path('$dir_target')
+	os.makedirs(output_directory, exist_ok=True)
+	if trace_format == const.TRACE_FORMAT_CHROME:
+		output_path = os.path.join(output_directory, const.TRACE_FILENAME)
+		tracer.write_chrome_trace(output_path)
+	else:
+		output_path = os.path.join(output_directory, const.REPORT_FILENAME)
+		tracer.write_report(output_path)
+	logger.info(msg.TRACE_WRITTEN.format(output_path=output_path))
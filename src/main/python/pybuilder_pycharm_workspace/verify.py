@@ -0,0 +1,290 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import difflib
+import glob
+import hashlib
+import json
+import os
+import re
+import textwrap
+from pathlib import Path
+
+import pybuilder_pycharm_workspace.constants as const
+import pybuilder_pycharm_workspace.messages as msg
+from pybuilder_pycharm_workspace.errors import NoPyCharmConfigDirError
+from pybuilder_pycharm_workspace.helpers import fill_template, user_cache_directory, write_file_if_changed
+from pybuilder_pycharm_workspace.jdk_table import entry_hash, find_interpreter, line_indent
+from pybuilder_pycharm_workspace.merge import merge_run_manager
+from pybuilder_pycharm_workspace.model import modules_document
+from pybuilder_pycharm_workspace.monorepo import discover_module_directories
+from pybuilder_pycharm_workspace.registry import open_registry
+from pybuilder_pycharm_workspace.resources import templates as templates
+from pybuilder_pycharm_workspace.run_configurations import render_run_configuration_files
+from pybuilder_pycharm_workspace.serializer import iter_document
+from pybuilder_pycharm_workspace.workspace import build_module_document, build_run_configurations, \
+	build_workspace_document, find_pycharm_config_path, removed_configurations, render_project_interpreter
+
+
+def content_hash(text):
+	"""
+	Hashes a text file contents.
+
+	:param str text: File contents
+	:return: Hexadecimal digest
+	:rtype: str
+	"""
+	return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def compact_diff(file_name, current, expected):
+	"""
+	Builds a unified diff with a single line of context between the current and the expected contents of a file.
+
+	:param str file_name: File name shown in the diff header
+	:param str current: Current contents
+	:param str expected: Expected contents
+	:return: Diff lines without line breaks
+	:rtype: list[str]
+	"""
+	return list(difflib.unified_diff(current.splitlines(), expected.splitlines(), f'{file_name} (current)',
+	                                 f'{file_name} (expected)', n=1, lineterm=''))
+
+
+MODULE_FILE_PATH_PATTERN = re.compile(r'filepath="\$PROJECT_DIR\$/([^"]+)"')
+
+
+def expected_module_file_paths(project, current_modules):
+	"""
+	Returns the IML files ``modules.xml`` file is expected to list: the project one and, when the current file lists
+	other modules (``generate_pycharm_monorepo_workspace`` task wrote it), the one of every sub-project found (see
+	``monorepo.discover_module_directories``), which is the IML file in its directory.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param str or None current_modules: Current ``modules.xml`` contents
+	:return: IML file paths relative to the project directory
+	:rtype: list[str]
+	"""
+	project_module = f'.idea/{const.IML_FILENAME.format(project_name=project.name)}'
+	if not current_modules or not any(path != project_module for path in MODULE_FILE_PATH_PATTERN.findall(current_modules)):
+		return [project_module]
+	root_directory = project.get_property('pycharm_workspace_project_path')
+	module_file_paths = [project_module]
+	for module_directory in discover_module_directories(str(root_directory), int(project.get_property('pycharm_workspace_monorepo_depth'))):
+		iml_file_paths = sorted(glob.glob(os.path.join(glob.escape(module_directory), '*.iml')))
+		iml_file_path = iml_file_paths[0] if iml_file_paths else \
+			os.path.join(module_directory, const.IML_FILENAME.format(project_name=os.path.basename(module_directory)))
+		module_file_paths.append(Path(os.path.relpath(iml_file_path, str(root_directory))).as_posix())
+	return module_file_paths
+
+
+def render_expected_idea_files(project, current_workspace, current_modules=None):
+	"""
+	Renders in memory the ``.idea`` directory files ``generate_pycharm_workspace`` task would write, along with the run
+	configuration files when they're written into their own files.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param str or None current_workspace: Current ``workspace.xml`` contents, to merge the run configurations into
+	:param str or None current_modules: Current ``modules.xml`` contents, telling whether the project is a monorepo
+	    (see ``expected_module_file_paths``)
+	:return: Expected contents by file path relative to the ``.idea`` directory
+	:rtype: dict[str, str]
+	"""
+	iml_filename = const.IML_FILENAME.format(project_name=project.name)
+	configurations = build_run_configurations(project, save_cache=False)
+	workspace = build_workspace_document(project, configurations)
+	run_manager = next(node for node in workspace.children if ('name', 'RunManager') in node.attributes)
+	merged_workspace = merge_run_manager(current_workspace, run_manager, removed_configurations(project, configurations)) \
+		if current_workspace and current_workspace.strip() else None
+	run_configuration_files = { os.path.relpath(relative_path, '.idea'): contents
+	                            for relative_path, contents in render_run_configuration_files(project, configurations).items() }
+	return { **run_configuration_files,
+	         iml_filename: ''.join(iter_document(build_module_document(project, save_cache=False))),
+	         const.MODULES_FILENAME: ''.join(iter_document(modules_document(expected_module_file_paths(project, current_modules)))),
+	         const.MISC_FILENAME: fill_template(templates.MISC_FILE,
+	                                            project_interpreter_name=project.get_property('pycharm_workspace_project_interpreter_name')),
+	         const.WORKSPACE_FILENAME: merged_workspace if merged_workspace is not None else ''.join(iter_document(workspace)) }
+
+
+def record_idea_file_hashes(project):
+	"""
+	Stores the hash of every ``.idea`` directory file ``generate_pycharm_workspace`` task writes (run configuration
+	files included) along with its modification time and size in the user cache directory, so later checks don't read
+	the files still matching them (see ``check_idea_files``).
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:return: None
+	"""
+	project_path = project.get_property('pycharm_workspace_project_path')
+	pycharm_idea_directory = project_path / '.idea'
+	file_names = [const.IML_FILENAME.format(project_name=project.name), const.MODULES_FILENAME, const.MISC_FILENAME,
+	              const.WORKSPACE_FILENAME]
+	try:
+		with open(pycharm_idea_directory / const.RUN_CONFIGURATIONS_CACHE_FILENAME) as run_configurations_cache_file:
+			file_names.extend(os.path.relpath(relative_path, '.idea') for relative_path in json.load(run_configurations_cache_file))
+	except (OSError, ValueError):
+		pass
+
+	hashes = read_idea_file_hashes()
+	for file_name in file_names:
+		file_path = str(pycharm_idea_directory / file_name)
+		try:
+			with open(file_path, encoding='utf-8') as idea_file:
+				contents = idea_file.read()
+			file_stat = os.stat(file_path)
+		except (OSError, UnicodeDecodeError):
+			hashes.pop(file_path, None)
+			continue
+		hashes[file_path] = [file_stat.st_mtime_ns, file_stat.st_size, content_hash(contents)]
+	cache_file_path = user_cache_directory() / const.VERIFY_CACHE_FILENAME
+	try:
+		cache_file_path.parent.mkdir(parents=True, exist_ok=True)
+		write_file_if_changed(cache_file_path, json.dumps(hashes, sort_keys=True))
+	except OSError:
+		pass
+
+
+def read_idea_file_hashes():
+	"""
+	Reads the ``.idea`` directory file hashes stored by ``record_idea_file_hashes``.
+
+	:return: Modification time, size and hash of every file by path
+	:rtype: dict[str, list]
+	"""
+	try:
+		with open(user_cache_directory() / const.VERIFY_CACHE_FILENAME) as cache_file:
+			hashes = json.load(cache_file)
+	except (OSError, ValueError):
+		return {}
+	return hashes if isinstance(hashes, dict) else {}
+
+
+def check_idea_files(project, hashes):
+	"""
+	Compares the ``.idea`` directory files with their expected contents.
+
+	Files whose modification time and size match the ones stored in ``hashes`` along with the hash of their expected
+	contents aren't read. Run configuration files the plugin wrote before and no longer renders are reported too, as
+	``generate_pycharm_workspace`` task would remove them.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param dict[str, list] hashes: File hashes by path (see ``record_idea_file_hashes``)
+	:return: Diff lines of every drifted file by file name
+	:rtype: dict[str, list[str]]
+	"""
+	pycharm_idea_directory = project.get_property('pycharm_workspace_project_path') / '.idea'
+	workspace_path = pycharm_idea_directory / const.WORKSPACE_FILENAME
+	try:
+		current_workspace = workspace_path.read_text(encoding='utf-8')
+	except (OSError, UnicodeDecodeError):
+		current_workspace = None
+	try:
+		current_modules = (pycharm_idea_directory / const.MODULES_FILENAME).read_text(encoding='utf-8')
+	except (OSError, UnicodeDecodeError):
+		current_modules = None
+
+	drifts = {}
+	expected_files = render_expected_idea_files(project, current_workspace, current_modules)
+	for file_name, expected in expected_files.items():
+		file_path = str(pycharm_idea_directory / file_name)
+		try:
+			file_stat = os.stat(file_path)
+		except OSError:
+			drifts[file_name] = [msg.VERIFY_MISSING_FILE]
+			continue
+		cached = hashes.get(file_path)
+		if cached and cached[:2] == [file_stat.st_mtime_ns, file_stat.st_size] and cached[2] == content_hash(expected):
+			continue
+		current = { const.WORKSPACE_FILENAME: current_workspace, const.MODULES_FILENAME: current_modules }.get(file_name)
+		if current is None:
+			try:
+				with open(file_path, encoding='utf-8') as current_file:
+					current = current_file.read()
+			except (OSError, UnicodeDecodeError):
+				current = ''
+		if current != expected:
+			drifts[file_name] = compact_diff(file_name, current, expected)
+
+	try:
+		with open(pycharm_idea_directory / const.RUN_CONFIGURATIONS_CACHE_FILENAME) as run_configurations_cache_file:
+			written_files = [os.path.relpath(relative_path, '.idea') for relative_path in json.load(run_configurations_cache_file)]
+	except (OSError, ValueError, TypeError):
+		written_files = []
+	for file_name in written_files:
+		if file_name not in expected_files and os.path.isfile(pycharm_idea_directory / file_name):
+			drifts[file_name] = [msg.VERIFY_LEFTOVER_FILE]
+	return drifts
+
+
+def check_project_interpreter(project, logger):
+	"""
+	Compares the project interpreter entry of PyCharm's ``jdk.table.xml`` file with the expected one.
+
+	The interpreters registry answers without reading the file when it's fresh; the file is only read otherwise. The
+	check is skipped with a warning when there is no PyCharm config directory (e.g. on a CI server).
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:return: Diff lines if the entry drifted or is missing, empty otherwise
+	:rtype: list[str]
+	"""
+	interpreter_name, expected = render_project_interpreter(project, logger, save_cache=False)
+	try:
+		interpreters_file_path = str(find_pycharm_config_path(project, logger, save_cache=False) / 'jdk.table.xml')
+	except NoPyCharmConfigDirError:
+		logger.warn(msg.VERIFY_INTERPRETER_SKIPPED)
+		return []
+	expected_hash = entry_hash(expected)
+	registry = open_registry(logger, read_only=True)
+	if registry:
+		with registry:
+			if registry.is_current(interpreters_file_path, interpreter_name, expected_hash):
+				return []
+
+	try:
+		with open(interpreters_file_path, 'rb') as interpreters_file:
+			data = interpreters_file.read()
+	except OSError:
+		data = b''
+	span = find_interpreter(data, interpreter_name)
+	if span is None:
+		return [msg.VERIFY_MISSING_INTERPRETER.format(interpreter_name=interpreter_name)]
+	if entry_hash(data[span[0]:span[1]]) == expected_hash:
+		return []
+	current = textwrap.dedent((line_indent(data, span[0]) or b'').decode('utf-8') + data[span[0]:span[1]].decode('utf-8'))
+	return compact_diff(os.path.basename(interpreters_file_path), current, textwrap.dedent(expected.strip('\n')))
+
+
+def verify_workspace(project, logger):
+	"""
+	Checks whether the PyCharm workspace of the project is up to date, without writing any file: caches are only
+	read, and the interpreters registry is opened read-only.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:return: Diff lines of every drifted file by file name (``jdk.table.xml`` included)
+	:rtype: dict[str, list[str]]
+	"""
+	drifts = {}
+	interpreter_diff = check_project_interpreter(project, logger)
+	if interpreter_diff:
+		drifts['jdk.table.xml'] = interpreter_diff
+	drifts.update(check_idea_files(project, read_idea_file_hashes()))
+
+	for file_name, diff in drifts.items():
+		logger.warn(msg.VERIFY_DRIFT.format(file_name=file_name))
+		for line in diff:
+			logger.info(line)
+	return drifts
@@ -0,0 +1,311 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import hashlib
+import json
+import os
+import re
+from collections import namedtuple
+from pathlib import Path
+
+import pybuilder_pycharm_workspace.constants as const
+from pybuilder_pycharm_workspace.helpers import user_cache_directory, write_file_if_changed
+from pybuilder_pycharm_workspace.jdk_table import escape_attribute
+from pybuilder_pycharm_workspace.resources import templates as templates
+
+VirtualEnvironment = namedtuple('VirtualEnvironment', ('interpreter_path', 'version', 'class_paths'))
+
+VERSION_PATTERN = re.compile(r'^(\d+)\.(\d+)')
+DISTRIBUTION_NAME_PATTERN = re.compile(r'[-_.]+')
+
+
+def project_virtualenv_path(project):
+	"""
+	Returns the virtual environment directory of the project (``pycharm_workspace_venv_path`` property, relative to the
+	project directory, or ``venv`` directory in the project by default).
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:return: Virtual environment directory path
+	:rtype: pathlib.Path
+	"""
+	return project.get_property('pycharm_workspace_project_path') / (project.get_property('pycharm_workspace_venv_path') or 'venv')
+
+
+def pycharm_path(path):
+	"""
+	Converts a filesystem path to the form PyCharm stores it in its config files: forward slashes, with the user home
+	directory replaced by ``$USER_HOME$`` macro.
+
+	:param str or pathlib.Path path: Filesystem path
+	:return: PyCharm path
+	:rtype: str
+	"""
+	path, home = str(path).replace('\\', '/'), str(Path.home()).replace('\\', '/')
+	if path == home or path.startswith(home.rstrip('/') + '/'):
+		path = '$USER_HOME$' + path[len(home.rstrip('/')):]
+	return path
+
+
+def read_pyvenv_cfg(cfg_path):
+	"""
+	Reads the ``key = value`` lines of a ``pyvenv.cfg`` file.
+
+	:param str cfg_path: ``pyvenv.cfg`` file path
+	:return: Values by lowercase key, empty if the file can't be read
+	:rtype: dict[str, str]
+	"""
+	values = {}
+	try:
+		with open(cfg_path, encoding='utf-8') as cfg_file:
+			for line in cfg_file:
+				key, separator, value = line.partition('=')
+				if separator:
+					values[key.strip().lower()] = value.strip()
+	except (OSError, UnicodeDecodeError):
+		pass
+	return values
+
+
+def read_pth_paths(site_packages):
+	"""
+	Lists the existing directories added to ``sys.path`` by the ``.pth`` files of a site-packages directory (editable
+	installs, namespace packages...), without running their ``import`` lines.
+
+	:param str site_packages: Site-packages directory path
+	:return: Absolute directory paths, in file name order
+	:rtype: list[str]
+	"""
+	paths = []
+	try:
+		pth_files = sorted(entry.path for entry in os.scandir(site_packages) if entry.name.endswith('.pth') and entry.is_file())
+	except OSError:
+		return paths
+	for pth_file in pth_files:
+		try:
+			with open(pth_file, encoding='utf-8') as pth:
+				lines = pth.read().splitlines()
+		except (OSError, UnicodeDecodeError):
+			continue
+		for line in lines:
+			line = line.strip()
+			if not line or line.startswith(('#', 'import ', 'import\t')):
+				continue
+			path = os.path.normpath(os.path.join(site_packages, line))
+			if os.path.isdir(path) and path not in paths:
+				paths.append(path)
+	return paths
+
+
+def inspect_virtualenv(venv_path):
+	"""
+	Works out the interpreter and the ``sys.path`` roots of a virtual environment from its files, without running
+	Python.
+
+	The Python version and base installation come from ``pyvenv.cfg``. The layout is the Windows one (``Scripts``,
+	``Lib/site-packages``) when the environment has a ``Scripts`` directory, or is missing on Windows, and the POSIX one
+	(``bin``, ``lib/pythonX.Y/site-packages``) otherwise. Roots are the base installation standard library, the
+	environment site-packages (plus the base one when ``include-system-site-packages`` is set) and the directories
+	listed in their ``.pth`` files.
+
+	:param str or pathlib.Path venv_path: Virtual environment directory
+	:return: Virtual environment description
+	:rtype: VirtualEnvironment
+	"""
+	venv_path = str(venv_path)
+	cfg = read_pyvenv_cfg(os.path.join(venv_path, 'pyvenv.cfg'))
+	version = cfg.get('version') or cfg.get('version_info')
+	version_match = VERSION_PATTERN.match(version or '')
+	windows = os.path.isdir(os.path.join(venv_path, 'Scripts')) or (os.name == 'nt' and not os.path.isdir(os.path.join(venv_path, 'bin')))
+	base_home = cfg.get('home')
+
+	if windows:
+		interpreter_path = os.path.join(venv_path, 'Scripts', 'python.exe')
+		site_packages = [os.path.join(venv_path, 'Lib', 'site-packages')]
+		base_prefix = base_home
+		base_roots = [os.path.join(base_home, 'Lib'), os.path.join(base_home, 'DLLs')] if base_home else []
+		base_site_packages = os.path.join(base_home, 'Lib', 'site-packages') if base_home else None
+	else:
+		interpreter_path = os.path.join(venv_path, 'bin', 'python')
+		if version_match:
+			lib_name = f'python{version_match.group(1)}.{version_match.group(2)}'
+		else:
+			lib_names = sorted(path.parent.name for path in Path(venv_path, 'lib').glob('python*/site-packages'))
+			lib_name = lib_names[-1] if lib_names else None
+		site_packages = [os.path.join(venv_path, 'lib', lib_name, 'site-packages')] if lib_name else []
+		base_prefix = os.path.dirname(base_home) if base_home else None
+		base_roots = [os.path.join(base_prefix, 'lib', lib_name), os.path.join(base_prefix, 'lib', lib_name, 'lib-dynload')] \
+			if base_prefix and lib_name else []
+		base_site_packages = os.path.join(base_prefix, 'lib', lib_name, 'site-packages') if base_prefix and lib_name else None
+
+	if cfg.get('include-system-site-packages', 'false').lower() == 'true' and base_site_packages:
+		site_packages.append(base_site_packages)
+	class_paths = [root for root in base_roots if os.path.isdir(root)]
+	for index, directory in enumerate(site_packages):
+		# The environment site-packages directory is listed even before the environment is created
+		if index == 0 or os.path.isdir(directory):
+			class_paths.append(directory)
+			class_paths.extend(path for path in read_pth_paths(directory) if path not in class_paths)
+	return VirtualEnvironment(interpreter_path, version, class_paths)
+
+
+def find_virtualenv(venv_path, save_cache=True):
+	"""
+	Inspects a virtual environment (see ``inspect_virtualenv``), caching the result in the user cache directory.
+
+	Cached results are used while ``pyvenv.cfg`` and the site-packages directory (whose modification time changes when
+	packages or ``.pth`` files are installed) keep their modification data (see ``virtualenv_stamps``).
+
+	:param str or pathlib.Path venv_path: Virtual environment directory
+	:param bool save_cache: Whether to update the cache after an inspection
+	:return: Virtual environment description
+	:rtype: VirtualEnvironment
+	"""
+	venv_path = str(venv_path)
+	stamps = virtualenv_stamps(venv_path)
+
+	cache_file_path = user_cache_directory() / const.VIRTUALENVS_CACHE_FILENAME
+	try:
+		with open(cache_file_path) as cache_file:
+			cache = json.load(cache_file)
+	except (OSError, ValueError):
+		cache = {}
+	if not isinstance(cache, dict):
+		cache = {}
+	cached = cache.get(venv_path)
+	if cached and cached.get('stamps') == stamps:
+		return VirtualEnvironment(*cached['virtualenv'])
+
+	virtualenv = inspect_virtualenv(venv_path)
+	if not save_cache:
+		return virtualenv
+	cache[venv_path] = { 'stamps': stamps, 'virtualenv': virtualenv }
+	try:
+		cache_file_path.parent.mkdir(parents=True, exist_ok=True)
+		write_file_if_changed(cache_file_path, json.dumps(cache, sort_keys=True))
+	except OSError:
+		pass
+	return virtualenv
+
+
+def virtualenv_stamps(venv_path):
+	"""
+	Lists the modification data of the files a virtual environment description is read from: ``pyvenv.cfg`` and the
+	site-packages directories.
+
+	:param str or pathlib.Path venv_path: Virtual environment directory
+	:return: Path, modification time and size of every file (``None`` for both if it doesn't exist)
+	:rtype: list[list]
+	"""
+	stamps = []
+	for path in [os.path.join(str(venv_path), 'pyvenv.cfg')] + site_packages_directories(venv_path):
+		try:
+			path_stat = os.stat(path)
+			stamps.append([path, path_stat.st_mtime_ns, path_stat.st_size])
+		except OSError:
+			stamps.append([path, None, None])
+	return stamps
+
+
+def site_packages_directories(venv_path):
+	"""
+	Lists the site-packages directories of a virtual environment, for both Windows and POSIX layouts.
+
+	:param str or pathlib.Path venv_path: Virtual environment directory
+	:return: Directory paths, sorted
+	:rtype: list[str]
+	"""
+	return sorted(str(path) for path in Path(venv_path).glob('[Ll]ib/*site-packages')) \
+	       + sorted(str(path) for path in Path(venv_path).glob('lib/python*/site-packages'))
+
+
+def installed_distributions(venv_path):
+	"""
+	Lists the distributions installed in a virtual environment from their ``.dist-info`` and ``.egg-info`` directory
+	names, without reading their metadata.
+
+	:param str or pathlib.Path venv_path: Virtual environment directory
+	:return: Normalised distribution names and versions, sorted
+	:rtype: list[tuple[str, str]]
+	"""
+	distributions = set()
+	for site_packages in site_packages_directories(venv_path):
+		try:
+			names = [entry.name for entry in os.scandir(site_packages)]
+		except OSError:
+			continue
+		for name in names:
+			stem, _, suffix = name.rpartition('.')
+			if suffix in ('dist-info', 'egg-info'):
+				distribution, _, version = stem.partition('-')
+				distributions.add((DISTRIBUTION_NAME_PATTERN.sub('_', distribution).lower(), version.partition('-')[0]))
+	return sorted(distributions)
+
+
+def virtualenv_fingerprint(venv_path, ignored_distributions=()):
+	"""
+	Computes a digest identifying the contents of a virtual environment, read statically: its base interpreter and
+	version from ``pyvenv.cfg`` and the names and versions of its installed distributions.
+
+	:param str or pathlib.Path venv_path: Virtual environment directory
+	:param collections.abc.Iterable[str] ignored_distributions: Names of distributions left out (such as the project
+	    itself, when it's installed in development mode)
+	:return: Hexadecimal digest
+	:rtype: str
+	"""
+	cfg = read_pyvenv_cfg(os.path.join(str(venv_path), 'pyvenv.cfg'))
+	ignored = { DISTRIBUTION_NAME_PATTERN.sub('_', name).lower() for name in ignored_distributions }
+	inputs = [[[key, cfg.get(key)] for key in const.PYVENV_CFG_FINGERPRINT_KEYS],
+	          [distribution for distribution in installed_distributions(venv_path) if distribution[0] not in ignored]]
+	return hashlib.sha256(json.dumps(inputs).encode('utf-8')).hexdigest()
+
+
+def is_subpath(path, directory):
+	"""
+	Checks whether a path is a directory or lies below it.
+
+	:param str or pathlib.Path path: Path to check
+	:param str or pathlib.Path directory: Directory path
+	:return: ``True`` if the path is inside the directory
+	:rtype: bool
+	"""
+	path, directory = os.path.abspath(path), os.path.abspath(directory)
+	return os.path.commonpath([path, directory]) == directory
+
+
+def render_interpreter(interpreter_name, venv_path, project_path, associated=True, save_cache=True):
+	"""
+	Fills the interpreter template for a virtual environment, inspected statically (see ``find_virtualenv``), so the
+	entry lists the exact interpreter path and class path roots and PyCharm doesn't need to run the interpreter to
+	discover them.
+
+	:param str interpreter_name: Interpreter name
+	:param str or pathlib.Path venv_path: Virtual environment directory
+	:param str or pathlib.Path project_path: Directory of the project owning the virtual environment
+	:param bool associated: Whether the interpreter is associated with the project. Interpreters shared among
+	    projects aren't, and leave out the project directories added to ``sys.path`` too
+	:param bool save_cache: Whether to update the virtual environments cache (see ``find_virtualenv``)
+	:return: ``<jdk>`` element text
+	:rtype: str
+	"""
+	virtualenv = find_virtualenv(venv_path, save_cache)
+	class_paths = virtualenv.class_paths if associated else \
+		[path for path in virtualenv.class_paths if not is_subpath(path, project_path) or is_subpath(path, venv_path)]
+	return templates.INTERPRETER.format(
+		interpreter_name=escape_attribute(interpreter_name),
+		version=templates.INTERPRETER_VERSION.format(version=escape_attribute(virtualenv.version)) if virtualenv.version else '',
+		home_path=escape_attribute(pycharm_path(virtualenv.interpreter_path)),
+		class_paths=''.join(templates.INTERPRETER_CLASS_PATH.format(path=escape_attribute(pycharm_path(path))) for path in class_paths),
+		associated_project=templates.INTERPRETER_ASSOCIATED_PROJECT.format(project_path=escape_attribute(pycharm_path(project_path)))
+		if associated else '')
@@ -0,0 +1,312 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import select
+import struct
+import sys
+import time
+
+import pybuilder_pycharm_workspace.constants as const
+import pybuilder_pycharm_workspace.messages as msg
+from pybuilder_pycharm_workspace.batch import load_project, map_projects
+from pybuilder_pycharm_workspace.fingerprint import save_workspace_fingerprint
+from pybuilder_pycharm_workspace.serializer import write_document
+from pybuilder_pycharm_workspace.virtualenvs import project_virtualenv_path
+from pybuilder_pycharm_workspace.workspace import add_project_interpreter, build_module_document, \
+	find_pycharm_config_path, generate_workspace, write_idea_file
+
+ARTIFACT_PROJECT = 'project'
+ARTIFACT_MODULE = 'module'
+ARTIFACT_INTERPRETER = 'interpreter'
+
+INOTIFY_EVENT = struct.Struct('iIII')
+INOTIFY_MASK = 0x00000002 | 0x00000004 | 0x00000008 | 0x00000040 | 0x00000080 | 0x00000100 | 0x00000200 | 0x00000400
+INOTIFY_NONBLOCK_CLOEXEC = os.O_NONBLOCK | getattr(os, 'O_CLOEXEC', 0)
+
+
+class PollingWatcher:
+	"""
+	Watcher of some paths comparing their modification data at regular intervals.
+	"""
+
+	def __init__(self, paths, interval=const.WATCH_POLL_INTERVAL):
+		"""
+		:param collections.abc.Iterable[str] paths: Watched files and directories (they may not exist yet)
+		:param float interval: Seconds between checks
+		"""
+		self.paths = list(paths)
+		self.interval = interval
+		self.snapshot = self.take_snapshot()
+
+	def take_snapshot(self):
+		snapshot = {}
+		for path in self.paths:
+			try:
+				path_stat = os.stat(path)
+				snapshot[path] = (path_stat.st_mtime_ns, path_stat.st_size, path_stat.st_ino)
+			except OSError:
+				snapshot[path] = None
+		return snapshot
+
+	def wait(self, timeout=None):
+		"""
+		Waits until any watched path changes.
+
+		:param float or None timeout: Maximum seconds to wait, forever by default
+		:return: Changed paths, empty if the timeout expired
+		:rtype: set[str]
+		"""
+		deadline = None if timeout is None else time.monotonic() + timeout
+		while True:
+			snapshot = self.take_snapshot()
+			changed = { path for path, key in snapshot.items() if self.snapshot.get(path) != key }
+			self.snapshot = snapshot
+			if changed:
+				return changed
+			if deadline is not None and time.monotonic() >= deadline:
+				return set()
+			time.sleep(self.interval if deadline is None else max(0, min(self.interval, deadline - time.monotonic())))
+
+	def close(self):
+		pass
+
+
+class InotifyWatcher:
+	"""
+	Watcher of some paths based on Linux ``inotify`` API. Directories are watched themselves, and files through their
+	parent directories.
+	"""
+
+	def __init__(self, paths):
+		"""
+		:param collections.abc.Iterable[str] paths: Watched files and directories (they may not exist yet)
+		:raises OSError: If ``inotify`` isn't available
+		"""
+		import ctypes
+
+		self.libc = ctypes.CDLL(None, use_errno=True)
+		self.fd = self.libc.inotify_init1(INOTIFY_NONBLOCK_CLOEXEC)
+		if self.fd < 0:
+			raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+		self.paths = list(paths)
+		self.watches = {}
+		self.add_watches()
+
+	def add_watches(self):
+		"""
+		Watches the directories of the watched paths not watched yet, which may have been created since the last call.
+		Paths whose parent directory doesn't exist yet are watched through their nearest existing ancestor.
+
+		:return: None
+		"""
+		watched_directories = set(self.watches.values())
+		for path in self.paths:
+			directories = [path] if os.path.isdir(path) else []
+			parent = os.path.dirname(path)
+			while parent != os.path.dirname(parent) and not os.path.isdir(parent):
+				parent = os.path.dirname(parent)
+			directories.append(parent)
+			for directory in directories:
+				if directory not in watched_directories:
+					descriptor = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), INOTIFY_MASK)
+					if descriptor >= 0:
+						self.watches[descriptor] = directory
+						watched_directories.add(directory)
+
+	def read_events(self):
+		"""
+		Reads the pending events.
+
+		:return: Paths of the files and directories the events happened to
+		:rtype: set[str]
+		"""
+		event_paths = set()
+		try:
+			data = os.read(self.fd, 64 * 1024)
+		except BlockingIOError:
+			return event_paths
+		offset = 0
+		while offset < len(data):
+			descriptor, _, _, name_length = INOTIFY_EVENT.unpack_from(data, offset)
+			name = data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + name_length].rstrip(b'\0')
+			offset += INOTIFY_EVENT.size + name_length
+			directory = self.watches.get(descriptor)
+			if directory is not None:
+				event_paths.add(os.path.join(directory, os.fsdecode(name)) if name else directory)
+		return event_paths
+
+	def wait(self, timeout=None):
+		"""
+		Waits until any watched path changes.
+
+		:param float or None timeout: Maximum seconds to wait, forever by default
+		:return: Changed paths, empty if the timeout expired
+		:rtype: set[str]
+		"""
+		deadline = None if timeout is None else time.monotonic() + timeout
+		while True:
+			remaining = None if deadline is None else max(0, deadline - time.monotonic())
+			if not select.select([self.fd], [], [], remaining)[0]:
+				return set()
+			event_paths = self.read_events()
+			self.add_watches()
+			changed = { path for path in self.paths
+			            if any(event_path == path or os.path.dirname(event_path) == path or path.startswith(event_path + os.sep)
+			                   for event_path in event_paths) }
+			if changed:
+				return changed
+
+	def close(self):
+		os.close(self.fd)
+
+
+def create_watcher(paths, polling=False):
+	"""
+	Creates the best watcher available for some paths: ``inotify`` based on Linux, polling based elsewhere or if
+	``inotify`` can't be used.
+
+	:param collections.abc.Iterable[str] paths: Watched files and directories
+	:param bool polling: Whether to use the polling watcher anyway
+	:return: Watcher
+	:rtype: InotifyWatcher or PollingWatcher
+	"""
+	paths = list(paths)
+	if not polling and sys.platform.startswith('linux'):
+		try:
+			return InotifyWatcher(paths)
+		except (OSError, AttributeError):
+			pass
+	return PollingWatcher(paths)
+
+
+def watched_paths(project, logger):
+	"""
+	Lists the paths whose changes affect the workspace, along with the artifact to regenerate when they change.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:return: Artifact by watched path
+	:rtype: dict[str, str]
+	"""
+	project_path = project.get_property('pycharm_workspace_project_path')
+	paths = { str(project_path / 'build.py'): ARTIFACT_PROJECT,
+	          str(project_virtualenv_path(project)): ARTIFACT_INTERPRETER,
+	          str(project_virtualenv_path(project) / 'pyvenv.cfg'): ARTIFACT_INTERPRETER,
+	          str(find_pycharm_config_path(project, logger) / 'jdk.table.xml'): ARTIFACT_INTERPRETER }
+	for property_name in const.SOURCE_DIRECTORY_PROPERTIES:
+		if project.get_property(property_name):
+			paths[project.expand_path(f'${property_name}')] = ARTIFACT_MODULE
+	return paths
+
+
+def regenerate_artifacts(project, logger, artifacts):
+	"""
+	Regenerates some artifacts of the workspace, leaving the other files untouched: the whole workspace for
+	``build.py`` changes (see ``workspace.generate_workspace``), the IML file for source folder changes and the
+	interpreter entry for virtual environment or PyCharm interpreters file changes. The workspace fingerprint is saved
+	afterwards.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:param set[str] artifacts: Artifacts to regenerate
+	:return: None
+	"""
+	if ARTIFACT_PROJECT in artifacts:
+		generate_workspace(project, logger)
+	else:
+		if ARTIFACT_MODULE in artifacts:
+			iml_filename = const.IML_FILENAME.format(project_name=project.name)
+			write_idea_file(project.get_property('pycharm_workspace_project_path') / '.idea' / iml_filename, logger,
+			                lambda path: write_document(path, build_module_document(project)))
+		if ARTIFACT_INTERPRETER in artifacts:
+			add_project_interpreter(project, logger)
+	save_workspace_fingerprint(project)
+
+
+def regenerate_project_artifacts(project_directory, artifacts):
+	"""
+	Loads a project and regenerates some artifacts of its workspace (see ``regenerate_artifacts``). Meant to be run in a
+	worker process, since the watching process can't load the project again once its ``build.py`` changed.
+
+	:param str project_directory: Directory holding the project's ``build.py`` file
+	:param set[str] artifacts: Artifacts to regenerate
+	:return: Artifact by watched path for the loaded project (see ``watched_paths``)
+	:rtype: dict[str, str]
+	"""
+	from pybuilder.cli import StdOutLogger
+	from pybuilder.core import Logger
+
+	logger = StdOutLogger(Logger.WARN)
+	project = load_project(project_directory, logger)
+	regenerate_artifacts(project, logger, artifacts)
+	return watched_paths(project, logger)
+
+
+def watch_workspace(project, logger, debounce=const.WATCH_DEBOUNCE, polling=False, iterations=None):
+	"""
+	Watches the workspace inputs and regenerates the affected artifacts when they change.
+
+	Changes are debounced: once a change is seen, the changes that follow within ``debounce`` seconds are coalesced
+	with it, so saving many files at once or recreating a virtual environment only triggers one regeneration. Changes
+	caused by the regeneration itself are discarded.
+
+	Once ``build.py`` changes, ``project`` no longer matches it and PyBuilder can't load it again in this process, so
+	from then on every regeneration loads the project in a fresh worker process (see ``regenerate_project_artifacts``),
+	and the watched paths are replaced by the ones derived from it.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:param float debounce: Seconds without changes to wait before regenerating
+	:param bool polling: Whether to poll the paths instead of using ``inotify``
+	:param int or None iterations: Number of regenerations before returning, forever by default
+	:return: None
+	"""
+	project_directory = str(project.get_property('pycharm_workspace_project_path'))
+	reloaded = False
+	paths = watched_paths(project, logger)
+	watcher = create_watcher(paths, polling)
+	logger.info(msg.WATCH_START.format(count=len(paths), watcher=type(watcher).__name__))
+	try:
+		while iterations is None or iterations > 0:
+			changed = watcher.wait()
+			more_changes = watcher.wait(debounce)
+			while more_changes:
+				changed |= more_changes
+				more_changes = watcher.wait(debounce)
+			artifacts = { paths[path] for path in changed }
+			logger.info(msg.WATCH_CHANGES.format(paths=', '.join(sorted(changed)), artifacts=', '.join(sorted(artifacts))))
+			reloaded = reloaded or ARTIFACT_PROJECT in artifacts
+			new_paths = paths
+			try:
+				if reloaded:
+					result = map_projects(regenerate_project_artifacts, [project_directory], 1, artifacts)[project_directory]
+					if isinstance(result, Exception):
+						raise result
+					new_paths = result
+				else:
+					regenerate_artifacts(project, logger, artifacts)
+			except Exception as error:
+				logger.error(msg.WATCH_REGENERATION_FAILURE.format(error=error))
+			watcher.wait(0)
+			if new_paths != paths:
+				watcher.close()
+				paths = new_paths
+				watcher = create_watcher(paths, polling)
+				logger.info(msg.WATCH_START.format(count=len(paths), watcher=type(watcher).__name__))
+			if iterations is not None:
+				iterations -= 1
+	finally:
+		watcher.close()
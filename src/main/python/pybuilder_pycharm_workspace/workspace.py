@@ -0,0 +1,548 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import json
+import os
+import shutil
+from pathlib import Path
+
+import pybuilder_pycharm_workspace.constants as const
+import pybuilder_pycharm_workspace.messages as msg
+from pybuilder_pycharm_workspace.bytecode import prewarm_bytecode
+from pybuilder_pycharm_workspace.discovery import find_pycharm_config, parse_version_prefix
+from pybuilder_pycharm_workspace.errors import InvalidPropertyError, NoPyCharmConfigDirError
+from pybuilder_pycharm_workspace.exclusions import discover_excluded_folders
+from pybuilder_pycharm_workspace.helpers import file_lock, fill_and_write_template, read_file_snapshot, restore_file_snapshot, \
+	to_bool, underscore, write_file_if_changed
+from pybuilder_pycharm_workspace.jdk_table import parse_interpreter, read_interpreter_entries, replace_interpreters
+from pybuilder_pycharm_workspace.merge import write_merged_workspace
+from pybuilder_pycharm_workspace.model import ExcludeFolder, PythonRunConfiguration, SourceFolder, \
+	UnittestsRunConfiguration, configuration_entry, module_document, modules_document, properties_component, \
+	run_manager_component, workspace_document
+from pybuilder_pycharm_workspace.pipeline import Stage, run_pipeline
+from pybuilder_pycharm_workspace.profiling import build_profile_configurations
+from pybuilder_pycharm_workspace.registry import open_registry
+from pybuilder_pycharm_workspace.resources import templates as templates
+from pybuilder_pycharm_workspace.run_configurations import build_configuration_parameters, build_task_configurations, \
+	run_configurations_location, write_run_configuration_files
+from pybuilder_pycharm_workspace.serializer import write_document
+from pybuilder_pycharm_workspace.shared_sdks import is_shared_sdk, project_shared_references, render_shared_interpreter, \
+	shared_interpreter_name, update_shared_references
+from pybuilder_pycharm_workspace.sharding import build_shard_configurations, shard_count, unittest_directory, unittest_pattern
+from pybuilder_pycharm_workspace.tracing import tracer
+from pybuilder_pycharm_workspace.virtualenvs import project_virtualenv_path, render_interpreter
+
+
+IDEA_DIRECTORY_STAGE = '.idea directory'
+INTERPRETER_STAGE = 'interpreter registration'
+RUN_CONFIGURATIONS_STAGE = 'run configurations'
+
+
+def generate_workspace(project, logger):
+	"""
+	Adds project's interpreter to PyCharm config and creates PyCharm's ``.idea`` directory for the project.
+
+	The interpreter name, the only thing the ``.idea`` files need from the interpreter, is computed up front, so the
+	interpreters file update and the ``.idea`` files writes run concurrently as a pipeline (see
+	``pipeline.run_pipeline``). If any of them fails, the others are rolled back. With
+	``pycharm_workspace_prewarm_bytecode`` property set, the virtual environment and the project sources are
+	byte-compiled once the workspace is generated (see ``bytecode.prewarm_bytecode``); pre-warm errors are only
+	logged.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:return: None
+	:raises PipelineError: If any stage failed
+	"""
+	project_interpreter_name(project)
+	run_pipeline([interpreter_stage(project, logger), *idea_directory_stages(project, logger)], logger)
+	if to_bool(project.get_property('pycharm_workspace_prewarm_bytecode')):
+		workers = project.get_property('pycharm_workspace_prewarm_workers')
+		try:
+			with tracer.phase('bytecode pre-warm'):
+				prewarm_bytecode(project, logger, int(workers) if workers else None)
+		except Exception as error:
+			logger.warn(msg.BYTECODE_FAILURE.format(error=error))
+
+
+def interpreter_stage(project, logger):
+	"""
+	Builds the pipeline stage adding project's interpreter to PyCharm config (see ``add_project_interpreter``), which
+	puts the previous interpreter with the same name back on rollback.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:return: Pipeline stage
+	:rtype: pybuilder_pycharm_workspace.pipeline.Stage
+	"""
+	previous = {}
+
+	def rollback():
+		if previous:
+			interpreters_file_path = str(project.get_property('pycharm_workspace_pycharm_config_path') / 'jdk.table.xml')
+			with file_lock(interpreters_file_path + const.LOCK_FILE_SUFFIX):
+				replace_interpreters(interpreters_file_path, previous)
+
+	return Stage(INTERPRETER_STAGE, lambda: add_project_interpreter(project, logger, previous), rollback=rollback)
+
+
+def add_project_interpreter(project, logger, previous=None):
+	"""
+	Function in charge of adding project's virtual environment to PyCharm config.
+
+	It checks the ``jdk.table.xml`` file for the existence of a previously configured interpreter with the same name.
+	If it doesn't exist, this function adds the interpreter for PyCharm for the virtual environment belonging to the
+	project. In case it finds one, this will be replaced by the new one.
+
+	With ``pycharm_workspace_shared_sdk`` property set, the project uses the interpreter shared by every project with
+	an identical virtual environment instead. The projects using every shared interpreter are recorded in the
+	interpreters registry along with the interpreters (see ``register_interpreters``), so a shared interpreter is only
+	removed when the last project using it stops doing so.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:param dict[str, str or None] or None previous: Dictionary receiving the previous interpreter, if the
+	    interpreters file is rewritten (see ``register_interpreters``)
+	:return: None
+	:raises NoPyCharmConfigDirError: If the plugin can't find PyCharm config directory
+	:raises InterpretersFileError: If PyCharm interpreters file is malformed
+	"""
+	logger.info(msg.INTERPRETER_START)
+	pycharm_config_path = find_pycharm_config_path(project, logger)
+	interpreters_file_path = str(pycharm_config_path / 'jdk.table.xml')
+	interpreter_name, project_interpreter = render_project_interpreter(project, logger)
+
+	if register_interpreters(interpreters_file_path, { interpreter_name: project_interpreter }, logger, previous,
+	                         project_shared_references(project, interpreters_file_path, logger)):
+		logger.debug(msg.INTERPRETER_FILE_OVERWRITTEN.format(interpreters_file_path=interpreters_file_path))
+
+
+def find_pycharm_config_path(project, logger, save_cache=True):
+	"""
+	Looks for the newest PyCharm config directory matching ``pycharm_workspace_main_version`` and
+	``pycharm_workspace_edition`` properties (the newest of any version when the former is not set).
+
+	The path found is stored in ``pycharm_workspace_pycharm_config_path`` project property.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:param bool save_cache: Whether to update the config directories cache (see ``discovery.discover_pycharm_configs``)
+	:return: PyCharm ``options`` directory path
+	:rtype: pathlib.Path
+	:raises InvalidPropertyError: If ``pycharm_workspace_main_version`` property isn't a version such as ``2019.3``
+	:raises NoPyCharmConfigDirError: If the plugin can't find PyCharm config directory
+	"""
+	main_version = project.get_property('pycharm_workspace_main_version')
+	try:
+		parse_version_prefix(main_version)
+	except ValueError:
+		raise InvalidPropertyError('pycharm_workspace_main_version', main_version) from None
+	with tracer.phase('config directory discovery'):
+		pycharm_config = find_pycharm_config(main_version, project.get_property('pycharm_workspace_edition'), save_cache)
+	if not pycharm_config:
+		raise NoPyCharmConfigDirError
+	logger.debug(msg.INTERPRETER_PYCHARM_LATEST.format(pycharm_config_name=os.path.basename(pycharm_config.path)))
+	pycharm_config_path = Path(pycharm_config.options_path)
+	logger.debug(msg.INTERPRETER_PYCHARM_LATEST_PATH.format(pycharm_config_path=pycharm_config_path))
+	project.set_property('pycharm_workspace_pycharm_config_path', pycharm_config_path)
+	return pycharm_config_path
+
+
+def render_project_interpreter(project, logger, save_cache=True):
+	"""
+	Fills the interpreter template for the project's virtual environment (see ``virtualenvs.render_interpreter``), or
+	for its shared interpreter (see ``shared_sdks.render_shared_interpreter``) with ``pycharm_workspace_shared_sdk``
+	property set. The interpreter name is stored in ``pycharm_workspace_project_interpreter_name`` project property.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:param bool save_cache: Whether to update the caches read along
+	:return: Interpreter name and ``<jdk>`` element text
+	:rtype: tuple[str, str]
+	"""
+	with tracer.phase('interpreter template render') as phase:
+		interpreter_name = project_interpreter_name(project)
+		if is_shared_sdk(project):
+			project_interpreter = render_shared_interpreter(project, interpreter_name, logger, save_cache)
+		else:
+			project_interpreter = render_interpreter(interpreter_name, project_virtualenv_path(project),
+			                                         project.get_property('pycharm_workspace_project_path'),
+			                                         save_cache=save_cache)
+		phase.count(bytes=len(project_interpreter))
+	logger.debug(msg.INTERPRETER_NEW_NAME.format(interpreter_name=interpreter_name))
+	return interpreter_name, project_interpreter
+
+
+def project_interpreter_name(project):
+	"""
+	Computes the name of the project's interpreter, or of its shared interpreter with ``pycharm_workspace_shared_sdk``
+	property set (see ``shared_sdks.shared_interpreter_name``), and stores it in
+	``pycharm_workspace_project_interpreter_name`` project property.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:return: Interpreter name
+	:rtype: str
+	"""
+	if is_shared_sdk(project):
+		interpreter_name = shared_interpreter_name(project)
+	else:
+		interpreter_name = templates.INTERPRETER_NAME.format(project_name=project.get_property('pycharm_workspace_project_path').name)
+	project.set_property('pycharm_workspace_project_interpreter_name', interpreter_name)
+	return interpreter_name
+
+
+def register_interpreters(interpreters_file_path, interpreters, logger, previous=None, references=None):
+	"""
+	Adds some interpreters to PyCharm's ``jdk.table.xml`` file in a single rewrite, replacing the ones with the same
+	names.
+
+	The interpreters registry (see ``registry.InterpretersRegistry``) is checked first: when it knows the file didn't
+	change and it already holds the same interpreters, the file isn't read at all. Otherwise, the file is read and
+	rewritten holding an advisory lock, so parallel builds sharing the same PyCharm config don't lose each other's
+	interpreters.
+
+	The shared interpreters used by the projects the interpreters belong to are recorded in the registry while holding
+	the lock, and the shared interpreters they no longer use are removed or rendered again in the same rewrite (see
+	``shared_sdks.update_shared_references``). These registry changes are only committed if the rewrite succeeds.
+
+	:param str interpreters_file_path: ``jdk.table.xml`` file path
+	:param dict[str, str or None] interpreters: ``<jdk>`` element texts of the interpreters by name, ``None`` for the
+	    interpreters to remove
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:param dict[str, str or None] or None previous: Dictionary receiving the ``<jdk>`` element texts the interpreters
+	    had before the rewrite (``None`` for the new ones), so it can be undone. Left empty if the file isn't rewritten
+	:param dict[str, tuple[str or None, str]] or None references: Shared interpreter references of the projects (see
+	    ``shared_sdks.shared_reference``) by project directory
+	:return: ``True`` if the interpreters file was rewritten
+	:rtype: bool
+	:raises InterpreterTemplateError: If an interpreter entry has no name
+	:raises InterpretersFileError: If PyCharm interpreters file is malformed
+	"""
+	references = references or {}
+	with tracer.phase('interpreter template parse', elements=len(interpreters)):
+		entries = { name: parse_interpreter(name, interpreter) for name, interpreter in interpreters.items()
+		            if interpreter is not None }
+	registry = open_registry(logger)
+	try:
+		with tracer.phase('interpreters registry check'):
+			current = registry and len(entries) == len(interpreters) \
+			          and all(registry.is_current(interpreters_file_path, name, entry[3]) for name, entry in entries.items()) \
+			          and all(registry.shared_reference_name(interpreters_file_path, project_path) == name
+			                  for project_path, (name, _) in references.items())
+		if current:
+			for interpreter_name in interpreters:
+				logger.info(msg.INTERPRETER_UP_TO_DATE.format(interpreter_name=interpreter_name))
+			return False
+		with file_lock(interpreters_file_path + const.LOCK_FILE_SUFFIX):
+			if registry:
+				with tracer.phase('interpreters registry refresh'):
+					registry.refresh(interpreters_file_path)
+			try:
+				if registry and references:
+					with tracer.phase('shared references update', elements=len(references)):
+						changes = { name: interpreter for name, interpreter
+						            in update_shared_references(registry, interpreters_file_path, references, logger).items()
+						            if name not in interpreters }
+						entries.update((name, parse_interpreter(name, interpreter)) for name, interpreter in changes.items()
+						               if interpreter is not None)
+						interpreters = { **interpreters, **changes }
+				if previous is not None:
+					previous.update(read_interpreter_entries(interpreters_file_path, interpreters))
+				replaced, rewritten = replace_interpreters(interpreters_file_path, interpreters)
+			except Exception:
+				if registry:
+					registry.rollback()
+				raise
+			if previous is not None and not rewritten:
+				previous.clear()
+			if replaced:
+				logger.info(msg.INTERPRETER_FOUND)
+			if registry and len(entries) < len(interpreters):
+				registry.refresh(interpreters_file_path, force=True)
+			elif registry:
+				for name, (_, home_path, project_path, content_hash, _, _) in entries.items():
+					registry.record(interpreters_file_path, name, home_path, project_path, content_hash)
+			if registry:
+				registry.commit()
+	finally:
+		if registry:
+			registry.close()
+	return rewritten
+
+
+def add_project_idea_directory(project, logger, module_file_paths=()):
+	"""
+	Function in charge of adding PyCharm's ``.idea`` directory for the project.
+
+	It creates the directory and includes the minimum necessary files on it filling the templates included in the
+	plugin with the information of the current project, writing them concurrently (see ``idea_directory_stages``).
+	These files are:
+
+	* IML file with project name defining project structure (as source folder etc.)
+	* ``modules.xml`` file with a reference to IML file (and to the IML files of other modules, if any)
+	* ``misc.xml`` file with a reference to the interpreter configured by ``add_project_interpreter`` function
+	* ``workspace.xml`` file with run manager configurations to ease different PyBuilder buildings (merged into the
+	  existing file, if any, keeping the rest of its contents and removing the configurations the plugin wrote before
+	  and no longer renders):
+
+		* Build with development environment configuration
+		* Build with development environment configuration and no testing
+		* Only run tests
+		* Build with production environment configuration
+		* Run every registered PyBuilder task
+
+	  Run configurations are written into their own files instead, one per configuration, when
+	  ``pycharm_workspace_run_configurations`` property is ``idea`` (``.idea/runConfigurations`` directory) or ``run``
+	  (``.run`` directory).
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:param collections.abc.Iterable[str] module_file_paths: IML file paths of other modules of the PyCharm project,
+	    relative to the project directory
+	:return: None
+	:raises PipelineError: If any file couldn't be written
+	"""
+	run_pipeline(idea_directory_stages(project, logger, module_file_paths), logger)
+
+
+def idea_directory_stages(project, logger, module_file_paths=()):
+	"""
+	Builds the pipeline stages creating PyCharm's ``.idea`` directory for the project (see
+	``add_project_idea_directory``): the directory itself, and a stage for every file depending on it.
+
+	Run configurations are built once and shared by the ``workspace.xml`` stage and the run configuration files one.
+	On rollback, every file written gets its previous contents back, and the directory is removed if it didn't exist.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:param collections.abc.Iterable[str] module_file_paths: IML file paths of other modules of the PyCharm project,
+	    relative to the project directory
+	:return: Pipeline stages
+	:rtype: list[pybuilder_pycharm_workspace.pipeline.Stage]
+	"""
+	iml_filename = const.IML_FILENAME.format(project_name=project.name)
+	pycharm_idea_directory = project.get_property('pycharm_workspace_project_path') / '.idea'
+	location = project.get_property('pycharm_workspace_run_configurations')
+	if location and run_configurations_location(project) != str(location).lower():
+		logger.warn(msg.WORKSPACE_RUN_CONFIGURATIONS_UNKNOWN_LOCATION.format(location=location))
+	configurations = build_run_configurations(project)
+	created = []
+	snapshots = {}
+
+	def create_directory():
+		logger.info(msg.WORKSPACE_CREATING_IDEA_DIRECTORY)
+		if not pycharm_idea_directory.is_dir():
+			pycharm_idea_directory.mkdir()
+			created.append(pycharm_idea_directory)
+
+	def remove_directory():
+		for directory in created:
+			shutil.rmtree(directory, ignore_errors=True)
+
+	def write_configuration_files():
+		with tracer.phase('render and write run configuration files') as phase:
+			written, count = write_run_configuration_files(project, configurations)
+			snapshots.update(written)
+			phase.count(files=count, files_written=len(written))
+		if written:
+			logger.debug(msg.WORKSPACE_RUN_CONFIGURATIONS_WRITTEN.format(changed=len(written), count=count))
+
+	def restore_configuration_files():
+		for file_path, snapshot in snapshots.items():
+			restore_file_snapshot(file_path, snapshot)
+
+	return [Stage(IDEA_DIRECTORY_STAGE, create_directory, rollback=remove_directory),
+	        idea_file_stage(pycharm_idea_directory / iml_filename, logger,
+	                        lambda path: write_document(path, build_module_document(project))),
+	        idea_file_stage(pycharm_idea_directory / const.MODULES_FILENAME, logger,
+	                        lambda path: write_document(path, modules_document([f'.idea/{iml_filename}', *module_file_paths]))),
+	        idea_file_stage(pycharm_idea_directory / const.MISC_FILENAME, logger,
+	                        lambda path: fill_and_write_template(templates.MISC_FILE, path, project_interpreter_name=project.get_property('pycharm_workspace_project_interpreter_name'))),
+	        idea_file_stage(pycharm_idea_directory / const.WORKSPACE_FILENAME, logger,
+	                        lambda path: write_workspace_file(path, project, configurations),
+	                        [pycharm_idea_directory / const.OWNED_CONFIGURATIONS_FILENAME]),
+	        Stage(RUN_CONFIGURATIONS_STAGE, write_configuration_files, [IDEA_DIRECTORY_STAGE], restore_configuration_files)]
+
+
+def idea_file_stage(file_path, logger, write, related_paths=()):
+	"""
+	Builds the pipeline stage writing one of the ``.idea`` directory files (see ``write_idea_file``), which puts the
+	previous file contents back on rollback.
+
+	:param pathlib.Path file_path: File path
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:param collections.abc.Callable[[pathlib.Path], bool] write: Callable rendering and writing the file, returning
+	    whether it was written
+	:param collections.abc.Iterable[pathlib.Path] related_paths: Paths of other files ``write`` may write, whose
+	    previous contents are put back on rollback too
+	:return: Pipeline stage
+	:rtype: pybuilder_pycharm_workspace.pipeline.Stage
+	"""
+	snapshots = {}
+
+	def run():
+		previous = { path: read_file_snapshot(path) for path in (file_path, *related_paths) }
+		written = write_idea_file(file_path, logger, write)
+		snapshots.update((path, snapshot) for path, snapshot in previous.items() if written or path != file_path)
+
+	def rollback():
+		for path, snapshot in snapshots.items():
+			restore_file_snapshot(path, snapshot)
+
+	return Stage(file_path.name, run, [IDEA_DIRECTORY_STAGE], rollback)
+
+
+def write_idea_file(file_path, logger, write):
+	"""
+	Renders and writes one of the ``.idea`` directory files, timing it.
+
+	:param pathlib.Path file_path: File path
+	:param pybuilder.core.Logger logger: PyBuilder logger instance
+	:param collections.abc.Callable[[pathlib.Path], bool] write: Callable rendering and writing the file, returning
+	    whether it was written
+	:return: ``True`` if the file was written
+	:rtype: bool
+	"""
+	logger.debug(msg.WORKSPACE_CREATING_FILE.format(file_name=file_path.name))
+	with tracer.phase(f'render and write {file_path.name}') as phase:
+		written = write(file_path)
+		if written:
+			phase.count(bytes_written=os.path.getsize(file_path))
+	return written
+
+
+def build_module_document(project, save_cache=True):
+	"""
+	Builds the IML document of the project, with its source folders, excluded folders and interpreter.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param bool save_cache: Whether to update the excluded folders discovery cache
+	:return: IML document root element
+	:rtype: pybuilder_pycharm_workspace.model.Node
+	"""
+	source_folders = [SourceFolder((Path('src') / underscore(project.name)).as_posix())]
+	for property_name in ('dir_source_unittest_python', 'dir_source_integrationtest_python'):
+		if project.get_property(property_name):
+			source_folders.append(SourceFolder(project.get_property(property_name), is_test_source=True))
+	depth = project.get_property('pycharm_workspace_exclude_scan_depth')
+	budget = project.get_property('pycharm_workspace_exclude_scan_budget')
+	excluded_folders = discover_excluded_folders(project, const.EXCLUDE_SCAN_DEPTH if depth is None else int(depth),
+	                                             int(budget) if budget else const.EXCLUDE_SCAN_BUDGET, save_cache)
+	exclude_folders = [ExcludeFolder(path) for path in excluded_folders]
+	return module_document(source_folders, exclude_folders, project.get_property('pycharm_workspace_project_interpreter_name'))
+
+
+def build_run_configurations(project, save_cache=True):
+	"""
+	Builds the run configurations of the project: the build ones (adapted to the registered PyBuilder tasks), one per
+	registered task, the unit tests one, the test shard configurations when ``pycharm_workspace_test_shards`` property
+	is set and the profiling variants of the build ones when ``pycharm_workspace_profile_configurations`` property is
+	set.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param bool save_cache: Whether to update the test durations cache (see ``sharding.read_test_durations``)
+	:return: Run configurations, in the order they are listed by PyCharm
+	:rtype: list[PythonRunConfiguration or UnittestsRunConfiguration or CompoundRunConfiguration]
+	"""
+	configurations = [PythonRunConfiguration(name, project.name, parameters) for name, parameters in build_configuration_parameters(project)]
+	configurations.extend(build_task_configurations(project))
+	test_directory = unittest_directory(project)
+	configurations.append(UnittestsRunConfiguration(templates.UNITTESTS_RUN_CONFIGURATION_NAME.format(project_name=project.name, directory=test_directory),
+	                                                project.name, templates.UNITTESTS_RUN_CONFIGURATION_TARGET.format(directory=test_directory),
+	                                                unittest_pattern(project)))
+	if shard_count(project):
+		configurations.extend(build_shard_configurations(project, shard_count(project), save_cache))
+	if to_bool(project.get_property('pycharm_workspace_profile_configurations')):
+		configurations.extend(build_profile_configurations(project))
+	return configurations
+
+
+def read_owned_configurations(project):
+	"""
+	Reads the run configurations the plugin wrote into ``workspace.xml`` file the last time (see
+	``write_workspace_file``).
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:return: Type, name and ``list`` item value of every configuration (see ``model.configuration_entry``)
+	:rtype: list[tuple[str, str, str]]
+	"""
+	owned_file_path = project.get_property('pycharm_workspace_project_path') / '.idea' / const.OWNED_CONFIGURATIONS_FILENAME
+	try:
+		with open(owned_file_path) as owned_file:
+			return [tuple(entry) for entry in json.load(owned_file)['configurations']]
+	except (OSError, ValueError, KeyError, TypeError):
+		return []
+
+
+def removed_configurations(project, configurations):
+	"""
+	Returns the run configurations to remove from ``workspace.xml`` file: the ones the plugin wrote there before and
+	no longer renders, and every rendered one when they're written into their own files instead. Run configurations
+	created by the user are never listed.
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param list[PythonRunConfiguration or UnittestsRunConfiguration or CompoundRunConfiguration] configurations: Run
+	    configurations
+	:return: Type, name and ``list`` item value of every configuration to remove
+	:rtype: list[tuple[str, str, str]]
+	"""
+	owned = read_owned_configurations(project)
+	entries = [configuration_entry(configuration) for configuration in configurations]
+	if run_configurations_location(project) != const.RUN_CONFIGURATIONS_WORKSPACE:
+		return list(dict.fromkeys(owned + entries))
+	rendered = { entry[:2] for entry in entries }
+	return [entry for entry in owned if entry[:2] not in rendered]
+
+
+def write_workspace_file(file_path, project, configurations):
+	"""
+	Writes the ``workspace.xml`` file of the project, merged into the existing one (see
+	``merge.write_merged_workspace``), and records the run configurations written into it along, so they can be told
+	apart from the ones created by the user on later merges.
+
+	:param pathlib.Path file_path: ``workspace.xml`` file path
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param list[PythonRunConfiguration or UnittestsRunConfiguration or CompoundRunConfiguration] configurations: Run
+	    configurations
+	:return: ``True`` if ``workspace.xml`` file was written
+	:rtype: bool
+	"""
+	written = write_merged_workspace(file_path, build_workspace_document(project, configurations),
+	                                 removed_configurations(project, configurations))
+	owned = [configuration_entry(configuration) for configuration in configurations] \
+		if run_configurations_location(project) == const.RUN_CONFIGURATIONS_WORKSPACE else []
+	write_file_if_changed(file_path.parent / const.OWNED_CONFIGURATIONS_FILENAME, json.dumps({ 'configurations': owned }))
+	return written
+
+
+def build_workspace_document(project, configurations=None):
+	"""
+	Builds the ``workspace.xml`` document of the project. Its ``RunManager`` component holds no configuration when
+	they're written into their own files (see ``run_configurations.write_run_configuration_files``).
+
+	:param pybuilder.core.Project project: PyBuilder project instance
+	:param list[PythonRunConfiguration or UnittestsRunConfiguration or CompoundRunConfiguration] or None configurations:
+	    Run configurations, built from the project if not given
+	:return: ``workspace.xml`` document root element
+	:rtype: pybuilder_pycharm_workspace.model.Node
+	"""
+	if configurations is None:
+		configurations = build_run_configurations(project)
+	if run_configurations_location(project) != const.RUN_CONFIGURATIONS_WORKSPACE:
+		configurations = []
+	selected = next((configuration for configuration in configurations
+	                 if configuration.name == templates.SELECTED_RUN_CONFIGURATION), None)
+	return workspace_document([properties_component(templates.WORKSPACE_PROPERTIES),
+	                           run_manager_component(configurations, selected)])
@@ -0,0 +1,87 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import multiprocessing
+import os
+import tempfile
+import time
+import unittest
+
+from pybuilder_pycharm_workspace.errors import FileLockTimeoutError
+from pybuilder_pycharm_workspace.helpers import file_lock, write_chunks_if_changed
+
+
+def hold_lock(lock_file_path, locked, release):
+	"""
+	Holds a lock file from another process until released.
+
+	:param str lock_file_path: Lock file path
+	:param multiprocessing.Event locked: Event set once the lock is held
+	:param multiprocessing.Event release: Event waited for before releasing the lock
+	:return: None
+	"""
+	with file_lock(lock_file_path):
+		locked.set()
+		release.wait(10)
+
+
+class FileLockTest(unittest.TestCase):
+	def setUp(self):
+		temp_directory = tempfile.TemporaryDirectory()
+		self.addCleanup(temp_directory.cleanup)
+		self.lock_file_path = os.path.join(temp_directory.name, 'jdk.table.xml.lock')
+
+	def test_times_out_while_another_process_holds_the_lock(self):
+		context = multiprocessing.get_context('spawn')
+		locked, release = context.Event(), context.Event()
+		holder = context.Process(target=hold_lock, args=(self.lock_file_path, locked, release))
+		holder.start()
+		self.addCleanup(holder.join)
+		self.addCleanup(release.set)
+		self.assertTrue(locked.wait(10))
+
+		started = time.monotonic()
+		with self.assertRaises(FileLockTimeoutError):
+			with file_lock(self.lock_file_path, timeout=0.3):
+				pass
+		self.assertGreaterEqual(time.monotonic() - started, 0.3)
+
+		release.set()
+		holder.join(10)
+		with file_lock(self.lock_file_path, timeout=5):
+			pass
+
+
+class WriteChunksIfChangedTest(unittest.TestCase):
+	def setUp(self):
+		temp_directory = tempfile.TemporaryDirectory()
+		self.addCleanup(temp_directory.cleanup)
+		self.file_path = os.path.join(temp_directory.name, 'workspace.xml')
+
+	def test_keeps_line_breaks_as_they_are(self):
+		self.assertTrue(write_chunks_if_changed(self.file_path, lambda: ('<project>\r\n', '</project>\n')))
+
+		with open(self.file_path, 'rb') as written_file:
+			self.assertEqual(b'<project>\r\n</project>\n', written_file.read())
+
+	def test_line_break_changes_are_written(self):
+		write_chunks_if_changed(self.file_path, lambda: ('<project>\r\n</project>\r\n',))
+
+		self.assertTrue(write_chunks_if_changed(self.file_path, lambda: ('<project>\n</project>\n',)))
+		self.assertFalse(write_chunks_if_changed(self.file_path, lambda: ('<project>\n</project>\n',)))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,58 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import subprocess
+import sys
+import unittest
+
+
+PLUGIN_PACKAGE = 'pybuilder_pycharm_workspace'
+PLUGIN_IMPORT_MODULES = { PLUGIN_PACKAGE, f'{PLUGIN_PACKAGE}.messages' }
+
+
+def imported_modules(statement):
+	"""
+	Runs some imports in a fresh interpreter with ``-X importtime`` and returns the modules loaded by the last one.
+
+	:param str statement: Import statements, separated by semicolons
+	:return: Names of the modules loaded by the last import statement
+	:rtype: list[str]
+	"""
+	environment = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+	process = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], env=environment,
+	                         stderr=subprocess.PIPE, universal_newlines=True, check=True)
+	modules, loading = [], []
+	for line in process.stderr.splitlines():
+		if not line.startswith('import time:') or line.startswith('import time: self'):
+			continue
+		module = line.rsplit('|', 1)[1]
+		loading.append(module.strip())
+		# Nested imports are listed before the top level module importing them
+		if not module[1:].startswith(' '):
+			modules, loading = loading, []
+	return modules
+
+
+class ImportTimeTest(unittest.TestCase):
+	def test_plugin_import_only_loads_tasks_registration(self):
+		modules = imported_modules(f'import pybuilder.core; import {PLUGIN_PACKAGE}')
+
+		self.assertIn(PLUGIN_PACKAGE, modules)
+		self.assertEqual([], [module for module in modules if module not in PLUGIN_IMPORT_MODULES])
+
+
+if __name__ == '__main__':
+	unittest.main()
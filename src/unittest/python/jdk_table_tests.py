@@ -0,0 +1,156 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import tempfile
+import textwrap
+import unittest
+
+from pybuilder_pycharm_workspace.errors import InterpretersFileError
+from pybuilder_pycharm_workspace.jdk_table import plan_splices, read_interpreter_entries, replace_interpreters, \
+	write_spliced
+
+
+def interpreter(name, home_path='/venv/bin/python'):
+	"""
+	Builds an interpreter entry as rendered from the template.
+
+	:param str name: Interpreter name
+	:param str home_path: Interpreter home path
+	:return: ``<jdk>`` element text
+	:rtype: str
+	"""
+	return textwrap.dedent(f'''\
+		<jdk version="2">
+		  <name value="{name}" />
+		  <homePath value="{home_path}" />
+		</jdk>''')
+
+
+def interpreters_file(*names):
+	"""
+	Builds an interpreters file holding some interpreters, indented as PyCharm does.
+
+	:param str names: Interpreter names
+	:return: ``jdk.table.xml`` file contents
+	:rtype: bytes
+	"""
+	entries = ''.join(textwrap.indent(interpreter(name, f'/{name}/bin/python'), '    ') + '\n' for name in names)
+	return f'<application>\n  <component name="ProjectJdkTable">\n{entries}  </component>\n</application>\n'.encode('utf-8')
+
+
+class JdkTableSpliceTest(unittest.TestCase):
+	def setUp(self):
+		temp_directory = tempfile.TemporaryDirectory()
+		self.addCleanup(temp_directory.cleanup)
+		self.file_path = os.path.join(temp_directory.name, 'jdk.table.xml')
+
+	def splice(self, data, interpreters):
+		"""
+		Plans the splices of some interpreters and writes them.
+
+		:param bytes data: Original file contents
+		:param dict[str, str or None] interpreters: Interpreter entries by name, ``None`` for the ones to remove
+		:return: Spliced file contents and names of the replaced or removed interpreters
+		:rtype: tuple[bytes, set[str]]
+		"""
+		splices, replaced = plan_splices(data, interpreters)
+		temp_file_path = write_spliced(self.file_path, data, splices)
+		with open(temp_file_path, 'rb') as temp_file:
+			contents = temp_file.read()
+		os.unlink(temp_file_path)
+		return contents, replaced
+
+	def test_replaces_entry_in_place(self):
+		contents, replaced = self.splice(interpreters_file('a', 'b', 'c'), { 'b': interpreter('b', '/new/bin/python') })
+
+		expected = interpreters_file('a', 'b', 'c').replace(b'/b/bin/python', b'/new/bin/python')
+		self.assertEqual(expected, contents)
+		self.assertEqual({ 'b' }, replaced)
+
+	def test_removes_entry_with_its_lines(self):
+		contents, replaced = self.splice(interpreters_file('a', 'b', 'c'), { 'b': None })
+
+		self.assertEqual(interpreters_file('a', 'c'), contents)
+		self.assertEqual({ 'b' }, replaced)
+
+	def test_removing_missing_entry_changes_nothing(self):
+		splices, replaced = plan_splices(interpreters_file('a'), { 'b': None })
+
+		self.assertEqual([], splices)
+		self.assertEqual(set(), replaced)
+
+	def test_appends_new_entries_at_component_end(self):
+		contents, replaced = self.splice(interpreters_file('a'), { 'b': interpreter('b', '/b/bin/python'),
+		                                                           'c': interpreter('c', '/c/bin/python') })
+
+		self.assertEqual(interpreters_file('a', 'b', 'c'), contents)
+		self.assertEqual(set(), replaced)
+
+	def test_removes_duplicated_entries_but_the_first(self):
+		contents, replaced = self.splice(interpreters_file('a', 'b', 'a'), { 'a': interpreter('a', '/a/bin/python') })
+
+		self.assertEqual(interpreters_file('a', 'b'), contents)
+		self.assertEqual({ 'a' }, replaced)
+
+	def test_adds_entry_to_component_without_entries(self):
+		contents, _ = self.splice(interpreters_file(), { 'a': interpreter('a', '/a/bin/python') })
+
+		self.assertEqual(interpreters_file('a'), contents)
+
+	def test_expands_self_closed_component(self):
+		data = b'<application>\n  <component name="ProjectJdkTable" />\n</application>\n'
+
+		contents, _ = self.splice(data, { 'a': interpreter('a', '/a/bin/python') })
+
+		self.assertEqual(interpreters_file('a'), contents)
+
+	def test_adds_component_when_missing(self):
+		contents, _ = self.splice(b'<application>\n</application>\n', { 'a': interpreter('a', '/a/bin/python') })
+
+		self.assertEqual(interpreters_file('a'), contents)
+
+	def test_raises_on_file_without_application(self):
+		with self.assertRaises(InterpretersFileError):
+			plan_splices(b'<other />\n', { 'a': interpreter('a') })
+
+	def test_replace_interpreters_creates_missing_file(self):
+		replaced, written = replace_interpreters(self.file_path, { 'a': interpreter('a', '/a/bin/python') })
+
+		with open(self.file_path, 'rb') as written_file:
+			self.assertEqual(interpreters_file('a'), written_file.read())
+		self.assertEqual((set(), True), (replaced, written))
+
+	def test_replace_interpreters_skips_unchanged_entries(self):
+		with open(self.file_path, 'wb') as original_file:
+			original_file.write(interpreters_file('a', 'b'))
+		modification_time = os.stat(self.file_path).st_mtime_ns
+
+		replaced, written = replace_interpreters(self.file_path, { 'a': interpreter('a', '/a/bin/python') })
+
+		self.assertEqual(({ 'a' }, False), (replaced, written))
+		self.assertEqual(modification_time, os.stat(self.file_path).st_mtime_ns)
+
+	def test_read_entries_round_trip(self):
+		with open(self.file_path, 'wb') as original_file:
+			original_file.write(interpreters_file('a', 'b'))
+
+		entries = read_interpreter_entries(self.file_path, ['b', 'c'])
+
+		self.assertEqual({ 'b': interpreter('b', '/b/bin/python'), 'c': None }, entries)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,190 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import tempfile
+import unittest
+
+from pybuilder_pycharm_workspace.merge import merge_run_manager, write_merged_workspace
+from pybuilder_pycharm_workspace.model import Node, PythonRunConfiguration, configuration_entry, run_manager_component, \
+	workspace_document
+from pybuilder_pycharm_workspace.serializer import iter_document
+
+USER_CONFIGURATION = '''\
+    <configuration name="mine" type="PythonConfigurationType" factoryName="Python">
+      <module name="demo" />
+    </configuration>
+'''
+USER_ITEM = '''      <item itemvalue="Python.mine" />
+'''
+OTHER_COMPONENT = '''  <component name="ToolWindowManager">
+    <frame x="0" y="0" />
+  </component>
+'''
+
+
+def configuration(name, parameters=''):
+	"""
+	Builds a plugin run configuration.
+
+	:param str name: Configuration name
+	:param str parameters: Script parameters
+	:return: Run configuration
+	:rtype: PythonRunConfiguration
+	"""
+	return PythonRunConfiguration(name, 'demo', parameters)
+
+
+def workspace_text(configurations, selected=None):
+	"""
+	Renders a whole ``workspace.xml`` document holding some run configurations.
+
+	:param list[PythonRunConfiguration] configurations: Run configurations
+	:param PythonRunConfiguration or None selected: Configuration selected by default
+	:return: Document text
+	:rtype: str
+	"""
+	return ''.join(iter_document(workspace_document([run_manager_component(configurations, selected)])))
+
+
+def with_user_changes(text):
+	"""
+	Adds a user run configuration, its ``list`` item and another component to a ``workspace.xml`` document.
+
+	:param str text: Document text
+	:return: Document text
+	:rtype: str
+	"""
+	text = text.replace('    <list>\n', USER_CONFIGURATION + '    <list>\n' + USER_ITEM, 1)
+	return text.replace('</project>', OTHER_COMPONENT + '</project>', 1)
+
+
+class MergeRunManagerTest(unittest.TestCase):
+	def test_keeps_user_configurations_and_components(self):
+		build, clean = configuration('build'), configuration('clean', 'clean')
+		text = with_user_changes(workspace_text([build], build))
+
+		merged = merge_run_manager(text, run_manager_component([build, clean], build))
+
+		self.assertIn(USER_CONFIGURATION, merged)
+		self.assertIn(USER_ITEM, merged)
+		self.assertIn(OTHER_COMPONENT, merged)
+		self.assertIn('<configuration name="clean"', merged)
+		self.assertIn('itemvalue="Python.clean"', merged)
+		self.assertEqual(with_user_changes(workspace_text([build, clean], build)).count('<configuration '),
+		                 merged.count('<configuration '))
+
+	def test_replaces_plugin_configurations_in_place(self):
+		text = with_user_changes(workspace_text([configuration('build', 'old')]))
+
+		merged = merge_run_manager(text, run_manager_component([configuration('build', 'new')]))
+
+		self.assertEqual(text.replace('value="old"', 'value="new"'), merged)
+
+	def test_removes_configurations_no_longer_rendered(self):
+		build, clean = configuration('build'), configuration('clean', 'clean')
+		text = with_user_changes(workspace_text([build, clean]))
+
+		merged = merge_run_manager(text, run_manager_component([build]), [configuration_entry(clean)])
+
+		self.assertEqual(with_user_changes(workspace_text([build])), merged)
+
+	def test_patches_selected_plugin_configuration(self):
+		build, clean = configuration('build'), configuration('clean', 'clean')
+		text = with_user_changes(workspace_text([build, clean], build))
+
+		merged = merge_run_manager(text, run_manager_component([build, clean], clean))
+
+		self.assertEqual(text.replace('selected="Python.build"', 'selected="Python.clean"'), merged)
+
+	def test_keeps_selected_user_configuration(self):
+		build, clean = configuration('build'), configuration('clean', 'clean')
+		text = with_user_changes(workspace_text([build, clean], build)).replace('selected="Python.build"',
+		                                                                        'selected="Python.mine"')
+
+		merged = merge_run_manager(text, run_manager_component([build, clean], clean))
+
+		self.assertEqual(text, merged)
+
+	def test_appends_missing_component(self):
+		text = '<?xml version="1.0" encoding="UTF-8"?>\n<project version="4">\n' + OTHER_COMPONENT + '</project>\n'
+
+		merged = merge_run_manager(text, run_manager_component([configuration('build')]))
+
+		self.assertIn(OTHER_COMPONENT + '  <component name="RunManager">', merged)
+		self.assertIn('<configuration name="build"', merged)
+
+	def test_unrecognised_document_isnt_merged(self):
+		self.assertIsNone(merge_run_manager('<other />', run_manager_component([configuration('build')])))
+
+
+class WriteMergedWorkspaceTest(unittest.TestCase):
+	def setUp(self):
+		temp_directory = tempfile.TemporaryDirectory()
+		self.addCleanup(temp_directory.cleanup)
+		self.file_path = os.path.join(temp_directory.name, 'workspace.xml')
+
+	def write(self, text):
+		"""
+		Writes the ``workspace.xml`` file as it is, without translating line breaks.
+
+		:param str text: File contents
+		:return: None
+		"""
+		with open(self.file_path, 'w', encoding='utf-8', newline='') as workspace_file:
+			workspace_file.write(text)
+
+	def read(self):
+		"""
+		Reads the ``workspace.xml`` file as it is, without translating line breaks.
+
+		:return: File contents
+		:rtype: str
+		"""
+		with open(self.file_path, encoding='utf-8', newline='') as workspace_file:
+			return workspace_file.read()
+
+	def test_unchanged_merge_skips_the_write(self):
+		build = configuration('build')
+		self.write(with_user_changes(workspace_text([build], build)))
+		modification_time = os.stat(self.file_path).st_mtime_ns
+
+		written = write_merged_workspace(self.file_path, workspace_document([run_manager_component([build], build)]))
+
+		self.assertFalse(written)
+		self.assertEqual(modification_time, os.stat(self.file_path).st_mtime_ns)
+
+	def test_merges_into_existing_file(self):
+		build, clean = configuration('build'), configuration('clean', 'clean')
+		self.write(with_user_changes(workspace_text([build], build)))
+
+		written = write_merged_workspace(self.file_path, workspace_document([run_manager_component([build, clean], clean)]))
+
+		self.assertTrue(written)
+		self.assertIn(USER_CONFIGURATION, self.read())
+		self.assertIn('selected="Python.clean"', self.read())
+
+	def test_writes_whole_document_when_missing(self):
+		root = workspace_document([run_manager_component([configuration('build')]),
+		                           Node('component', (('name', 'PropertiesComponent'),))])
+
+		written = write_merged_workspace(self.file_path, root)
+
+		self.assertTrue(written)
+		self.assertEqual(''.join(iter_document(root)), self.read())
+
+
+if __name__ == '__main__':
+	unittest.main()
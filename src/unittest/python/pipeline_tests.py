@@ -0,0 +1,99 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import threading
+import unittest
+from unittest import mock
+
+from pybuilder_pycharm_workspace.errors import PipelineError
+from pybuilder_pycharm_workspace.pipeline import Stage, run_pipeline
+
+
+class RunPipelineTest(unittest.TestCase):
+	def setUp(self):
+		self.logger = mock.Mock()
+		self.calls = []
+
+	def stage(self, name, dependencies=(), error=None, started=None, release=None):
+		"""
+		Builds a stage recording when it runs and when it's rolled back.
+
+		:param str name: Stage name
+		:param tuple[str] dependencies: Names of the stages it depends on
+		:param Exception or None error: Error raised when it runs
+		:param threading.Event or None started: Event set when it starts
+		:param threading.Event or None release: Event waited for before finishing
+		:return: Pipeline stage
+		:rtype: Stage
+		"""
+		def run():
+			if started:
+				started.set()
+			if release:
+				release.wait(5)
+			self.calls.append(('run', name))
+			if error:
+				raise error
+
+		return Stage(name, run, dependencies, lambda: self.calls.append(('rollback', name)))
+
+	def test_runs_stages_after_their_dependencies(self):
+		run_pipeline([self.stage('c', ('a', 'b')), self.stage('b', ('a',)), self.stage('a')], self.logger)
+
+		self.assertEqual([('run', 'a'), ('run', 'b'), ('run', 'c')], self.calls)
+
+	def test_rolls_succeeded_stages_back_in_reverse_completion_order(self):
+		with self.assertRaises(PipelineError) as context:
+			run_pipeline([self.stage('a'), self.stage('b', ('a',)), self.stage('c', ('b',), error=OSError('disk full')),
+			              self.stage('d', ('c',))], self.logger)
+
+		self.assertEqual([('run', 'a'), ('run', 'b'), ('run', 'c'), ('rollback', 'b'), ('rollback', 'a')], self.calls)
+		self.assertEqual(['c'], list(context.exception.failures))
+
+	def test_doesnt_start_stages_once_a_stage_failed(self):
+		started, release = threading.Event(), threading.Event()
+		stages = [self.stage('slow', started=started, release=release), self.stage('failing', error=ValueError('bad')),
+		          self.stage('next', ('failing',)), self.stage('after_slow', ('slow',))]
+		failing_run = stages[1].run
+		stages[1].run = lambda: (started.wait(5), release.set(), failing_run())
+
+		with self.assertRaises(PipelineError):
+			run_pipeline(stages, self.logger)
+
+		self.assertNotIn(('run', 'next'), self.calls)
+		self.assertNotIn(('run', 'after_slow'), self.calls)
+		self.assertEqual([('rollback', 'slow')], [call for call in self.calls if call[0] == 'rollback'])
+
+	def test_rollback_failure_doesnt_stop_other_rollbacks(self):
+		stages = [self.stage('a'), self.stage('b', ('a',)), self.stage('c', ('b',), error=OSError('disk full'))]
+		stages[1].rollback = mock.Mock(side_effect=OSError('read-only'))
+
+		with self.assertRaises(PipelineError):
+			run_pipeline(stages, self.logger)
+
+		stages[1].rollback.assert_called_once_with()
+		self.assertIn(('rollback', 'a'), self.calls)
+
+	def test_unknown_dependency_fails_before_running_any_stage(self):
+		with self.assertRaises(PipelineError) as context:
+			run_pipeline([self.stage('a'), self.stage('b', ('a', 'missing'))], self.logger)
+
+		self.assertEqual([], self.calls)
+		self.assertEqual(['b'], list(context.exception.failures))
+		self.assertIn('missing', str(context.exception))
+
+
+if __name__ == '__main__':
+	unittest.main()
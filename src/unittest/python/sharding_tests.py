@@ -0,0 +1,122 @@
+#   -*- coding: utf-8 -*-
+#   Copyright 2020 Diego Barrantes
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from pybuilder_pycharm_workspace.sharding import read_report_durations, read_test_durations, split_shards
+
+REPORT = '''<?xml version="1.0" encoding="UTF-8"?>
+<testsuites>
+  <testsuite name="{module}.Test" tests="2" time="{total}">
+    <testcase classname="{module}.Test" name="test_a" time="{first}" />
+    <testcase classname="{module}.Test" name="test_b" time="{second}">
+      <failure message="boom" />
+    </testcase>
+  </testsuite>
+</testsuites>
+'''
+
+
+def write_report(reports_path, module, first, second, modification_time=None):
+	"""
+	Writes a JUnit XML report with two tests of a module.
+
+	:param pathlib.Path reports_path: Reports directory path
+	:param str module: Dotted module name
+	:param float first: Duration of the first test
+	:param float second: Duration of the second test
+	:param int or None modification_time: Report modification time in nanoseconds, current time by default
+	:return: Report file path
+	:rtype: pathlib.Path
+	"""
+	report_path = reports_path / f'TEST-{module}.Test.xml'
+	report_path.write_text(REPORT.format(module=module, total=first + second, first=first, second=second))
+	if modification_time is not None:
+		os.utime(report_path, ns=(modification_time, modification_time))
+	return report_path
+
+
+class SplitShardsTest(unittest.TestCase):
+	def test_balances_total_durations(self):
+		shards = split_shards({ 'a': 5.0, 'b': 4.0, 'c': 3.0, 'd': 2.0, 'e': 1.0 }, 2)
+
+		self.assertEqual([['a', 'd', 'e'], ['b', 'c']], shards)
+
+	def test_drops_empty_shards(self):
+		self.assertEqual([['a'], ['b']], split_shards({ 'a': 1.0, 'b': 1.0 }, 4))
+
+	def test_ties_are_placed_by_name(self):
+		self.assertEqual([['a', 'c'], ['b', 'd']], split_shards({ 'd': 1.0, 'c': 1.0, 'b': 1.0, 'a': 1.0 }, 2))
+
+	def test_no_modules(self):
+		self.assertEqual([], split_shards({}, 3))
+
+
+class ReadDurationsTest(unittest.TestCase):
+	def setUp(self):
+		temp_directory = tempfile.TemporaryDirectory()
+		self.addCleanup(temp_directory.cleanup)
+		self.project_path = Path(temp_directory.name)
+		self.reports_path = self.project_path / 'target' / 'reports'
+		self.reports_path.mkdir(parents=True)
+		(self.project_path / '.idea').mkdir()
+		self.project = mock.Mock()
+		self.project.get_property.side_effect = { 'dir_target': '$basedir/target',
+		                                          'pycharm_workspace_project_path': self.project_path }.get
+		self.project.expand_path.side_effect = lambda *parts: str(self.project_path / 'target' / Path(*parts[1:]))
+
+	def test_sums_test_durations_by_module(self):
+		report_path = write_report(self.reports_path, 'pkg.module_tests', 0.25, 0.5)
+
+		self.assertEqual({ 'pkg.module_tests': 0.75 }, read_report_durations(str(report_path)))
+
+	def test_reads_every_report(self):
+		write_report(self.reports_path, 'a_tests', 1.0, 2.0)
+		write_report(self.reports_path, 'b_tests', 0.5, 0.5)
+		(self.reports_path / 'coverage.xml').write_text('<coverage />')
+
+		self.assertEqual({ 'a_tests': 3.0, 'b_tests': 1.0 }, read_test_durations(self.project))
+
+	def test_skips_malformed_reports(self):
+		write_report(self.reports_path, 'a_tests', 1.0, 2.0)
+		(self.reports_path / 'TEST-broken.xml').write_text('<testsuites>')
+
+		self.assertEqual({ 'a_tests': 3.0 }, read_test_durations(self.project))
+
+	def test_reuses_cached_reports(self):
+		report_path = write_report(self.reports_path, 'a_tests', 1.0, 2.0, modification_time=10 ** 18)
+		read_test_durations(self.project)
+		report_path.write_text('<testsuites>')
+		os.utime(report_path, ns=(10 ** 18, 10 ** 18))
+
+		self.assertEqual({ 'a_tests': 3.0 }, read_test_durations(self.project))
+		cache = json.loads((self.project_path / '.idea' / '.pycharm_workspace_test_timings.json').read_text())
+		self.assertEqual([str(report_path)], list(cache['reports']))
+
+	def test_most_recent_report_wins(self):
+		old_report = write_report(self.reports_path, 'a_tests', 5.0, 5.0, modification_time=10 ** 18)
+		old_report.rename(self.reports_path / 'TEST-a_tests.Old.xml')
+		write_report(self.reports_path, 'a_tests', 1.0, 1.0, modification_time=2 * 10 ** 18)
+
+		self.assertEqual({ 'a_tests': 2.0 }, read_test_durations(self.project))
+
+
+if __name__ == '__main__':
+	unittest.main()